@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LMS.settings')
+# Serve the hot read endpoints from the async views (see api/async_views.py)
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
+# Requests don't reuse threads under ASGI, so a persistent connection would
+# only linger until it times out
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
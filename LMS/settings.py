@@ -52,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -92,12 +94,35 @@ DATABASES = {
         'PASSWORD': os.getenv("DB_PASSWORD"),
         'HOST': os.getenv("DB_HOST", "localhost"),
         'PORT': os.getenv("DB_PORT", "3306"),
+        # Persistent connections: reuse a worker's connection for this many
+        # seconds (0 reconnects on every request) after a ping confirms it is
+        # still alive
+        'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        'CONN_HEALTH_CHECKS': os.getenv("DB_CONN_HEALTH_CHECKS", "True") == "True",
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
     }
 }
 
+# Read replicas: comma-separated host[:port] list, e.g. DB_REPLICA_HOSTS=db2,db3:3307.
+# Safe API reads go to them (api/db_routing.py); the credentials default to
+# the primary's.
+for _n, _host in enumerate(filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")), start=1):
+    _host, _, _port = _host.strip().partition(":")
+    DATABASES[f'replica{_n}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'USER': os.getenv("DB_REPLICA_USER", DATABASES['default']['USER']),
+        'PASSWORD': os.getenv("DB_REPLICA_PASSWORD", DATABASES['default']['PASSWORD']),
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias.startswith('replica')]
+# Seconds a client stays on the primary after a write, to cover replication lag
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "5"))
+DATABASE_ROUTERS = ['api.db_routing.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -146,7 +171,7 @@ AUTH_USER_MODEL = 'accounts.User'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',  
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -154,7 +179,46 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    # Keyset pagination; `?limit=`/`?offset=` opt in to limit/offset
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+}
+
+# Cache: CACHE_BACKEND=locmem (default, per process), file (shared by the
+# processes of one host, works offline) or redis (needs the redis package)
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'lms'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
 }
+_cache_backend, _cache_location = CACHE_BACKENDS[os.getenv("CACHE_BACKEND", "locmem")]
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backend,
+        'LOCATION': os.getenv("CACHE_LOCATION", _cache_location),
+    }
+}
+# Whether every worker process sees the same cache. Features that rely on one
+# worker invalidating what the others cached default to off on locmem.
+SHARED_CACHE = os.getenv("CACHE_BACKEND", "locmem") != "locmem"
+
+# Seconds the admin dashboard totals at /api/v1/stats/ are cached for
+STATS_CACHE_TIMEOUT = int(os.getenv("STATS_CACHE_TIMEOUT", "30"))
+
+# Requests slower than this, or running more queries, are logged by
+# api.middleware.RequestMetricsMiddleware (logger 'api.metrics')
+METRICS_SLOW_REQUEST_MS = int(os.getenv("METRICS_SLOW_REQUEST_MS", "500"))
+METRICS_QUERY_THRESHOLD = int(os.getenv("METRICS_QUERY_THRESHOLD", "30"))
+
+# Seconds catalogue list/detail responses are cached for; writes invalidate
+# them earlier (see books/cache.py), but only in the workers sharing the cache,
+# so the default without a shared one is 0, which disables the response cache.
+API_CACHE_TIMEOUT = int(os.getenv("API_CACHE_TIMEOUT", "300" if SHARED_CACHE else "0"))
+
+# Route the hot reads (book list/detail, my_issues, my_reservations) to the
+# async views in api/async_views.py. LMS/asgi.py turns this on; under WSGI the
+# sync viewsets are faster.
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "False") == "True"
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # Next.js default port
@@ -166,4 +230,21 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
-}
\ No newline at end of file
+    # Access tokens carry is_staff/user_type claims (accounts/tokens.py)
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.ClaimsTokenRefreshSerializer',
+}
+
+# Build request.user from the access token's claims instead of loading it
+# (accounts/authentication.py). Deactivations and role changes are published
+# through the cache, so this defaults to on only with a shared one.
+JWT_TRUST_CLAIMS = os.getenv("JWT_TRUST_CLAIMS", str(SHARED_CACHE)) == "True"
+
+# Seconds accounts.authentication caches the user of a token it loads; saving
+# or deleting the user clears it. 0 (the default without a shared cache)
+# loads the user on every request.
+JWT_USER_CACHE_TIMEOUT = int(os.getenv("JWT_USER_CACHE_TIMEOUT", "60" if SHARED_CACHE else "0"))
+
+# At most how often (seconds) each worker's typeahead index (books.suggest)
+# checks the catalogue for changes
+SUGGEST_REFRESH_SECONDS = int(os.getenv("SUGGEST_REFRESH_SECONDS", "5"))
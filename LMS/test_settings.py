@@ -0,0 +1,34 @@
+"""
+Settings for running the test suite on local SQLite instead of MySQL:
+
+    python manage.py test --settings=LMS.test_settings
+
+A second SQLite database stands in for a read replica. Replica routing stays
+off (REPLICA_DATABASES is empty) except in the tests that switch it on. The
+test runner uses in-memory copies; the files named here are only opened by
+checks such as `makemigrations --check`, so they live in the temp dir.
+"""
+import tempfile
+from pathlib import Path
+
+from LMS.settings import *  # noqa: F401,F403
+
+TEST_DB_DIR = Path(tempfile.gettempdir())
+
+SECRET_KEY = SECRET_KEY or 'test'  # noqa: F405
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': TEST_DB_DIR / 'lms-test-default.sqlite3',
+    },
+    'replica1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': TEST_DB_DIR / 'lms-test-replica1.sqlite3',
+    },
+}
+REPLICA_DATABASES = []
+
+# Keep api.metrics' slow-request warnings (password hashing makes logins slow)
+# out of the test output; the tests that check them lower the thresholds
+METRICS_SLOW_REQUEST_MS = 60_000
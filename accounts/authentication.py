@@ -0,0 +1,118 @@
+# accounts/authentication.py
+"""
+JWT authentication without a User query per request.
+
+With JWT_TRUST_CLAIMS, a token carrying accounts.tokens.USER_CLAIMS
+authenticates as a User instance built from the claims. The other fields are
+deferred, so code that reads them loads them on first access. Other tokens
+(issued before the claims existed, or by AccessToken.for_user) load the user
+through a cache of JWT_USER_CACHE_TIMEOUT seconds. accounts.signals clears
+that cache whenever the user is saved or deleted.
+
+Claims are only as fresh as the token, so when is_active or a claimed field
+changes (or the user is deleted) accounts.signals records the time with
+invalidate_claims(); tokens issued before it load the user until they
+expire. Both records live in the cache, which is why JWT_TRUST_CLAIMS and
+the user cache are off by default unless every worker shares it. Bulk
+updates (queryset.update) skip the signals; call invalidate_claims() after
+them.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import USER_CLAIMS, has_user_claims
+
+
+def user_cache_key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+def claims_invalid_key(user_id):
+    return f'accounts:claims-invalid-before:{user_id}'
+
+
+def invalidate_claims(user_id):
+    """Stop trusting the claims of the user's access tokens issued until now"""
+    lifetime = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 1
+    cache.set(claims_invalid_key(user_id), time.time(), lifetime)
+
+
+def claims_are_current(validated_token, invalid_before):
+    return invalid_before is None or validated_token.get('iat', 0) > invalid_before
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication building request.user from token claims or the cache"""
+
+    def claims_user(self, validated_token):
+        try:
+            claims = {
+                api_settings.USER_ID_FIELD: validated_token[api_settings.USER_ID_CLAIM],
+                'is_active': True,  # tokens issued before a deactivation fail claims_are_current
+                **{claim: validated_token[claim] for claim in USER_CLAIMS},
+            }
+        except KeyError as e:
+            raise InvalidToken("Token contained no recognizable user identification") from e
+        fields = [
+            field.attname for field in self.user_model._meta.concrete_fields
+            if field.attname in claims
+        ]
+        return self.user_model.from_db(
+            DEFAULT_DB_ALIAS, fields, [claims[field] for field in fields]
+        )
+
+    def trusts_claims(self, validated_token):
+        return settings.JWT_TRUST_CLAIMS and has_user_claims(validated_token)
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if self.trusts_claims(validated_token) and claims_are_current(
+            validated_token, cache.get(claims_invalid_key(user_id))
+        ):
+            return self.claims_user(validated_token)
+        if not settings.JWT_USER_CACHE_TIMEOUT:
+            return super().get_user(validated_token)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.JWT_USER_CACHE_TIMEOUT)
+        return user
+
+    async def aget_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if self.trusts_claims(validated_token) and claims_are_current(
+            validated_token, await cache.aget(claims_invalid_key(user_id))
+        ):
+            return self.claims_user(validated_token)
+        if not settings.JWT_USER_CACHE_TIMEOUT:
+            return await sync_to_async(super().get_user)(validated_token)
+        key = user_cache_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            user = await sync_to_async(super().get_user)(validated_token)
+            await cache.aset(key, user, settings.JWT_USER_CACHE_TIMEOUT)
+        return user
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """CachedJWTAuthentication for the async views in api.async_views"""
+
+    async def aauthenticate(self, request):
+        """authenticate() for a plain Django request, awaiting the user lookup"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = await self.aget_user(validated_token)
+        return user, validated_token
@@ -1,5 +1,8 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+
 from .models import User
+from .tokens import ClaimsRefreshToken
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -15,3 +18,16 @@ class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         exclude = ('password',)
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Compact user for nested payloads (no groups/permissions)"""
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name', 'email', 'user_type']
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Login issuing access tokens with the user claims (accounts.tokens)"""
+    token_class = ClaimsRefreshToken
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
@@ -0,0 +1,43 @@
+# accounts/signals.py
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.authentication import invalidate_claims, user_cache_key
+from accounts.models import User
+from accounts.tokens import USER_CLAIMS
+
+# Fields whose change makes the claims of existing access tokens stale
+CLAIMED_FIELDS = ('is_active', *USER_CLAIMS)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+
+
+@receiver(pre_save, sender=User)
+def remember_claimed_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._claimed_state = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & set(CLAIMED_FIELDS):
+        return  # e.g. last_login on every login
+    instance._claimed_state = (
+        User.objects.filter(pk=instance.pk).values(*CLAIMED_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_changed_claims(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_claimed_state', None)
+    if raw or previous is None:
+        return
+    if any(previous[field] != getattr(instance, field) for field in CLAIMED_FIELDS):
+        invalidate_claims(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_claims(sender, instance, **kwargs):
+    invalidate_claims(instance.pk)
@@ -1,3 +1,125 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+
+
+# The test process is a single worker, so its locmem cache counts as shared
+@override_settings(JWT_TRUST_CLAIMS=True, JWT_USER_CACHE_TIMEOUT=60)
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='secret', email='reader@example.com', user_type='student'
+        )
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post(
+            '/api/v1/login/', {'username': 'reader', 'password': 'secret'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def user_queries(self, path, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if 'FROM "accounts_user"' in q['sql']]
+
+    def test_login_token_carries_user_claims(self):
+        token = AccessToken(self.login()['access'])
+        self.assertEqual(token['user_type'], 'student')
+        self.assertIs(token['is_staff'], False)
+
+    def test_claims_token_skips_the_user_query(self):
+        access = self.login()['access']
+        self.assertEqual(self.user_queries('/api/v1/issues/my_issues/', access), [])
+
+    def test_profile_is_complete_with_claims_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        response = self.client.get('/api/v1/users/me/')
+        self.assertEqual(response.data['email'], 'reader@example.com')
+
+    def test_refresh_reads_current_claims(self):
+        refresh = self.login()['refresh']
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post('/api/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertIs(AccessToken(response.data['access'])['is_staff'], True)
+
+    def test_token_without_claims_uses_the_user_cache(self):
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(len(self.user_queries('/api/v1/issues/my_issues/', token)), 1)
+        self.assertEqual(self.user_queries('/api/v1/issues/my_issues/', token), [])
+
+    def test_saving_the_user_clears_the_cache(self):
+        token = AccessToken.for_user(self.user)
+        self.user_queries('/api/v1/issues/my_issues/', token)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/v1/issues/my_issues/').status_code, 403)
+
+    def test_deactivating_the_user_rejects_existing_claims_tokens(self):
+        access = self.login()['access']
+        self.assertEqual(self.user_queries('/api/v1/issues/my_issues/', access), [])
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/v1/issues/my_issues/').status_code, 403)
+
+    def test_role_change_reloads_the_user_of_existing_claims_tokens(self):
+        self.user.is_staff = True
+        self.user.save()
+        access = self.login()['access']
+        self.user.is_staff = False
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get('/api/v1/exports/books.ndjson').status_code, 403)
+
+    def test_unrelated_changes_keep_claims_tokens_trusted(self):
+        access = self.login()['access']
+        self.user.email = 'jane@example.com'
+        self.user.save()
+        self.assertEqual(self.user_queries('/api/v1/issues/my_issues/', access), [])
+
+    @override_settings(JWT_USER_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        token = AccessToken.for_user(self.user)
+        self.user_queries('/api/v1/issues/my_issues/', token)
+        self.assertEqual(len(self.user_queries('/api/v1/issues/my_issues/', token)), 1)
+
+
+class PerProcessCacheAuthenticationTests(TestCase):
+    """The default settings without a shared cache: every worker has its own"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        response = self.client.post(
+            '/api/v1/login/', {'username': 'reader', 'password': 'secret'}, format='json'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    @override_settings(JWT_TRUST_CLAIMS=False, JWT_USER_CACHE_TIMEOUT=0)
+    def test_revocation_in_one_worker_reaches_another(self):
+        self.assertEqual(self.client.get('/api/v1/issues/my_issues/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()  # records the revocation in this worker's cache only
+        with mock.patch('accounts.authentication.cache', LocMemCache('other-worker', {})):
+            self.assertEqual(self.client.get('/api/v1/issues/my_issues/').status_code, 403)
+
+    @override_settings(JWT_TRUST_CLAIMS=False, JWT_USER_CACHE_TIMEOUT=0)
+    def test_bulk_updates_revoke_without_signals(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/v1/issues/my_issues/').status_code, 403)
@@ -0,0 +1,54 @@
+# accounts/tokens.py
+"""
+JWTs that carry the user fields most requests need.
+
+Access tokens issued at login and on refresh embed USER_CLAIMS, so
+accounts.authentication.CachedJWTAuthentication can build request.user from
+the token without loading the User row (with JWT_TRUST_CLAIMS). Claims are read from the user when
+the access token is made; when they change, or the user is deactivated,
+tokens issued before fall back to loading the user (see
+accounts.authentication).
+"""
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+USER_CLAIMS = ('username', 'is_staff', 'is_superuser', 'user_type')
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def has_user_claims(token):
+    return all(claim in token for claim in USER_CLAIMS)
+
+
+class ClaimsAccessToken(AccessToken):
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the user's current claims"""
+    access_token_class = ClaimsAccessToken
+    user = None  # set by for_user, otherwise loaded when an access token is made
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.user = user
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user = self.user or get_user_model().objects.filter(
+            **{api_settings.USER_ID_FIELD: self[api_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is not None:
+            add_user_claims(access, user)
+        return access
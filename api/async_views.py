@@ -0,0 +1,156 @@
+# api/async_views.py
+"""
+Async versions of the hot read endpoints, for serving under ASGI.
+
+With ASYNC_READ_VIEWS on (LMS/asgi.py turns it on) these views take over the
+routes of the book list and detail, my_issues and my_reservations. GET and
+HEAD run here, with queries going through the async ORM. Other methods go to
+the sync viewset unchanged. The viewset still supplies filters, pagination,
+serializers and the caching mixins, so both paths return the same payloads.
+The responses are always JSON; there is no browsable API on this path.
+"""
+from abc import ABCMeta, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from accounts.authentication import AsyncJWTAuthentication
+from circulation.models import Issue, Reservation
+from .views import BookViewSet, IssueViewSet, ReservationViewSet
+
+
+async def authenticate(request):
+    """JWT first, then the session, like DEFAULT_AUTHENTICATION_CLASSES"""
+    result = await AsyncJWTAuthentication().aauthenticate(request)
+    if result is not None:
+        return result[0]
+    return await request.auser()
+
+
+async def get_object(viewset):
+    """GenericAPIView.get_object() through the async ORM"""
+    queryset = await sync_to_async(viewset.filter_queryset)(viewset.get_queryset())
+    lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+    try:
+        obj = await queryset.aget(**{viewset.lookup_field: viewset.kwargs[lookup_url_kwarg]})
+    except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+    viewset.check_object_permissions(viewset.request, obj)
+    return obj
+
+
+class AsyncReadView(View, metaclass=ABCMeta):
+    """
+    Serve GET/HEAD for one viewset action asynchronously.
+
+    Subclasses set `viewset`, `read_action` and the viewset `actions` of the
+    route (used for every other method), and implement `read()`.
+    """
+    viewset = None
+    read_action = None
+    actions = {}
+    sync_view = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(sync_view=cls.viewset.as_view(cls.actions), **initkwargs)
+        # Like APIView: JWT clients send no CSRF token, SessionAuthentication
+        # enforces CSRF itself on the sync writes
+        return csrf_exempt(view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await self.get(request, *args, **kwargs)
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        viewset = self.viewset(action=self.read_action, args=args, kwargs=kwargs, format_kwarg=None)
+        viewset.request = drf_request = Request(
+            request,
+            parsers=viewset.get_parsers(),
+            negotiator=viewset.get_content_negotiator(),
+            parser_context=viewset.get_parser_context(request),
+        )
+        viewset.headers = {}
+        try:
+            drf_request.user = await authenticate(request)
+            if not drf_request.user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            viewset.check_permissions(drf_request)
+            response = await self.read(viewset, drf_request)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = JSONRenderer.media_type
+        response.renderer_context = viewset.get_renderer_context()
+        return response
+
+    @abstractmethod
+    async def read(self, viewset, request):
+        """The Response for a GET, given the prepared viewset and DRF request"""
+
+
+class BookListView(AsyncReadView):
+    viewset = BookViewSet
+    read_action = 'list'
+    actions = {'get': 'list', 'post': 'create'}
+
+    async def read(self, viewset, request):
+        async def page(request):
+            queryset = await sync_to_async(viewset.filter_queryset)(viewset.get_queryset())
+            books = await viewset.paginator.apaginate_queryset(queryset, request, view=viewset)
+            return viewset.get_paginated_response(viewset.get_serializer(books, many=True).data)
+
+        async def cached_page(request):
+            return await viewset.acached_response(request, page)
+
+        validators = await viewset.aget_list_validators()
+        return await viewset.aconditional_response(request, validators, cached_page)
+
+
+class BookDetailView(AsyncReadView):
+    viewset = BookViewSet
+    read_action = 'retrieve'
+    actions = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+    async def read(self, viewset, request):
+        async def book(request):
+            return Response(viewset.get_serializer(await get_object(viewset)).data)
+
+        async def cached_book(request):
+            return await viewset.acached_response(request, book)
+
+        validators = await viewset.aget_detail_validators()
+        if not validators:
+            return await book(request)  # 404
+        return await viewset.aconditional_response(request, validators, cached_book)
+
+
+class MyIssuesView(AsyncReadView):
+    viewset = IssueViewSet
+    read_action = 'my_issues'
+    actions = {'get': 'my_issues'}
+
+    async def read(self, viewset, request):
+        issues = viewset.with_related(Issue.objects.filter(user=request.user))
+        return Response(viewset.get_serializer([issue async for issue in issues], many=True).data)
+
+
+class MyReservationsView(AsyncReadView):
+    viewset = ReservationViewSet
+    read_action = 'my_reservations'
+    actions = {'get': 'my_reservations'}
+
+    async def read(self, viewset, request):
+        reservations = viewset.with_related(Reservation.objects.filter(user=request.user))
+        return Response(
+            viewset.get_serializer([reservation async for reservation in reservations], many=True).data
+        )
@@ -0,0 +1,221 @@
+# api/caching.py
+"""
+HTTP and server-side caching for the catalogue viewsets.
+
+ConditionalGetMixin reads validators with small aggregate queries before the
+view runs, so a matching If-None-Match / If-Modified-Since is answered with
+304 without fetching or serializing the page. CachedResponseMixin keeps the
+serialized data of list/retrieve responses in the cache, keyed by URL and the
+version tokens of the catalogue scopes they depend on (books.cache).
+The a-prefixed methods are the same steps for api.async_views.
+"""
+import hashlib
+import time
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from books.cache import scope_versions
+from .db_routing import use_primary
+
+CACHE_COUNTER_TTL = 7 * 24 * 3600
+
+# model name -> cache scopes, for the cache stats endpoint
+CACHED_RESOURCES = {}
+
+
+class ConditionalGetMixin:
+    """
+    ETag/Last-Modified on list and retrieve.
+
+    List responses are versioned by (max updated_at, row count) of every model
+    in `validator_models`, so edits, inserts and deletes all change the ETag.
+    Detail responses are versioned by `detail_validator_fields` of the object.
+    With `stale_list_fields`, lists show fields that change without moving
+    updated_at (the copy counters); their ETag then also expires every
+    API_CACHE_TIMEOUT seconds, as the cached lists do.
+    """
+    validator_models = ()
+    detail_validator_fields = ('updated_at',)
+    stale_list_fields = False
+
+    def get_validator_queryset(self):
+        return self.get_queryset().model.objects.order_by()
+
+    def staleness_validators(self):
+        if not self.stale_list_fields:
+            return []
+        return [(int(time.time()) // max(settings.API_CACHE_TIMEOUT, 1),)]
+
+    def get_list_validators(self):
+        return [
+            tuple(model.objects.aggregate(last=Max('updated_at'), rows=Count('pk')).values())
+            for model in self.validator_models
+        ] + self.staleness_validators()
+
+    async def aget_list_validators(self):
+        return [
+            tuple((await model.objects.aaggregate(last=Max('updated_at'), rows=Count('pk'))).values())
+            for model in self.validator_models
+        ] + self.staleness_validators()
+
+    def get_detail_validator_queryset(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return (
+            self.get_validator_queryset()
+            .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            .values_list(*self.detail_validator_fields)
+        )
+
+    def get_detail_validators(self):
+        return list(self.get_detail_validator_queryset())
+
+    async def aget_detail_validators(self):
+        return [row async for row in self.get_detail_validator_queryset()]
+
+    def conditional_headers(self, request, validators):
+        """(ETag, Last-Modified timestamp) for a response versioned by `validators`"""
+        digest = hashlib.md5(
+            repr((request.get_full_path(), validators)).encode(), usedforsecurity=False
+        ).hexdigest()
+        timestamps = [
+            value for row in validators for value in row if isinstance(value, datetime)
+        ]
+        return quote_etag(digest), int(max(timestamps).timestamp()) if timestamps else None
+
+    def conditional_response(self, request, validators, view, *args, **kwargs):
+        etag, last_modified = self.conditional_headers(request, validators)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        return self.patch_conditional_headers(response, etag, last_modified)
+
+    async def aconditional_response(self, request, validators, view, *args, **kwargs):
+        etag, last_modified = self.conditional_headers(request, validators)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        return self.patch_conditional_headers(response, etag, last_modified)
+
+    def patch_conditional_headers(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        # Shared caches must not mix users; browsers revalidate every time
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.get_list_validators(), super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_detail_validators()
+        if not validators:
+            return super().retrieve(request, *args, **kwargs)  # 404
+        return self.conditional_response(
+            request, validators, super().retrieve, *args, **kwargs
+        )
+
+
+class CachedResponseMixin:
+    """
+    Serve list/retrieve from the response cache.
+
+    The key covers the absolute URL (so every query parameter varies it) and
+    the version token of each scope in `cache_scopes`, plus those of
+    `detail_cache_scopes` for retrieve. Hits and misses are counted per
+    resource, see cache_stats().
+    """
+    cache_scopes = ()
+    detail_cache_scopes = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.cache_scopes:
+            CACHED_RESOURCES[cls.queryset.model._meta.model_name] = cls.cache_scopes
+
+    def cache_key(self, request):
+        scopes = self.cache_scopes
+        if self.action == 'retrieve':
+            scopes += self.detail_cache_scopes
+        versions = sorted(scope_versions(*scopes).items())
+        digest = hashlib.md5(
+            repr((request.build_absolute_uri(), versions)).encode(), usedforsecurity=False
+        ).hexdigest()
+        return f'api:response:{digest}'
+
+    def count_cache_event(self, event):
+        key = f'api:cache:{self.queryset.model._meta.model_name}:{event}'
+        if not cache.add(key, 1, CACHE_COUNTER_TTL):
+            try:
+                cache.incr(key)
+            except ValueError:  # expired between add() and incr()
+                cache.set(key, 1, CACHE_COUNTER_TTL)
+
+    def cache_lookup(self, request):
+        """(key, cached data or None), counting the hit or miss"""
+        key = self.cache_key(request)
+        data = cache.get(key)
+        self.count_cache_event('misses' if data is None else 'hits')
+        return key, data
+
+    def cache_store(self, key, response):
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+
+    def cached_response(self, request, view, *args, **kwargs):
+        if not settings.API_CACHE_TIMEOUT:
+            return view(request, *args, **kwargs)
+        key, data = self.cache_lookup(request)
+        if data is not None:
+            return Response(data)
+        with use_primary():  # a lagging replica must not fill the shared cache
+            response = view(request, *args, **kwargs)
+        self.cache_store(key, response)
+        return response
+
+    async def acached_response(self, request, view, *args, **kwargs):
+        if not settings.API_CACHE_TIMEOUT:
+            return await view(request, *args, **kwargs)
+        # Cache backends are sync; one thread hop for the lookup, one for the store
+        key, data = await sync_to_async(self.cache_lookup)(request)
+        if data is not None:
+            return Response(data)
+        with use_primary():
+            response = await view(request, *args, **kwargs)
+        await sync_to_async(self.cache_store)(key, response)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+
+def cache_stats():
+    """Response cache hit/miss counters per cached resource"""
+    keys = [
+        f'api:cache:{name}:{event}' for name in CACHED_RESOURCES for event in ('hits', 'misses')
+    ]
+    counters = cache.get_many(keys)
+    stats = {}
+    for name in CACHED_RESOURCES:
+        hits = counters.get(f'api:cache:{name}:hits', 0)
+        misses = counters.get(f'api:cache:{name}:misses', 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return stats
@@ -0,0 +1,109 @@
+# api/db_routing.py
+"""
+Read-replica routing for the API.
+
+ReplicaRoutingMiddleware opens a RoutingState for each request to an api
+view. On GET/HEAD/OPTIONS the ReplicaRouter sends reads to one of
+settings.REPLICA_DATABASES, picked once per request. Every write goes to
+the primary, and so does every read after the first write. A client that
+wrote is pinned to the primary for REPLICA_PIN_SECONDS, so it reads its own
+writes despite replication lag. The pin is a signed, timestamped cookie
+rather than a cache entry, so every worker sees it whichever one handled the
+write. Outside a request (management commands, shells, tests) nothing
+changes: everything uses `default`.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+PRIMARY = 'default'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'lms_primary_pin'
+PIN_SALT = 'api.db_routing.pin'
+
+current_state = ContextVar('replica_routing_state', default=None)
+
+
+class RoutingState:
+    def __init__(self, replica=None):
+        self.replica = replica  # None: this request reads from the primary
+        self.wrote = False
+        self.primary_only = 0
+
+    @property
+    def read_alias(self):
+        if self.replica is None or self.wrote or self.primary_only:
+            return PRIMARY
+        return self.replica
+
+
+def is_pinned(request):
+    """Whether the client wrote less than REPLICA_PIN_SECONDS ago"""
+    pin = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_SALT, max_age=settings.REPLICA_PIN_SECONDS
+    )
+    return pin is not None
+
+
+def is_api_request(request):
+    try:
+        match = resolve(request.path_info, getattr(request, 'urlconf', None))
+    except Resolver404:
+        return False
+    view_class = getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+    return view_class is not None and view_class.__module__.startswith('api.')
+
+
+def start_routing(request):
+    """RoutingState for a request, reading from a replica when that is safe"""
+    replica = None
+    if request.method in SAFE_METHODS and is_api_request(request) and not is_pinned(request):
+        replica = random.choice(settings.REPLICA_DATABASES)
+    return RoutingState(replica)
+
+
+def finish_routing(request, state, response):
+    if state.wrote:
+        response.set_signed_cookie(
+            PIN_COOKIE, '1', salt=PIN_SALT, max_age=settings.REPLICA_PIN_SECONDS,
+            secure=settings.SESSION_COOKIE_SECURE, httponly=True,
+            samesite=settings.SESSION_COOKIE_SAMESITE,
+        )
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside this block, e.g. to fill a shared cache"""
+    state = current_state.get()
+    if state is None:
+        yield
+        return
+    state.primary_only += 1
+    try:
+        yield
+    finally:
+        state.primary_only -= 1
+
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS entry; see the module docstring"""
+
+    def db_for_read(self, model, **hints):
+        state = current_state.get()
+        return PRIMARY if state is None else state.read_alias
+
+    def db_for_write(self, model, **hints):
+        state = current_state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        aliases = {PRIMARY, *settings.REPLICA_DATABASES}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
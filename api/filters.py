@@ -0,0 +1,73 @@
+# api/filters.py
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from rest_framework.settings import api_settings
+
+from books.search import search_books
+
+
+class BookSearchFilter(BaseFilterBackend):
+    """`?search=` over the books inverted index, annotating `search_rank`"""
+    search_param = api_settings.SEARCH_PARAM
+
+    def get_search_query(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if not query:
+            return queryset
+        return search_books(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Title/author prefix search or exact ISBN.',
+                'schema': {'type': 'string'},
+            },
+        ]
+
+
+class BookOrderingFilter(OrderingFilter):
+    """Order search results by relevance unless `?ordering=` says otherwise"""
+    search_ordering = ('-search_rank', 'id')
+
+    def get_default_ordering(self, view):
+        if BookSearchFilter().get_search_query(view.request):
+            return self.search_ordering
+        return super().get_default_ordering(view)
+
+
+class BranchFilter(BaseFilterBackend):
+    """
+    Scope a viewset to one branch, from `?branch=` or the X-Library-Branch
+    header (a circulation desk client can set it once). Filters on the
+    view's `branch_field`, which leads the branch indexes of BookCopy, Issue
+    and Reservation. Without either, every branch is listed. This narrows
+    what a request reads, it is not a permission check.
+    """
+    branch_param = 'branch'
+    branch_header = 'HTTP_X_LIBRARY_BRANCH'
+
+    def get_branch(self, request):
+        branch = request.query_params.get(self.branch_param) or request.META.get(self.branch_header, '')
+        return branch.strip()
+
+    def filter_queryset(self, request, queryset, view):
+        branch = self.get_branch(request)
+        if not branch:
+            return queryset
+        return queryset.filter(**{getattr(view, 'branch_field', 'branch'): branch})
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.branch_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Branch code; defaults to the X-Library-Branch header.',
+                'schema': {'type': 'string'},
+            },
+        ]
@@ -0,0 +1,83 @@
+# api/metrics.py
+"""
+In-process request metrics, filled by api.middleware.RequestMetricsMiddleware.
+
+Samples are aggregated per endpoint (viewset action or URL name) into
+fixed-bucket latency histograms plus running totals. Every worker process
+keeps its own figures; read them with snapshot() or GET /api/v1/_metrics/.
+"""
+import threading
+from collections import defaultdict
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+SAMPLE_FIELDS = ('total_ms', 'sql_ms', 'queries', 'encode_ms', 'bytes')
+
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.sums = dict.fromkeys(SAMPLE_FIELDS, 0)
+        self.maxima = dict.fromkeys(SAMPLE_FIELDS, 0)
+
+    def add(self, sample):
+        self.count += 1
+        self.buckets[self.bucket_index(sample['total_ms'])] += 1
+        for field in SAMPLE_FIELDS:
+            self.sums[field] += sample[field]
+            self.maxima[field] = max(self.maxima[field], sample[field])
+
+    @staticmethod
+    def bucket_index(total_ms):
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if total_ms <= bound:
+                return index
+        return len(LATENCY_BUCKETS_MS)
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile (None if beyond the last)"""
+        rank = pct / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def as_dict(self):
+        labels = [f'<={bound}ms' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}ms']
+        return {
+            'count': self.count,
+            'latency_ms': {
+                'p50': self.percentile(50),
+                'p95': self.percentile(95),
+                'p99': self.percentile(99),
+                'histogram': dict(zip(labels, self.buckets)),
+            },
+            **{
+                field: {
+                    'mean': round(self.sums[field] / self.count, 2),
+                    'max': round(self.maxima[field], 2),
+                }
+                for field in SAMPLE_FIELDS
+            },
+        }
+
+
+_lock = threading.Lock()
+_endpoints = defaultdict(EndpointStats)
+
+
+def record(endpoint, sample):
+    with _lock:
+        _endpoints[endpoint].add(sample)
+
+
+def snapshot():
+    with _lock:
+        return {name: stats.as_dict() for name, stats in sorted(_endpoints.items())}
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
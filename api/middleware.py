@@ -0,0 +1,228 @@
+# api/middleware.py
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from api import metrics
+from api.db_routing import current_state, finish_routing, start_routing
+
+logger = logging.getLogger('api.metrics')
+
+# The QueryRecorder of the request being handled. A context variable rather
+# than a per-request execute_wrapper, because connections are per thread and
+# the async ORM runs its queries in another thread than the async middleware.
+current_recorder = ContextVar('current_recorder', default=None)
+
+UNRESOLVED_ENDPOINT = '<unresolved>'
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that counts and times every query"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def endpoint_name(request):
+    """
+    `ViewSet.action` for DRF viewsets, else the URL name. Requests that match
+    no URL share one key, so scanning random paths can't grow the metrics.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED_ENDPOINT
+    view_class = getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+    if view_class is None:
+        return match.view_name
+    action = (getattr(match.func, 'actions', None) or {}).get(request.method.lower())
+    return f'{view_class.__name__}.{action}' if action else view_class.__name__
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    """connection_created receiver: route every connection's queries through record_query"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record query count, SQL time, encoding time and response size per request.
+
+    Encoding is response.render(), turning the data into JSON (or the
+    browsable API page). Serializers build that data inside the view, so their
+    time counts towards the rest of `total`, not `encode`.
+
+    The figures go out as a Server-Timing header, are aggregated per endpoint
+    in api.metrics, and requests over METRICS_SLOW_REQUEST_MS or
+    METRICS_QUERY_THRESHOLD are logged as warnings. Works in both the WSGI
+    and ASGI middleware chains.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Keeps the async chain from wrapping the hook in a thread
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Connections opened before the app was ready missed connection_created
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection=connection)
+        recorder = QueryRecorder()
+        request._metrics_encode = 0.0
+        start = time.perf_counter()
+        token = current_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        request._metrics_encode = 0.0
+        start = time.perf_counter()
+        token = current_recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    def finish(self, request, response, recorder, total):
+        sample = {
+            'total_ms': total * 1000,
+            'sql_ms': recorder.duration * 1000,
+            'queries': recorder.count,
+            'encode_ms': request._metrics_encode * 1000,
+            'bytes': 0 if response.streaming else len(response.content),
+        }
+        endpoint = endpoint_name(request)
+        metrics.record(endpoint, sample)
+
+        response['Server-Timing'] = (
+            f'db;dur={sample["sql_ms"]:.2f};desc="{sample["queries"]} queries", '
+            f'encode;dur={sample["encode_ms"]:.2f}, total;dur={sample["total_ms"]:.2f}'
+        )
+        if (sample['total_ms'] > settings.METRICS_SLOW_REQUEST_MS
+                or sample['queries'] > settings.METRICS_QUERY_THRESHOLD):
+            logger.warning(
+                "%s %s (%s): %.1fms, %d queries, %.1fms SQL",
+                request.method, request.get_full_path(), endpoint,
+                sample['total_ms'], sample['queries'], sample['sql_ms'],
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered (encoded to bytes) right after this hook
+        start = time.perf_counter()
+
+        def rendered(response):
+            request._metrics_encode = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        return RequestMetricsMiddleware.process_template_response(self, request, response)
+
+
+def routed_chunks(state, chunks):
+    """Re-enter the request's RoutingState for each chunk of a streamed body"""
+    chunks = iter(chunks)
+    while True:
+        token = current_state.set(state)
+        try:
+            chunk = next(chunks, None)
+        finally:
+            current_state.reset(token)
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def arouted_chunks(state, chunks):
+    chunks = aiter(chunks)
+    while True:
+        token = current_state.set(state)
+        try:
+            chunk = await anext(chunks, None)
+        finally:
+            current_state.reset(token)
+        if chunk is None:
+            return
+        yield chunk
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scope api.db_routing.ReplicaRouter to each request; a no-op without
+    replicas. Streamed bodies (the exports) are generated after the view
+    returns, so their chunks are read under the request's state too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        state = start_routing(request)
+        token = current_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_state.reset(token)
+        finish_routing(request, state, response)
+        return self.stream_routed(response, state)
+
+    async def __acall__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return await self.get_response(request)
+        state = start_routing(request)
+        token = current_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_state.reset(token)
+        finish_routing(request, state, response)
+        return self.stream_routed(response, state)
+
+    def stream_routed(self, response, state):
+        if response.streaming:
+            wrap = arouted_chunks if response.is_async else routed_chunks
+            response.streaming_content = wrap(state, response.streaming_content)
+        return response
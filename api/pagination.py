@@ -0,0 +1,212 @@
+# api/pagination.py
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination, _reverse_ordering
+
+
+def unique_ordering(ordering, model):
+    """`ordering` with the primary key appended unless it is already there"""
+    ordering = tuple(ordering)
+    if not any(order.lstrip('-') in ('pk', model._meta.pk.name) for order in ordering):
+        ordering += ('pk',)
+    return ordering
+
+
+def keyset_filter(ordering, values, reverse=False):
+    """
+    Rows after the row holding `values` in `ordering` (or before it, with
+    `reverse`), as (a > x) OR (a = x AND b > y) OR ... over the fields.
+    NULLs sort first, as on MySQL and SQLite.
+    """
+    condition = Q(pk__in=[])
+    equal = Q()
+    for order, value in zip(ordering, values):
+        field = order.lstrip('-')
+        # Test for: (reverse) XOR (field descending)
+        if reverse != order.startswith('-'):
+            if value is not None:
+                condition |= equal & (
+                    Q(**{field + '__lt': value}) | Q(**{field + '__isnull': True})
+                )
+        elif value is None:
+            condition |= equal & Q(**{field + '__isnull': False})
+        else:
+            condition |= equal & Q(**{field + '__gt': value})
+        equal &= Q(**{field + '__isnull': True} if value is None else {field: value})
+    return condition
+
+
+class OptInLimitOffsetPagination(LimitOffsetPagination):
+    max_limit = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() with the count and page fetched through the async ORM"""
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [obj async for obj in queryset[self.offset:self.offset + self.limit]]
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination by default, so page N costs the same as page 1.
+
+    The ordering comes from the view's `ordering` attribute and should match a
+    composite index, e.g. ('-created_at', 'id'); the primary key is appended
+    when it is missing, so every row has a unique position. The cursor carries
+    the values of every ordering field and the next page is filtered on the
+    whole tuple, with no OFFSET past rows sharing the leading value. Clients
+    that need random access can opt in to limit/offset by sending `?limit=` or
+    `?offset=`.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-id',)
+    offset_pagination_class = OptInLimitOffsetPagination
+
+    def __init__(self):
+        self.offset_paginator = None
+
+    def wants_offset(self, request):
+        params = request.query_params
+        return (
+            self.offset_pagination_class.limit_query_param in params
+            or self.offset_pagination_class.offset_query_param in params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.wants_offset(request):
+            self.offset_paginator = self.offset_pagination_class()
+            page = self.offset_paginator.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.offset_paginator.display_page_controls
+            return page
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.paginate_results(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views: the page is fetched through the async ORM"""
+        if self.wants_offset(request):
+            self.offset_paginator = self.offset_pagination_class()
+            page = await self.offset_paginator.apaginate_queryset(queryset, request, view)
+            self.display_page_controls = self.offset_paginator.display_page_controls
+            return page
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.paginate_results([obj async for obj in page_queryset])
+
+    # CursorPagination.paginate_queryset split around its one query, so the
+    # sync and async paths share everything else
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The ordered, cursor-filtered slice holding this page plus one extra row"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self.position_filter(current_position, reverse))
+
+        return queryset[offset:offset + self.page_size + 1]
+
+    def position_filter(self, position, reverse):
+        """keyset_filter() for a cursor position: the JSON list of ordering values"""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return keyset_filter(self.ordering, values, reverse)
+
+    def paginate_results(self, results):
+        """Work out the page and the next/previous positions from the fetched rows"""
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # Reverse queries run backwards; put the page back in order
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        self.ordering = getattr(view, 'ordering', None) or self.ordering
+        return unique_ordering(super().get_ordering(request, queryset, view), queryset.model)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip('-')
+            value = instance[field] if isinstance(instance, dict) else getattr(instance, field)
+            values.append(None if value is None else str(value))
+        return json.dumps(values)
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.to_html()
+        return super().to_html()
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            super().get_schema_operation_parameters(view)
+            + self.offset_pagination_class().get_schema_operation_parameters(view)
+        )
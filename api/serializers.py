@@ -0,0 +1,46 @@
+# api/serializers.py
+
+def query_param_list(request, name):
+    """Comma separated query parameter as a list, e.g. ?fields=id,title"""
+    value = request.query_params.get(name, '') if request is not None else ''
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets for read requests.
+
+    `?fields=a,b` keeps only the listed top-level fields. `?expand=x` swaps the
+    compact nested representation of `x` for the full one declared in
+    Meta.expandable_fields as {name: (serializer_class, source, prefetch lookups)}.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+
+        for name in self.get_expanded(request):
+            serializer_class, source, _ = self.Meta.expandable_fields[name]
+            self.fields[name] = serializer_class(source=source, read_only=True)
+
+        wanted = query_param_list(request, 'fields')
+        if wanted:
+            for name in set(self.fields) - set(wanted):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_expanded(cls, request):
+        expandable = getattr(cls.Meta, 'expandable_fields', {})
+        return [name for name in query_param_list(request, 'expand') if name in expandable]
+
+    @classmethod
+    def prefetch_expanded(cls, queryset, request):
+        """Add the prefetches the requested expansions need"""
+        lookups = [
+            lookup
+            for name in cls.get_expanded(request)
+            for lookup in cls.Meta.expandable_fields[name][2]
+        ]
+        return queryset.prefetch_related(*lookups) if lookups else queryset
@@ -0,0 +1,266 @@
+# api/synthetic.py
+"""
+Synthetic library data for load tests, used by `manage.py seed_synthetic`.
+
+Rows are generated lazily and written with bulk_create in batches, with
+explicit primary keys so related rows can be generated without reading
+anything back. Output is deterministic for a given seed.
+"""
+import random
+from contextlib import contextmanager
+from datetime import date, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import User
+from books.cache import SCOPES, invalidate
+from books.models import Author, Book, BookCopy, Category, Publisher
+from circulation.models import FINE_PER_DAY, Issue
+from circulation.services import MAX_ACTIVE_ISSUES
+
+WORDS = (
+    'war peace river night garden empire shadow silent winter summer city '
+    'ocean stone fire glass history secret house journey kingdom light dark '
+    'iron golden broken forgotten last first little great lost hidden wild '
+    'song storm moon star island mountain forest road letter daughter'
+).split()
+FIRST_NAMES = 'jane john maria ahmed li olga pierre sofia kenji amara'.split()
+LAST_NAMES = 'austen smith garcia khan chen petrova dubois rossi tanaka okafor'.split()
+LANGUAGES = ['English'] * 8 + ['French', 'Spanish', 'German', 'Hindi']
+CONDITIONS = ['new', 'good', 'good', 'good', 'fair', 'poor']
+BRANCHES = ['Main', 'Main', 'East', 'West']
+USER_TYPES = ['student'] * 8 + ['staff', 'external']
+
+# Realistic volumes, scaled down with --scale
+DEFAULT_VOLUMES = {
+    'books': 1_000_000,
+    'copies': 5_000_000,
+    'issues': 10_000_000,
+    'users': 100_000,
+}
+OPEN_ISSUE_SHARE = 0.02
+OVERDUE_SHARE = 0.2
+HISTORY_DAYS = 5 * 365
+LOAN_DAYS = 14
+
+
+def copy_branch(copy):
+    """Branch of the n-th seeded copy, known without reading it back"""
+    return BRANCHES[copy % len(BRANCHES)]
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def next_pk(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep generated auto_now_add values instead of now()"""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class SyntheticCatalogue:
+    def __init__(self, volumes, seed=1, batch_size=10000, progress=None):
+        self.volumes = volumes
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.progress = progress or (lambda message: None)
+        self.today = date.today()
+        self.now = timezone.now()
+
+    def write(self, model, rows, label):
+        written = 0
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            written += len(batch)
+            self.progress(f"{label}: {written}")
+        return written
+
+    def seed(self):
+        """Generate everything; returns {model label: rows written}"""
+        counts = {}
+        counts['lookups'] = self.seed_lookups()
+        counts['users'] = self.seed_users()
+        counts['books'] = self.seed_books()
+        counts['copies'] = self.seed_copies()
+        counts['issues'] = self.seed_issues()
+        self.progress("refreshing copy counters")
+        Book.objects.filter(pk__gte=self.first_book).refresh_copy_counters()
+        invalidate(*SCOPES)
+        return counts
+
+    def seed_lookups(self):
+        rng = self.rng
+        categories = [f'{word.title()} Studies' for word in WORDS]
+        Category.objects.bulk_create(
+            [Category(name=name) for name in categories], ignore_conflicts=True
+        )
+        self.category_ids = list(Category.objects.values_list('pk', flat=True))
+
+        self.first_publisher = next_pk(Publisher)
+        self.publisher_count = max(1, self.volumes['books'] // 3000)
+        self.write(Publisher, (
+            Publisher(pk=self.first_publisher + n, name=f'{rng.choice(LAST_NAMES).title()} Press {n}')
+            for n in range(self.publisher_count)
+        ), 'publishers')
+
+        self.first_author = next_pk(Author)
+        self.author_count = max(1, self.volumes['books'] // 5)
+        return len(categories) + self.publisher_count + self.write(Author, (
+            Author(
+                pk=self.first_author + n,
+                name=f'{rng.choice(FIRST_NAMES).title()} {rng.choice(LAST_NAMES).title()} {n}',
+            )
+            for n in range(self.author_count)
+        ), 'authors')
+
+    def seed_users(self):
+        rng = self.rng
+        password = make_password('password')  # hashed once, shared by every user
+        self.first_user = next_pk(User)
+
+        def users():
+            for n in range(self.volumes['users']):
+                user_type = rng.choice(USER_TYPES)
+                yield User(
+                    pk=self.first_user + n,
+                    username=f'synthetic{self.first_user + n}',
+                    email=f'synthetic{self.first_user + n}@example.com',
+                    password=password,
+                    user_type=user_type,
+                    is_staff=user_type == 'staff',
+                    date_joined=self.now - timedelta(days=rng.randint(0, HISTORY_DAYS)),
+                )
+
+        return self.write(User, users(), 'users')
+
+    def seed_books(self):
+        rng = self.rng
+        self.first_book = next_pk(Book)
+
+        def books():
+            for n in range(self.volumes['books']):
+                pk = self.first_book + n
+                yield Book(
+                    pk=pk,
+                    title=' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title(),
+                    isbn=f'979{pk:010d}',
+                    publication_year=rng.randint(1900, self.today.year),
+                    language=rng.choice(LANGUAGES),
+                    total_pages=rng.randint(80, 900),
+                    category_id=rng.choice(self.category_ids),
+                    publisher_id=self.first_publisher + rng.randrange(self.publisher_count),
+                    created_at=self.now - timedelta(minutes=rng.randint(0, HISTORY_DAYS * 1440)),
+                )
+
+        with explicit_timestamps(Book._meta.get_field('created_at')):
+            written = self.write(Book, books(), 'books')
+
+        Through = Book.authors.through
+
+        def author_links():
+            for n in range(self.volumes['books']):
+                # One author, sometimes a co-author
+                authors = {rng.randrange(self.author_count) for _ in range(rng.choice((1, 1, 1, 2)))}
+                for author in authors:
+                    yield Through(book_id=self.first_book + n, author_id=self.first_author + author)
+
+        self.write(Through, author_links(), 'author links')
+        return written
+
+    def seed_copies(self):
+        rng = self.rng
+        books = self.volumes['books']
+        per_book = self.volumes['copies'] / books if books else 0
+        self.first_copy = next_pk(BookCopy)
+        self.copy_count = 0
+
+        def copies():
+            for book in range(books):
+                # Popularity varies: between 1 and roughly twice the average
+                for _ in range(max(1, round(rng.uniform(0, 2 * per_book)))):
+                    n = self.copy_count
+                    self.copy_count += 1
+                    shelf = rng.randint(1, 400)
+                    yield BookCopy(
+                        pk=self.first_copy + n,
+                        book_id=self.first_book + book,
+                        copy_number=f'SYN-{self.first_copy + n}',
+                        condition=rng.choice(CONDITIONS),
+                        location=f'Shelf {shelf}-{rng.randint(1, 8)}',
+                        branch=copy_branch(n),
+                        floor=shelf // 100,
+                        shelf=shelf,
+                    )
+
+        return self.write(BookCopy, copies(), 'copies')
+
+    def seed_issues(self):
+        """Mostly returned history; a slice of open loans within the borrow limit"""
+        rng = self.rng
+        copy_count = self.copy_count
+        users = self.volumes['users']
+        total = self.volumes['issues']
+        if not copy_count or not users:
+            return 0
+
+        open_count = min(
+            int(total * OPEN_ISSUE_SHARE), copy_count, users * MAX_ACTIVE_ISSUES
+        )
+        open_copies = rng.sample(range(copy_count), open_count)
+
+        def issue(copy, user, issue_date, returned):
+            due_date = issue_date + timedelta(days=LOAN_DAYS)
+            return_date = None
+            fine = 0
+            if returned:
+                return_date = issue_date + timedelta(days=rng.randint(1, LOAN_DAYS + 10))
+                fine = max(0, (return_date - due_date).days) * FINE_PER_DAY
+            return Issue(
+                user_id=self.first_user + user,
+                book_copy_id=self.first_copy + copy,
+                branch=copy_branch(copy),
+                issue_date=issue_date,
+                due_date=due_date,
+                return_date=return_date,
+                returned=returned,
+                fine_amount=fine,
+            )
+
+        def issues():
+            for n, copy in enumerate(open_copies):
+                if rng.random() < OVERDUE_SHARE:
+                    days_out = rng.randint(LOAN_DAYS + 1, LOAN_DAYS + 30)
+                else:
+                    days_out = rng.randint(0, LOAN_DAYS)
+                # Round-robin keeps every borrower within MAX_ACTIVE_ISSUES
+                yield issue(copy, n % users, self.today - timedelta(days=days_out), returned=False)
+            for _ in range(total - open_count):
+                issue_date = self.today - timedelta(days=rng.randint(LOAN_DAYS + 25, HISTORY_DAYS))
+                yield issue(rng.randrange(copy_count), rng.randrange(users), issue_date, returned=True)
+
+        with explicit_timestamps(Issue._meta.get_field('issue_date')):
+            written = self.write(Issue, issues(), 'issues')
+
+        for batch in batched(sorted(open_copies), self.batch_size):
+            BookCopy.objects.filter(pk__in=[self.first_copy + copy for copy in batch]).update(
+                is_available=False
+            )
+        return written
@@ -1,3 +1,969 @@
-from django.test import TestCase
+import csv
+import json
+from io import StringIO
+from urllib.parse import urlencode
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from api import metrics
+from api import urls as api_urls
+from api.db_routing import PIN_COOKIE
+from books.cache import invalidate
+from books.models import Author, Book, BookCopy, Category, Publisher
+from books.suggest import suggest_index
+from circulation.models import Issue, Reservation
+from circulation.services import MAX_ACTIVE_ISSUES
+
+# URLconf for AsyncReadViewTests: the async read views mounted as under ASGI
+urlpatterns = [
+    path('api/v1/', include(api_urls.async_urlpatterns + api_urls.urlpatterns)),
+]
+
+
+def make_books(count, start=0):
+    """Bulk-create `count` books, each with one author and two copies (one issued)"""
+    category, _ = Category.objects.get_or_create(name='Fiction')
+    publisher, _ = Publisher.objects.get_or_create(name='Penguin')
+    author, _ = Author.objects.get_or_create(name='Jane Austen')
+    books = Book.objects.bulk_create([
+        Book(
+            title=f'Book {i}',
+            isbn=f'{i:013d}',
+            publication_year=2000,
+            category=category,
+            publisher=publisher,
+        )
+        for i in range(start, start + count)
+    ])
+    Book.authors.through.objects.bulk_create([
+        Book.authors.through(book_id=book.id, author_id=author.id) for book in books
+    ])
+    BookCopy.objects.bulk_create([
+        BookCopy(book=book, copy_number=f'{book.isbn}-{n}', is_available=(n == 0))
+        for book in books
+        for n in range(2)
+    ])
+    # bulk_create bypasses the counter and cache signals
+    Book.objects.filter(pk__in=[book.pk for book in books]).refresh_copy_counters()
+    invalidate('book')
+    return books
+
+
+class BookListQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/books/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_list_query_count_is_independent_of_catalogue_size(self):
+        make_books(10)
+        small, _ = self.count_list_queries()
+
+        make_books(9990, start=10)
+        large, _ = self.count_list_queries()
+
+        self.assertEqual(small, large)
+
+    def test_list_reports_copy_counts(self):
+        make_books(3)
+        _, response = self.count_list_queries()
+        for row in response.data['results']:
+            self.assertEqual(row['available_copies_count'], 1)
+            self.assertEqual(row['total_copies_count'], 2)
+
+    def test_detail_reports_copy_counts(self):
+        book = make_books(1)[0]
+        response = self.client.get(f'/api/v1/books/{book.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['available_copies_count'], 1)
+        self.assertEqual(response.data['total_copies_count'], 2)
+
+    def test_counts_read_counter_columns_without_queries(self):
+        book = Book.objects.get(pk=make_books(1)[0].pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(book.available_copies_count, 1)
+            self.assertEqual(book.total_copies_count, 2)
+
+    def test_filter_available_books(self):
+        unavailable = make_books(2)
+        BookCopy.objects.filter(book=unavailable[0]).delete()
+        response = self.client.get('/api/v1/books/', {'available_copies__gte': 1})
+        self.assertEqual([row['id'] for row in response.data['results']], [unavailable[1].pk])
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_books(45)
+
+    def test_cursor_pages_cover_catalogue_without_duplicates(self):
+        seen = []
+        url = '/api/v1/books/'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len(set(seen)), 45)
+
+    def test_cursor_filters_on_the_whole_ordering_without_offset(self):
+        # Every book shares the leading ordering value, so only the id tiebreak
+        # (declared, or appended for ?ordering=title) separates the pages
+        Book.objects.update(title='Emma', created_at=timezone.now())
+        invalidate('book')
+        for ordering in [None, 'title']:
+            seen = []
+            params = {'page_size': 10, 'ordering': ordering} if ordering else {'page_size': 10}
+            url = '/api/v1/books/?' + urlencode(params)
+            with CaptureQueriesContext(connection) as queries:
+                while url:
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    seen.extend(row['id'] for row in response.data['results'])
+                    previous, url = response.data['previous'], response.data['next']
+            self.assertEqual(len(set(seen)), 45)
+            self.assertFalse([query['sql'] for query in queries if 'OFFSET' in query['sql']])
+            back = self.client.get(previous).data['results']
+            self.assertEqual([row['id'] for row in back], seen[30:40])
+
+    def test_client_can_choose_page_size(self):
+        response = self.client.get('/api/v1/books/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 45)
+        response = self.client.get('/api/v1/books/', {'page_size': 10})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_limit_offset_is_opt_in(self):
+        response = self.client.get('/api/v1/books/', {'limit': 5, 'offset': 40})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 45)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNone(response.data['next'])
+
+    def test_categories_are_not_paginated(self):
+        response = self.client.get('/api/v1/categories/')
+        self.assertIsInstance(response.data, list)
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(
+            username='librarian', password='secret', user_type='staff', is_staff=True
+        )
+        self.reader = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        books = make_books(3)
+        copies = list(BookCopy.objects.filter(book__in=books, is_available=True))
+        Issue.objects.create(user=self.reader, book_copy=copies[0])
+        Issue.objects.create(
+            user=self.reader, book_copy=copies[1], due_date=date.today() - timedelta(days=2)
+        )
+        Issue.objects.create(
+            user=self.reader, book_copy=copies[2], returned=True,
+            return_date=date.today(), due_date=date.today() - timedelta(days=3),
+        )
+
+    def test_stats_are_aggregated(self):
+        self.client.force_authenticate(self.staff)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/v1/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_books'], 3)
+        self.assertEqual(response.data['total_users'], 2)
+        self.assertEqual(response.data['active_issues'], 2)
+        self.assertEqual(response.data['overdue_issues'], 1)
+        self.assertEqual(response.data['outstanding_fines'], 15)
+
+    def test_stats_are_cached(self):
+        self.client.force_authenticate(self.staff)
+        self.client.get('/api/v1/stats/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/stats/')
+        self.assertEqual(response.data['total_books'], 3)
+
+    def test_stats_require_staff(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.get('/api/v1/stats/')
+        self.assertEqual(response.status_code, 403)
+
+
+class BookSearchEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        author = Author.objects.create(name='Jane Austen')
+        for i, title in enumerate(['Emma', 'Persuasion', 'Emma: A Graphic Novel']):
+            book = Book.objects.create(title=title, isbn=f'97801414395{i:02d}', publication_year=2000)
+            book.authors.add(author)
+
+    def titles(self, response):
+        return [row['title'] for row in response.data['results']]
+
+    def test_search_is_ranked_and_deduplicated(self):
+        response = self.client.get('/api/v1/books/', {'search': 'austen'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.titles(response)), 3)
+
+        response = self.client.get('/api/v1/books/', {'search': 'emma'})
+        self.assertEqual(set(self.titles(response)), {'Emma', 'Emma: A Graphic Novel'})
+
+    def test_search_pages_follow_rank(self):
+        response = self.client.get('/api/v1/books/', {'search': 'austen', 'page_size': 2})
+        seen = self.titles(response)
+        response = self.client.get(response.data['next'])
+        seen += self.titles(response)
+        self.assertEqual(sorted(seen), ['Emma', 'Emma: A Graphic Novel', 'Persuasion'])
+
+    def test_explicit_ordering_overrides_rank(self):
+        response = self.client.get('/api/v1/books/', {'search': 'austen', 'ordering': 'title'})
+        self.assertEqual(self.titles(response), ['Emma', 'Emma: A Graphic Novel', 'Persuasion'])
+
+
+class BookSuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        suggest_index.reset()
+        self.user = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.author = Author.objects.create(name='Jane Austen')
+        self.books = []
+        for i, title in enumerate(['Emma', 'Persuasion', 'Emma: A Graphic Novel']):
+            book = Book.objects.create(title=title, isbn=f'97801414395{i:02d}', publication_year=2000)
+            book.authors.add(self.author)
+            self.books.append(book)
+
+    def suggest(self, query):
+        response = self.client.get('/api/v1/books/suggest/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_prefix_matches_rank_whole_words_first(self):
+        self.assertEqual(self.suggest('em'), [
+            {'id': self.books[0].pk, 'title': 'Emma', 'isbn': '9780141439500', 'author': 'Jane Austen'},
+            {'id': self.books[2].pk, 'title': 'Emma: A Graphic Novel', 'isbn': '9780141439502',
+             'author': 'Jane Austen'},
+        ])
+        self.assertEqual([row['title'] for row in self.suggest('austen pers')], ['Persuasion'])
+        self.assertEqual(self.suggest('zanzibar'), [])
+
+    def test_lookups_after_the_first_skip_the_database(self):
+        self.suggest('emma')
+        with self.assertNumQueries(0):
+            self.assertEqual(suggest_index.suggest('graph'), [
+                {'id': self.books[2].pk, 'title': 'Emma: A Graphic Novel', 'isbn': '9780141439502',
+                 'author': 'Jane Austen'},
+            ])
+
+    @override_settings(SUGGEST_REFRESH_SECONDS=0)
+    def test_index_follows_catalogue_writes(self):
+        self.suggest('emma')
+        self.books[1].title = 'Sense and Sensibility'
+        self.books[1].save()
+        self.books[2].delete()
+        self.author.name = 'J. Austen'
+        self.author.save()
+        self.assertEqual([row['title'] for row in self.suggest('sense')], ['Sense and Sensibility'])
+        self.assertEqual([row['title'] for row in self.suggest('emma')], ['Emma'])
+        self.assertEqual(self.suggest('pers'), [])
+        self.assertEqual(self.suggest('emma')[0]['author'], 'J. Austen')
+
+    def test_catalogue_is_polled_at_most_every_refresh_interval(self):
+        self.suggest('emma')
+        Book.objects.filter(pk=self.books[1].pk).update(
+            title='Sense and Sensibility', updated_at=timezone.now()
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(suggest_index.suggest('sense'), [])
+        with override_settings(SUGGEST_REFRESH_SECONDS=0):
+            titles = [row['title'] for row in suggest_index.suggest('sense')]
+        self.assertEqual(titles, ['Sense and Sensibility'])
+
+    @override_settings(SUGGEST_REFRESH_SECONDS=0)
+    def test_circulation_does_not_trigger_a_refresh(self):
+        self.suggest('emma')
+        copy = BookCopy.objects.create(book=self.books[0], copy_number='E-1')
+        Issue.objects.create(user=self.user, book_copy=copy)
+        with self.assertNumQueries(2):  # the catalogue marker only
+            suggest_index.suggest('emma')
+
+    @override_settings(ROOT_URLCONF='api.tests')
+    def test_route_is_not_shadowed_by_async_detail_view(self):
+        self.assertEqual(len(self.suggest('emma')), 2)
+
+
+class IssueCreateTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username='librarian', password='secret', user_type='staff', is_staff=True
+        )
+        self.reader = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.copy = BookCopy.objects.filter(book__in=make_books(1), is_available=True).get()
+
+    def test_issue_then_reissue_same_copy(self):
+        payload = {'user': self.reader.pk, 'book_copy': self.copy.pk}
+        response = self.client.post('/api/v1/issues/', payload)
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.post('/api/v1/issues/', payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('not available', str(response.data))
+
+    def test_returned_record_skips_checkout(self):
+        Issue.objects.create(user=self.reader, book_copy=self.copy)
+        payload = {'user': self.reader.pk, 'book_copy': self.copy.pk, 'returned': True}
+        response = self.client.post('/api/v1/issues/', payload)
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(BookCopy.objects.get(pk=self.copy.pk).is_available)
+        self.assertEqual(Issue.objects.filter(returned=False).count(), 1)
+
+    def test_return_book_twice_is_rejected(self):
+        issue = Issue.objects.create(user=self.reader, book_copy=self.copy)
+        response = self.client.post(f'/api/v1/issues/{issue.pk}/return_book/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(f'/api/v1/issues/{issue.pk}/return_book/')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(BookCopy.objects.get(pk=self.copy.pk).is_available)
+        self.assertEqual(Book.objects.get(pk=self.copy.book_id).available_copies, 1)
+
+    def test_bulk_endpoints(self):
+        response = self.client.post(
+            '/api/v1/issues/bulk_issue/',
+            {'user': self.reader.pk, 'copy_numbers': [self.copy.copy_number]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['status'], 'issued')
+
+        response = self.client.post(
+            '/api/v1/issues/bulk_return/', {'copy_numbers': [self.copy.copy_number]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['status'], 'returned')
+
+        response = self.client.post('/api/v1/issues/bulk_return/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ShelfInventoryTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username='librarian', password='secret', user_type='staff', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        copies = BookCopy.objects.filter(book__in=make_books(3)).order_by('pk')
+        # (branch, floor, shelf) per copy, deliberately out of id order
+        for copy, (branch, floor, shelf) in zip(copies, [
+            ('Main', 1, 12), ('Main', 1, 10), ('Main', 2, 10),
+            ('Main', 1, 11), ('East', 1, 11), ('Main', 1, 30),
+        ]):
+            BookCopy.objects.filter(pk=copy.pk).update(branch=branch, floor=floor, shelf=shelf)
+        self.copies = list(copies)
+
+    def walk(self, **params):
+        response = self.client.get('/api/v1/copies/shelf-walk/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['floor'], row['shelf'], row['id']) for row in response.data]
+
+    def test_shelf_walk_returns_the_range_in_shelf_order_in_one_query(self):
+        with self.assertNumQueries(1):
+            rows = self.walk(branch='Main', floor=1, shelf_from=10, shelf_to=12)
+        ids = [copy.pk for copy in self.copies]
+        self.assertEqual(rows, [(1, 10, ids[1]), (1, 11, ids[3]), (1, 12, ids[0])])
+        self.assertEqual([row[:2] for row in self.walk(branch='Main', shelf_to=10)], [(1, 10), (2, 10)])
+
+    def test_held_copies_pick_list(self):
+        reader = User.objects.create_user(username='reader', password='secret', user_type='student')
+        copy = self.copies[3]
+        Reservation.objects.create(user=reader, book=copy.book, status='ready', held_copy=copy)
+        self.assertEqual(self.walk(branch='Main', held='true'), [(1, 11, copy.pk)])
+
+    def test_shelf_walk_validates_and_is_staff_only(self):
+        response = self.client.get('/api/v1/copies/shelf-walk/', {'shelf_from': 3})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            '/api/v1/copies/shelf-walk/', {'branch': 'Main', 'shelf_from': 5, 'shelf_to': 4}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(
+            User.objects.create_user(username='reader', password='secret', user_type='student')
+        )
+        response = self.client.get('/api/v1/copies/shelf-walk/', {'branch': 'Main'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_audit_marks_copies_seen_and_updates_condition(self):
+        seen, unchanged = self.copies[:2]
+        response = self.client.post('/api/v1/copies/audit/', {'copies': [
+            {'id': seen.pk, 'condition': 'poor'}, {'id': unchanged.pk}, {'id': 0},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 2, 'missing': [0]})
+        seen.refresh_from_db()
+        unchanged.refresh_from_db()
+        self.assertEqual((seen.condition, unchanged.condition), ('poor', 'good'))
+        self.assertIsNotNone(unchanged.last_seen_at)
+
+        response = self.client.post(
+            '/api/v1/copies/audit/', {'copies': [{'id': seen.pk, 'condition': 'torn'}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class BranchScopingTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username='librarian', password='secret', user_type='staff', is_staff=True
+        )
+        self.reader = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        books = make_books(2)
+        BookCopy.objects.filter(book=books[1]).update(branch='East')
+        BookCopy.objects.filter(book=books[0]).update(branch='Main')
+        self.issues = {
+            copy.branch: Issue.objects.create(user=self.reader, book_copy=copy)
+            for copy in BookCopy.objects.filter(is_available=True)
+        }
+        Issue.objects.update(due_date=date.today() - timedelta(days=1))
+
+    def ids(self, path, params=None, **headers):
+        response = self.client.get(path, params, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        return sorted(row['id'] for row in results)
+
+    def test_issues_are_scoped_by_param_or_header(self):
+        east = self.issues['East'].pk
+        self.assertEqual(self.ids('/api/v1/issues/', {'branch': 'East'}), [east])
+        self.assertEqual(self.ids('/api/v1/issues/', x_library_branch='East'), [east])
+        self.assertEqual(self.ids('/api/v1/issues/overdue/', x_library_branch='East'), [east])
+        self.assertEqual(len(self.ids('/api/v1/issues/')), 2)
+        response = self.client.get(
+            f"/api/v1/issues/{self.issues['Main'].pk}/", headers={'x-library-branch': 'East'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_copies_and_reservations_are_scoped(self):
+        self.assertEqual(
+            set(BookCopy.objects.filter(pk__in=self.ids('/api/v1/copies/', {'branch': 'East'}))
+                .values_list('branch', flat=True)),
+            {'East'},
+        )
+        self.client.force_authenticate(self.reader)
+        book = self.issues['East'].book_copy.book
+        response = self.client.post(
+            '/api/v1/reservations/',
+            {'user': self.reader.pk, 'book': book.pk, 'branch': 'East'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.ids('/api/v1/reservations/', {'branch': 'East'}), [response.data['id']])
+        self.assertEqual(self.ids('/api/v1/reservations/', {'branch': 'Main'}), [])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username='librarian', password='secret', user_type='staff', is_staff=True
+        )
+        self.reader = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        books = make_books(3)
+        copies = list(BookCopy.objects.filter(book__in=books, is_available=True))
+        Issue.objects.create(user=self.reader, book_copy=copies[0])
+        Issue.objects.create(
+            user=self.reader, book_copy=copies[1], returned=True,
+            return_date=date.today(), due_date=date.today() - timedelta(days=3),
+        )
+
+    def content(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_issues_csv_honours_filters(self):
+        rows = list(csv.DictReader(self.content(
+            self.client.get('/api/v1/exports/issues.csv', {'returned': 'false'})
+        ).splitlines()))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['username'], 'reader')
+        self.assertEqual(rows[0]['returned'], 'False')
+
+        response = self.client.get('/api/v1/exports/issues.csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(self.content(response).splitlines()), 3)
+
+    def test_books_ndjson(self):
+        response = self.client.get('/api/v1/exports/books.ndjson', {'ordering': 'title'})
+        records = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([r['title'] for r in records], ['Book 0', 'Book 1', 'Book 2'])
+        self.assertEqual(records[0]['authors'], ['Jane Austen'])
+        self.assertEqual((records[0]['available_copies'], records[0]['total_copies']), (1, 2))
+
+    def test_books_query_count_is_per_chunk(self):
+        with self.assertNumQueries(2):
+            self.content(self.client.get('/api/v1/exports/books.ndjson'))
+
+    def test_chunks_are_keyset_queries_in_export_order(self):
+        Book.objects.update(title='Emma')
+        with mock.patch('api.exports.EXPORT_CHUNK_SIZE', 2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/v1/exports/books.ndjson', {'ordering': '-title'})
+                records = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([r['id'] for r in records], sorted(r['id'] for r in records))
+        self.assertEqual(len(records), 3)
+        books = [q['sql'] for q in queries if 'books_book_authors' not in q['sql']]
+        self.assertEqual(len(books), 2)
+        self.assertFalse([sql for sql in books if 'OFFSET' in sql])
+
+    def test_exports_require_staff(self):
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.client.get('/api/v1/exports/issues.csv').status_code, 403)
+        self.assertEqual(self.client.get('/api/v1/exports/books.ndjson').status_code, 403)
+
+
+class CirculationPayloadTests(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def add_loans(self, start, count):
+        books = make_books(count, start=start)
+        for copy in BookCopy.objects.filter(book__in=books, is_available=True):
+            Issue.objects.create(user=self.reader, book_copy=copy)
+        for book in books:
+            Reservation.objects.create(user=self.reader, book=book)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_independent_of_row_count(self):
+        self.add_loans(0, 2)
+        counts = [self.count_queries(url) for url in (
+            '/api/v1/issues/my_issues/', '/api/v1/reservations/my_reservations/'
+        )]
+        self.add_loans(2, 3)
+        self.assertEqual(counts, [self.count_queries(url) for url in (
+            '/api/v1/issues/my_issues/', '/api/v1/reservations/my_reservations/'
+        )])
+
+    def test_nested_details_are_compact(self):
+        self.add_loans(0, 1)
+        issue = self.client.get('/api/v1/issues/my_issues/').data[0]
+        self.assertEqual(issue['book_copy_details']['book']['authors'][0]['name'], 'Jane Austen')
+        self.assertNotIn('groups', issue['user_details'])
+
+        reservation = self.client.get('/api/v1/reservations/my_reservations/').data[0]
+        self.assertEqual(
+            set(reservation['book_details']), {'id', 'title', 'isbn', 'cover_image', 'authors'}
+        )
+
+    def test_fields_and_expand(self):
+        self.add_loans(0, 1)
+        issue = self.client.get('/api/v1/issues/my_issues/', {'fields': 'id,due_date'}).data[0]
+        self.assertEqual(set(issue), {'id', 'due_date'})
+
+        response = self.client.get(
+            '/api/v1/reservations/', {'expand': 'book_details', 'fields': 'id,book_details'}
+        )
+        reservation = response.data['results'][0]
+        self.assertEqual(set(reservation), {'id', 'book_details'})
+        self.assertEqual(reservation['book_details']['publisher']['name'], 'Penguin')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.book = make_books(2)[0]
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_list_and_detail_return_304(self):
+        for url in ('/api/v1/books/', f'/api/v1/books/{self.book.pk}/', '/api/v1/categories/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no-cache', response['Cache-Control'])
+            self.assertIn('Last-Modified', response)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.revalidate(url, response).status_code, 304)
+            self.assertLessEqual(len(ctx.captured_queries), 3)  # validators only
+
+    def test_query_string_is_part_of_the_etag(self):
+        first = self.client.get('/api/v1/books/')
+        self.assertNotEqual(first['ETag'], self.client.get('/api/v1/books/?ordering=title')['ETag'])
+
+    def test_changes_invalidate(self):
+        url = f'/api/v1/books/{self.book.pk}/'
+        changes = [
+            lambda: Author.objects.get(name='Jane Austen').save(),
+            lambda: Category.objects.get().delete(),
+            lambda: self.book.authors.clear(),
+        ]
+        for change in changes:
+            list_response, detail_response = self.client.get('/api/v1/books/'), self.client.get(url)
+            change()
+            self.assertEqual(self.revalidate('/api/v1/books/', list_response).status_code, 200)
+            self.assertEqual(self.revalidate(url, detail_response).status_code, 200)
+
+    def test_copy_counters_revalidate_details_but_not_lists(self):
+        url = f'/api/v1/books/{self.book.pk}/'
+        list_response, detail_response = self.client.get('/api/v1/books/'), self.client.get(url)
+        BookCopy.objects.filter(book=self.book, is_available=True).get().delete()
+        self.assertEqual(self.revalidate(url, detail_response).status_code, 200)
+        self.assertEqual(self.revalidate('/api/v1/books/', list_response).status_code, 304)
+
+    def test_missing_book_is_404(self):
+        self.assertEqual(self.client.get('/api/v1/books/999999/').status_code, 404)
+
+
+# The test process is a single worker, so its locmem cache counts as shared
+@override_settings(API_CACHE_TIMEOUT=300)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(
+            username='librarian', password='secret', user_type='staff', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.book = make_books(2)[0]
+
+    def test_repeat_reads_are_served_from_cache(self):
+        self.client.get('/api/v1/books/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/books/')
+        self.assertEqual(len(response.data['results']), 2)
+        # Only the ETag validators hit the database
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+        other = self.client.get('/api/v1/books/', {'ordering': 'title'})
+        self.assertEqual(other.data['results'][0]['title'], 'Book 0')
+
+        stats = self.client.get('/api/v1/stats/cache/').data
+        self.assertEqual((stats['book']['hits'], stats['book']['misses']), (1, 2))
+
+    def test_writes_invalidate(self):
+        self.client.get('/api/v1/categories/')
+        self.client.get(f'/api/v1/books/{self.book.pk}/')
+
+        Category.objects.filter(name='Fiction').update(name='Novels')  # bypasses signals
+        self.assertEqual(self.client.get('/api/v1/categories/').data[0]['name'], 'Fiction')
+
+        category = Category.objects.get()
+        category.name = 'Novels'
+        category.save()
+        self.assertEqual(self.client.get('/api/v1/categories/').data[0]['name'], 'Novels')
+        self.assertEqual(
+            self.client.get(f'/api/v1/books/{self.book.pk}/').data['category']['name'], 'Novels'
+        )
+
+    def test_checkout_invalidates_book_availability(self):
+        url = f'/api/v1/books/{self.book.pk}/'
+        self.assertEqual(self.client.get(url).data['available_copies_count'], 1)
+        copy = BookCopy.objects.get(book=self.book, is_available=True)
+        self.client.get('/api/v1/books/')
+        self.client.post('/api/v1/issues/', {'user': self.staff.pk, 'book_copy': copy.pk})
+        self.assertEqual(self.client.get(url).data['available_copies_count'], 0)
+        # Lists tolerate stale counters until the entry expires
+        self.client.get('/api/v1/books/')
+        stats = self.client.get('/api/v1/stats/cache/').data
+        self.assertEqual(stats['book']['hits'], 1)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.staff = User.objects.create_user(
+            username='librarian', password='secret', user_type='staff', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        make_books(3)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/v1/books/')
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('encode;dur=', response['Server-Timing'])
+
+    def test_metrics_are_aggregated_per_action(self):
+        self.client.get('/api/v1/books/')
+        self.client.get('/api/v1/books/?ordering=title')
+        self.client.get('/api/v1/issues/my_issues/')
+
+        data = self.client.get('/api/v1/_metrics/').data
+        self.assertEqual(data['BookViewSet.list']['count'], 2)
+        self.assertGreater(data['BookViewSet.list']['queries']['max'], 0)
+        self.assertGreater(data['BookViewSet.list']['bytes']['mean'], 0)
+        self.assertEqual(sum(data['BookViewSet.list']['latency_ms']['histogram'].values()), 2)
+        self.assertIn('IssueViewSet.my_issues', data)
+
+        self.assertEqual(self.client.delete('/api/v1/_metrics/').status_code, 204)
+        self.assertEqual(list(metrics.snapshot()), ['MetricsView'])
+
+    def test_unresolved_paths_share_one_key(self):
+        self.client.get('/api/v1/no-such-thing/')
+        self.client.get('/wp-login.php')
+        data = self.client.get('/api/v1/_metrics/').data
+        self.assertEqual(data['<unresolved>']['count'], 2)
+        self.assertFalse([name for name in data if name.startswith('/')])
+
+    def test_metrics_require_staff(self):
+        self.client.force_authenticate(User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        ))
+        self.assertEqual(self.client.get('/api/v1/_metrics/').status_code, 403)
+
+    @override_settings(METRICS_QUERY_THRESHOLD=0)
+    def test_offending_requests_are_logged(self):
+        with self.assertLogs('api.metrics', level='WARNING') as logs:
+            self.client.get('/api/v1/books/')
+        self.assertIn('BookViewSet.list', logs.output[0])
+
+
+class SeedSyntheticTests(TestCase):
+    def seed(self, **volumes):
+        call_command('seed_synthetic', stdout=StringIO(), **volumes)
+
+    def test_seeds_consistent_data(self):
+        self.seed(books=50, copies=150, issues=400, users=20)
+
+        self.assertEqual(Book.objects.count(), 50)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Issue.objects.count(), 400)
+        self.assertTrue(all(book.authors.exists() for book in Book.objects.all()))
+
+        open_issues = Issue.objects.filter(returned=False)
+        self.assertEqual(
+            BookCopy.objects.filter(is_available=False).count(), open_issues.count()
+        )
+        self.assertFalse(open_issues.filter(book_copy__is_available=True).exists())
+        for user in User.objects.all():
+            self.assertLessEqual(user.issues.filter(returned=False).count(), MAX_ACTIVE_ISSUES)
+        for book in Book.objects.all():
+            self.assertEqual(book.total_copies, book.copies.count())
+            self.assertEqual(book.available_copies, book.copies.filter(is_available=True).count())
+
+    def test_deterministic_and_repeatable(self):
+        self.seed(books=20, copies=40, issues=60, users=5, seed=7)
+        titles = list(Book.objects.order_by('pk').values_list('title', flat=True))
+        self.seed(books=20, copies=40, issues=60, users=5, seed=7)
+
+        self.assertEqual(Book.objects.count(), 40)
+        self.assertEqual(
+            list(Book.objects.order_by('pk').values_list('title', flat=True)[20:]), titles
+        )
+
+
+@override_settings(ROOT_URLCONF='api.tests')
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='secret', user_type='student'
+        )
+        self.staff = User.objects.create_user(
+            username='librarian', password='secret', user_type='staff', is_staff=True
+        )
+        self.books = make_books(3)
+        copy = BookCopy.objects.filter(book=self.books[0], is_available=True).get()
+        Issue.objects.create(user=self.user, book_copy=copy, due_date=date.today() + timedelta(days=14))
+        Reservation.objects.create(user=self.user, book=self.books[1])
+
+        self.sync_client = APIClient()
+        self.sync_client.force_authenticate(self.user)
+
+    def async_get(self, url, user=None, **headers):
+        headers['Authorization'] = f'Bearer {AccessToken.for_user(user or self.user)}'
+        return async_to_sync(AsyncClient().get)(url, headers=headers)
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    def test_payloads_match_the_sync_viewsets(self):
+        urls = [
+            '/api/v1/books/',
+            '/api/v1/books/?ordering=title&page_size=2',
+            '/api/v1/books/?search=book&limit=2&offset=1',
+            f'/api/v1/books/{self.books[0].pk}/',
+            '/api/v1/issues/my_issues/?expand=book_copy',
+            '/api/v1/reservations/my_reservations/',
+        ]
+        for url in urls:
+            response = self.async_get(url)
+            self.assertEqual(response.status_code, 200, url)
+            with override_settings(ROOT_URLCONF='LMS.urls'):
+                expected = self.sync_client.get(url, format='json').json()
+            self.assertEqual(response.json(), expected, url)
+
+    def test_cursor_pages(self):
+        first = self.async_get('/api/v1/books/?page_size=2').json()
+        second = self.async_get(first['next']).json()
+        self.assertEqual(len(first['results']) + len(second['results']), 3)
+        self.assertIsNone(second['next'])
+
+    @override_settings(API_CACHE_TIMEOUT=300)
+    def test_conditional_get_and_cache(self):
+        url = f'/api/v1/books/{self.books[0].pk}/'
+        response = self.async_get(url)
+        self.assertIn('ETag', response)
+        self.assertEqual(self.async_get(url, **{'If-None-Match': response['ETag']}).status_code, 304)
+        self.assertEqual(self.async_get('/api/v1/books/').json(), self.async_get('/api/v1/books/').json())
+        self.assertEqual(cache.get('api:cache:book:hits'), 1)
+
+    def test_errors(self):
+        self.assertEqual(self.async_get('/api/v1/books/999999/').status_code, 404)
+        anonymous = async_to_sync(AsyncClient().get)('/api/v1/books/')
+        self.assertEqual(anonymous.status_code, 403)
+        with override_settings(ROOT_URLCONF='LMS.urls'):
+            self.assertEqual(anonymous.json(), self.client.get('/api/v1/books/').json())
+        invalid = async_to_sync(AsyncClient().get)(
+            '/api/v1/books/', headers={'Authorization': 'Bearer nonsense'}
+        )
+        self.assertEqual(invalid.status_code, 403)
+
+    def test_writes_go_to_the_sync_viewset(self):
+        response = async_to_sync(AsyncClient().post)(
+            '/api/v1/books/', {'title': 'New', 'isbn': '9780000000001', 'publication_year': 2024},
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.staff)}'},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Book.objects.filter(isbn='9780000000001').exists())
+
+    def test_metrics_in_the_async_chain(self):
+        metrics.reset()
+        response = self.async_get('/api/v1/issues/my_issues/')
+        self.assertIn('queries', response['Server-Timing'])
+        self.assertGreater(metrics.snapshot()['MyIssuesView']['queries']['max'], 0)
+
+
+@skipUnless('replica1' in settings.DATABASES, "needs LMS.test_settings (a replica1 database)")
+@override_settings(REPLICA_DATABASES=['replica1'], API_CACHE_TIMEOUT=0)
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        cache.clear()
+        # The replica is a separate database here, so rows written to the
+        # primary only are visible on it when a read was routed there
+        for alias in self.databases:
+            User.objects.using(alias).create(
+                pk=1, username='librarian', user_type='staff', is_staff=True
+            )
+            User.objects.using(alias).create(pk=2, username='reader', user_type='student')
+        make_books(2)
+        Book.objects.using('replica1').create(
+            title='Replicated', isbn='9780000000009', publication_year=2000
+        )
+
+    def client_for(self, pk):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(User(pk=pk))}')
+        return client
+
+    def titles(self, client):
+        return [book['title'] for book in client.get('/api/v1/books/').data['results']]
+
+    def test_safe_reads_go_to_the_replica(self):
+        self.assertEqual(self.titles(self.client_for(2)), ['Replicated'])
+
+    def test_writer_is_pinned_to_the_primary(self):
+        staff = self.client_for(1)
+        response = staff.post(
+            '/api/v1/books/', {'title': 'New', 'isbn': '9780000000001', 'publication_year': 2024}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Book.objects.using('replica1').filter(title='New').exists())
+
+        self.assertIn('New', self.titles(staff))
+        self.assertEqual(self.titles(self.client_for(2)), ['Replicated'])
+
+    def test_streamed_exports_read_the_replica(self):
+        response = self.client_for(1).get('/api/v1/exports/books.ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Replicated'])
+
+    def test_pin_is_seen_by_every_worker(self):
+        staff = self.client_for(1)
+        staff.post('/api/v1/books/', {'title': 'New', 'isbn': '9780000000001', 'publication_year': 2024})
+        cache.clear()  # the next read is handled by a worker with its own cache
+        self.assertIn('New', self.titles(staff))
+
+    def test_forged_pin_is_ignored(self):
+        reader = self.client_for(2)
+        reader.cookies[PIN_COOKIE] = '1'
+        self.assertEqual(self.titles(reader), ['Replicated'])
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        staff = self.client_for(1)
+        staff.post('/api/v1/books/', {'title': 'New', 'isbn': '9780000000001', 'publication_year': 2024})
+        self.assertEqual(self.titles(staff), ['Replicated'])
+
+    @override_settings(API_CACHE_TIMEOUT=300)
+    def test_cache_is_filled_from_the_primary(self):
+        reader = self.client_for(2)
+        self.assertEqual(len(self.titles(reader)), 2)
+        self.assertEqual(len(self.titles(reader)), 2)  # cache hit
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        self.assertEqual(len(self.titles(self.client_for(2))), 2)
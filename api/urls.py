@@ -1,8 +1,13 @@
 # api/urls.py
+from django.conf import settings
+from django.urls import path
 from rest_framework.routers import DefaultRouter
+from .async_views import BookDetailView, BookListView, MyIssuesView, MyReservationsView
 from .views import (
     BookViewSet, BookCopyViewSet, IssueViewSet, ReservationViewSet,
-    AuthorViewSet, CategoryViewSet, PublisherViewSet, UserViewSet
+    AuthorViewSet, CategoryViewSet, PublisherViewSet, UserViewSet, StatsView,
+    CacheStatsView, MetricsView, IssueExportView, BookExportView, PopularBooksView,
+    CategoryUsageView, CirculationSeriesView
 )
 
 router = DefaultRouter()
@@ -15,4 +20,26 @@ router.register('issues', IssueViewSet, basename='issue')
 router.register('reservations', ReservationViewSet, basename='reservation')
 router.register('users', UserViewSet)
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    path('stats/', StatsView.as_view(), name='stats'),
+    path('stats/cache/', CacheStatsView.as_view(), name='cache-stats'),
+    path('_metrics/', MetricsView.as_view(), name='metrics'),
+    path('analytics/popular-books/', PopularBooksView.as_view(), name='analytics-popular-books'),
+    path('analytics/categories/', CategoryUsageView.as_view(), name='analytics-categories'),
+    path('analytics/circulation/', CirculationSeriesView.as_view(), name='analytics-circulation'),
+    path('exports/issues.csv', IssueExportView.as_view(), name='export-issues'),
+    path('exports/books.ndjson', BookExportView.as_view(), name='export-books'),
+] + router.urls
+
+# Same paths and names as the router's routes, so they take precedence
+async_urlpatterns = [
+    path('books/', BookListView.as_view(), name='book-list'),
+    # int, so the router's books/suggest/ isn't taken for a detail lookup
+    path('books/<int:pk>/', BookDetailView.as_view(), name='book-detail'),
+    path('issues/my_issues/', MyIssuesView.as_view(), name='issue-my-issues'),
+    path('reservations/my_reservations/', MyReservationsView.as_view(),
+         name='reservation-my-reservations'),
+]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = async_urlpatterns + urlpatterns
@@ -1,35 +1,82 @@
 # api/views.py
 from rest_framework.viewsets import ModelViewSet
+from rest_framework.views import APIView
+from rest_framework.generics import GenericAPIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.db.models import Count, Max, Q, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+from abc import ABCMeta, abstractmethod
+from datetime import date, timedelta
 
 from books.models import Book, BookCopy, Author, Category, Publisher
+from books.suggest import DEFAULT_LIMIT, MAX_LIMIT, suggest_index
+from books import inventory
 from books.serializers import (
-    BookSerializer, BookListSerializer, BookCopySerializer,
-    AuthorSerializer, CategorySerializer, PublisherSerializer
+    BookSerializer, BookListSerializer, BookCopySerializer, BookSummarySerializer,
+    AuthorSerializer, CategorySerializer, PublisherSerializer,
+    CopyAuditSerializer, ShelfCopySerializer, ShelfRangeSerializer
 )
 from circulation.models import Issue, Reservation
-from circulation.serializers import IssueSerializer, ReservationSerializer
+from circulation.serializers import (
+    IssueSerializer, ReservationSerializer, BulkIssueSerializer, BulkReturnSerializer
+)
+from circulation import recommendations, rollups, services
 from accounts.serializers import RegisterSerializer, UserProfileSerializer
 from accounts.models import User
+from . import metrics
+from .caching import CachedResponseMixin, ConditionalGetMixin, cache_stats
+from .db_routing import use_primary
+from .exports import book_ndjson_rows, issue_csv_rows
+from .filters import BookSearchFilter, BookOrderingFilter, BranchFilter
 
-class BookViewSet(ModelViewSet):
-    queryset = Book.objects.all().prefetch_related('authors', 'category', 'publisher')
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['category', 'publication_year', 'language']
-    search_fields = ['title', 'isbn', 'authors__name']
-    ordering_fields = ['title', 'publication_year', 'created_at']
+class BookViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
+    queryset = Book.objects.all()
+    filter_backends = [DjangoFilterBackend, BookSearchFilter, BookOrderingFilter]
+    filterset_fields = {
+        'category': ['exact'],
+        'publication_year': ['exact'],
+        'language': ['exact'],
+        'available_copies': ['exact', 'gte'],
+    }
+    ordering_fields = ['title', 'publication_year', 'created_at', 'available_copies']
+    ordering = ('-created_at', 'id')
+    # Author renames bump Author's updated_at. Copy counters change on every
+    # checkout without touching updated_at: details validate them directly,
+    # lists may show them up to API_CACHE_TIMEOUT seconds old.
+    validator_models = (Book, Author, Category)
+    stale_list_fields = True
+    cache_scopes = ('book', 'author', 'category', 'publisher')
+    detail_cache_scopes = ('availability',)
+    detail_validator_fields = (
+        'updated_at', 'category__updated_at', 'publisher__updated_at', 'authors_updated',
+        'available_copies', 'total_copies',
+    )
+    
+    def get_validator_queryset(self):
+        return Book.objects.order_by().annotate(authors_updated=Max('authors__updated_at'))
     
     def get_serializer_class(self):
         if self.action == 'list':
             return BookListSerializer
         return BookSerializer
     
+    def get_queryset(self):
+        # Copy counts come from the denormalised Book.available_copies/total_copies
+        return (
+            Book.objects.all()
+            .select_related('category', 'publisher')
+            .prefetch_related('authors')
+        )
+    
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAdminUser()]
@@ -42,33 +89,61 @@ class BookViewSet(ModelViewSet):
         copies = book.copies.all()
         serializer = BookCopySerializer(copies, many=True)
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Books most often borrowed by this book's borrowers (circulation.recommendations)"""
+        book = self.get_object()
+        return Response(scored_books(recommendations.similar_books(book.pk)))
+    
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Typeahead matches for ?q= from the in-memory index in books.suggest"""
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        # Catching up on writes must not read a lagging replica: a missed
+        # write would only show once it moves the catalogue marker again
+        with use_primary():
+            results = suggest_index.suggest(request.query_params.get('q', ''), max(limit, 1))
+        return Response(results)
 
-class AuthorViewSet(ModelViewSet):
+class AuthorViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
     queryset = Author.objects.all()
+    validator_models = (Author,)
+    cache_scopes = ('author',)
     serializer_class = AuthorSerializer
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['name']
     ordering_fields = ['name']
+    ordering = ('name', 'id')
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
     queryset = Category.objects.all()
+    validator_models = (Category,)
+    cache_scopes = ('category',)
     serializer_class = CategorySerializer
+    pagination_class = None  # Small lookup table, fetched whole for filter dropdowns
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
-class PublisherViewSet(ModelViewSet):
+class PublisherViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
     queryset = Publisher.objects.all()
+    validator_models = (Publisher,)
+    cache_scopes = ('publisher',)
     serializer_class = PublisherSerializer
     filter_backends = [SearchFilter]
     search_fields = ['name']
+    ordering = ('name', 'id')
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -78,25 +153,54 @@ class PublisherViewSet(ModelViewSet):
 class BookCopyViewSet(ModelViewSet):
     queryset = BookCopy.objects.all().select_related('book')
     serializer_class = BookCopySerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['book', 'is_available', 'condition']
+    filter_backends = [BranchFilter, DjangoFilterBackend]
+    filterset_fields = ['book', 'is_available', 'condition', 'floor', 'shelf']
+    ordering = ('id',)
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'shelf_walk', 'audit']:
             return [IsAdminUser()]
         return [IsAuthenticated()]
+    
+    @action(detail=False, methods=['get'], url_path='shelf-walk')
+    def shelf_walk(self, request):
+        """Every copy in a shelf range, in shelf order, unpaginated (books.inventory)"""
+        params = ShelfRangeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        copies = inventory.shelf_walk(
+            **params.validated_data, copies=self.filter_queryset(self.get_queryset())
+        )
+        return Response(ShelfCopySerializer(copies, many=True).data)
+    
+    @action(detail=False, methods=['post'])
+    def audit(self, request):
+        """Mark copies seen on the shelf, with their current condition"""
+        serializer = CopyAuditSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated, missing = inventory.audit_copies(
+            serializer.validated_data['copies'], serializer.validated_data.get('seen_at')
+        )
+        return Response({'updated': updated, 'missing': missing})
 
 class IssueViewSet(ModelViewSet):
     serializer_class = IssueSerializer
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = ['user', 'returned', 'book_copy__book']
-    ordering_fields = ['issue_date', 'due_date']
+    filter_backends = [BranchFilter, DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['user', 'returned', 'book_copy__book', 'overdue']
+    ordering_fields = ['issue_date', 'due_date', 'accrued_fine']
+    ordering = ('-issue_date', 'id')
     
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Issue.objects.all().select_related('user', 'book_copy__book')
-        return Issue.objects.filter(user=user).select_related('book_copy__book')
+            return self.with_related(Issue.objects.all())
+        return self.with_related(Issue.objects.filter(user=user))
+    
+    def with_related(self, queryset):
+        # Matches the nested summaries of IssueSerializer plus any ?expand=
+        queryset = queryset.select_related('user', 'book_copy__book').prefetch_related(
+            'book_copy__book__authors'
+        )
+        return IssueSerializer.prefetch_expanded(queryset, self.request)
     
     def get_permissions(self):
         if self.action in ['create', 'destroy']:
@@ -106,7 +210,7 @@ class IssueViewSet(ModelViewSet):
     @action(detail=False, methods=['get'])
     def my_issues(self, request):
         """Get current user's issues"""
-        issues = Issue.objects.filter(user=request.user).select_related('book_copy__book')
+        issues = self.with_related(Issue.objects.filter(user=request.user))
         serializer = self.get_serializer(issues, many=True)
         return Response(serializer.data)
     
@@ -119,10 +223,16 @@ class IssueViewSet(ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        overdue_issues = Issue.objects.filter(
+        overdue_issues = self.with_related(Issue.objects.filter(
             returned=False,
             due_date__lt=date.today()
-        ).select_related('user', 'book_copy__book')
+        ))
+        overdue_issues = BranchFilter().filter_queryset(request, overdue_issues, self)
+        
+        page = self.paginate_queryset(overdue_issues)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
         
         serializer = self.get_serializer(overdue_issues, many=True)
         return Response(serializer.data)
@@ -137,24 +247,63 @@ class IssueViewSet(ModelViewSet):
             )
         
         issue = self.get_object()
+        if issue.returned:
+            return Response(
+                {"detail": "This issue is already returned"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         issue.returned = True
         issue.return_date = date.today()
         issue.save()
         
         serializer = self.get_serializer(issue)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_issue(self, request):
+        """Issue a stack of copies (by copy number) to one user"""
+        if not request.user.is_staff:
+            return Response(
+                {"detail": "Permission denied"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = BulkIssueSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = services.bulk_checkout(**serializer.validated_data)
+        return Response({"results": results})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_return(self, request):
+        """Return a stack of books by issue id and/or copy number"""
+        if not request.user.is_staff:
+            return Response(
+                {"detail": "Permission denied"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = BulkReturnSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = services.bulk_return(**serializer.validated_data)
+        return Response({"results": results})
 
 class ReservationViewSet(ModelViewSet):
     serializer_class = ReservationSerializer
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [BranchFilter, DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['user', 'book', 'status']
     ordering_fields = ['created_at']
+    ordering = ('-created_at', 'id')
     
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Reservation.objects.all().select_related('user', 'book')
-        return Reservation.objects.filter(user=user).select_related('book')
+            return self.with_related(Reservation.objects.all())
+        return self.with_related(Reservation.objects.filter(user=user))
+    
+    def with_related(self, queryset):
+        # Matches the nested summaries of ReservationSerializer plus any ?expand=
+        queryset = queryset.select_related('user', 'book').prefetch_related('book__authors')
+        return ReservationSerializer.prefetch_expanded(queryset, self.request)
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -162,7 +311,7 @@ class ReservationViewSet(ModelViewSet):
     @action(detail=False, methods=['get'])
     def my_reservations(self, request):
         """Get current user's reservations"""
-        reservations = Reservation.objects.filter(user=request.user).select_related('book')
+        reservations = self.with_related(Reservation.objects.filter(user=request.user))
         serializer = self.get_serializer(reservations, many=True)
         return Response(serializer.data)
     
@@ -176,8 +325,7 @@ class ReservationViewSet(ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        reservation.status = 'cancelled'
-        reservation.save()
+        services.cancel_reservation(reservation)
         
         serializer = self.get_serializer(reservation)
         return Response(serializer.data)
@@ -187,6 +335,7 @@ class UserViewSet(ModelViewSet):
     filter_backends = [SearchFilter, DjangoFilterBackend]
     search_fields = ['username', 'email', 'first_name', 'last_name']
     filterset_fields = ['user_type', 'is_active']
+    ordering = ('-date_joined', 'id')
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -204,15 +353,201 @@ class UserViewSet(ModelViewSet):
     @action(detail=False, methods=['get', 'put', 'patch'])
     def me(self, request):
         """Get or update current user profile"""
+        # request.user may be built from token claims; the profile needs every field
+        user = self.get_queryset().get(pk=request.user.pk)
         if request.method == 'GET':
-            serializer = self.get_serializer(request.user)
+            serializer = self.get_serializer(user)
             return Response(serializer.data)
         else:
             serializer = self.get_serializer(
-                request.user, 
+                user, 
                 data=request.data, 
                 partial=request.method == 'PATCH'
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
-            return Response(serializer.data)
\ No newline at end of file
+            return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'], url_path='me/recommendations')
+    def me_recommendations(self, request):
+        """Books similar to the current user's recent borrowing that they haven't borrowed"""
+        return Response(scored_books(recommendations.recommended_books(request.user)))
+
+def scored_books(rows):
+    """Payload of (book, score) pairs from circulation.recommendations"""
+    return [
+        {**BookSummarySerializer(book).data, 'score': round(score, 4)}
+        for book, score in rows
+    ]
+
+class StatsView(APIView):
+    """Dashboard totals computed with SQL aggregates and cached briefly"""
+    permission_classes = [IsAdminUser]
+    cache_key = 'api:stats'
+
+    def get(self, request):
+        stats = cache.get(self.cache_key)
+        if stats is None:
+            stats = self.compute_stats()
+            cache.set(self.cache_key, stats, settings.STATS_CACHE_TIMEOUT)
+        return Response(stats)
+
+    def compute_stats(self):
+        issue_totals = Issue.objects.aggregate(
+            active_issues=Count('id', filter=Q(returned=False)),
+            overdue_issues=Count('id', filter=Q(returned=False, due_date__lt=date.today())),
+            outstanding_fines=Coalesce(
+                Sum('fine_amount'), Value(0), output_field=DecimalField()
+            ),
+            # As of the last `manage.py accrue_fines` run
+            accrued_fines=Coalesce(
+                Sum('accrued_fine', filter=Q(overdue=True)), Value(0), output_field=DecimalField()
+            ),
+        )
+        return {
+            'total_books': Book.objects.count(),
+            'total_users': User.objects.count(),
+            **issue_totals,
+        }
+
+
+class AnalyticsView(APIView, metaclass=ABCMeta):
+    """
+    Staff reports read from the daily rollups (circulation.rollups) for
+    ?from=&to= (YYYY-MM-DD, inclusive); defaults to the last 30 rolled-up days.
+    Subclasses implement report().
+    """
+    permission_classes = [IsAdminUser]
+    default_days = 30
+
+    def get_period(self, request):
+        period = {}
+        for param in ('from', 'to'):
+            value = request.query_params.get(param)
+            try:
+                period[param] = date.fromisoformat(value) if value else None
+            except ValueError:
+                raise ValidationError({param: "Use YYYY-MM-DD"})
+        end = period['to'] or date.today() - timedelta(days=1)
+        start = period['from'] or end - timedelta(days=self.default_days - 1)
+        if start > end:
+            raise ValidationError({'from': "Must not be after 'to'"})
+        return start, end
+
+    def get(self, request):
+        start, end = self.get_period(request)
+        return Response({'from': start, 'to': end, 'results': self.report(request, start, end)})
+
+    @abstractmethod
+    def report(self, request, start, end):
+        """The `results` of the response for the period start..end"""
+
+
+class PopularBooksView(AnalyticsView):
+    """Most issued books; ?limit= (default 20, max 100)"""
+
+    def report(self, request, start, end):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            raise ValidationError({'limit': "Must be an integer"})
+        rows = rollups.popular_books(start, end, limit)
+        titles = dict(
+            Book.objects.filter(pk__in=[row['book_id'] for row in rows]).values_list('pk', 'title')
+        )
+        return [{**row, 'title': titles.get(row['book_id'])} for row in rows]
+
+
+class CategoryUsageView(AnalyticsView):
+    """Issues, returns and fines per category, split by borrower user_type"""
+
+    def report(self, request, start, end):
+        categories = {}
+        for row in rollups.category_usage(start, end):
+            category = categories.setdefault(row['category_id'], {
+                'category_id': row['category_id'],
+                'issues': 0, 'returns': 0, 'fines': 0, 'by_user_type': {},
+            })
+            category['issues'] += row['issues']
+            category['returns'] += row['returns']
+            category['fines'] += row['fines']
+            category['by_user_type'][row['user_type']] = row['issues']
+        names = dict(Category.objects.filter(pk__in=categories).values_list('pk', 'name'))
+        total = sum(category['issues'] for category in categories.values())
+        return sorted(
+            (
+                {
+                    **category,
+                    'name': names.get(category['category_id']),
+                    'share': round(category['issues'] / total, 4) if total else 0,
+                }
+                for category in categories.values()
+            ),
+            key=lambda category: -category['issues'],
+        )
+
+
+class CirculationSeriesView(AnalyticsView):
+    """Issues, returns, fines and end-of-period overdue loans; ?interval=day|week|month"""
+
+    def report(self, request, start, end):
+        interval = request.query_params.get('interval', 'day')
+        if interval not in rollups.INTERVALS:
+            raise ValidationError({'interval': f"One of {', '.join(rollups.INTERVALS)}"})
+        return rollups.circulation_series(start, end, interval)
+
+
+class CacheStatsView(APIView):
+    """Hit/miss counters of the catalogue response cache"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class MetricsView(APIView):
+    """Per-endpoint request metrics of this worker process; DELETE resets them"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+    def delete(self, request):
+        metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class IssueExportView(GenericAPIView):
+    """Stream issue history as CSV; accepts the same filters as /issues/"""
+    permission_classes = [IsAdminUser]
+    queryset = Issue.objects.all()
+    filter_backends = IssueViewSet.filter_backends
+    filterset_fields = IssueViewSet.filterset_fields
+    ordering_fields = IssueViewSet.ordering_fields
+    ordering = IssueViewSet.ordering
+
+    def get(self, request):
+        response = StreamingHttpResponse(
+            issue_csv_rows(self.filter_queryset(self.get_queryset())),
+            content_type='text/csv',
+        )
+        response['Content-Disposition'] = 'attachment; filename="issues.csv"'
+        return response
+
+
+class BookExportView(GenericAPIView):
+    """Stream the catalogue as NDJSON; accepts the same filters as /books/"""
+    permission_classes = [IsAdminUser]
+    queryset = Book.objects.all()
+    filter_backends = BookViewSet.filter_backends
+    filterset_fields = BookViewSet.filterset_fields
+    ordering_fields = BookViewSet.ordering_fields
+    ordering = BookViewSet.ordering
+
+    def get(self, request):
+        response = StreamingHttpResponse(
+            book_ndjson_rows(self.filter_queryset(self.get_queryset())),
+            content_type='application/x-ndjson',
+        )
+        response['Content-Disposition'] = 'attachment; filename="books.ndjson"'
+        return response
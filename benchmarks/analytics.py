@@ -0,0 +1,128 @@
+# benchmarks/analytics.py
+"""
+Analytics report latency from raw Issue rows vs the daily rollups, as the
+issue history gets longer.
+
+On a fixed synthetic catalogue, each step adds another year of issues before
+the current history, at the same daily volume. It then rolls up the whole
+history again and times the three /analytics/ reports over the last year.
+The reports run once computed from Issue (with joins through
+book_copy__book__category) and once read from the rollups. The rollup reads
+depend only on the year asked for; the raw overdue counts scan all history.
+
+    python -m benchmarks.analytics --years 1 2 4 --per-day 100
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import report, setup_django, time_calls
+
+
+def raw_reports(start, end):
+    """The rollup reports, computed from Issue"""
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncMonth
+
+    from circulation.models import Issue
+    from circulation.rollups import overdue_at
+
+    issued = Issue.objects.filter(issue_date__range=(start, end)).order_by()
+    returned = Issue.objects.filter(return_date__range=(start, end)).order_by()
+    popular = list(
+        issued.values('book_copy__book_id').annotate(issues=Count('pk')).order_by('-issues')[:20]
+    )
+    categories = (
+        list(issued.values('book_copy__book__category_id', 'user__user_type').annotate(n=Count('pk'))),
+        list(returned.values('book_copy__book__category_id').annotate(fines=Sum('fine_amount'))),
+    )
+    months = (
+        list(issued.annotate(month=TruncMonth('issue_date')).values('month').annotate(n=Count('pk'))),
+        list(returned.annotate(month=TruncMonth('return_date')).values('month')
+             .annotate(n=Count('pk'), fines=Sum('fine_amount'))),
+        [overdue_at(day) for day in month_ends(start, end)],
+    )
+    return popular, categories, months
+
+
+def month_ends(start, end):
+    day = end
+    while day >= start:
+        yield day
+        day = day.replace(day=1) - timedelta(days=1)
+
+
+def rollup_reports(start, end):
+    from circulation import rollups
+
+    return (
+        rollups.popular_books(start, end),
+        rollups.category_usage(start, end),
+        rollups.circulation_series(start, end, 'month'),
+    )
+
+
+def add_history(first_day, last_day, per_day, rng):
+    """Returned issues of random copies and users, `per_day` each day"""
+    from api.synthetic import LOAN_DAYS, batched, explicit_timestamps
+    from books.models import BookCopy
+    from circulation.models import FINE_PER_DAY, Issue
+    from accounts.models import User
+
+    copy_ids = list(BookCopy.objects.values_list('pk', flat=True))
+    user_ids = list(User.objects.values_list('pk', flat=True))
+
+    def issues():
+        day = first_day
+        while day <= last_day:
+            for _ in range(per_day):
+                due_date = day + timedelta(days=LOAN_DAYS)
+                return_date = day + timedelta(days=rng.randint(1, LOAN_DAYS + 10))
+                yield Issue(
+                    user_id=rng.choice(user_ids), book_copy_id=rng.choice(copy_ids),
+                    issue_date=day, due_date=due_date, return_date=return_date, returned=True,
+                    fine_amount=max(0, (return_date - due_date).days) * FINE_PER_DAY,
+                )
+            day += timedelta(days=1)
+
+    with explicit_timestamps(Issue._meta.get_field('issue_date')):
+        for batch in batched(issues(), 10000):
+            Issue.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 2, 4],
+                        help="History lengths to measure")
+    parser.add_argument('--per-day', type=int, default=100, help="Issues per day of history")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    setup_django()
+    from api.synthetic import SyntheticCatalogue
+    from circulation.models import DailyBookStats, DailyCirculationStats, Issue
+    from circulation.rollups import roll_up
+
+    rng = random.Random(args.seed)
+    SyntheticCatalogue({'books': 5000, 'copies': 10000, 'users': 2000, 'issues': 0}, seed=args.seed).seed()
+    # Loans of the last days are still out; history ends a month back
+    end = date.today() - timedelta(days=30)
+    start = end - timedelta(days=364)
+    first = end + timedelta(days=1)
+    for years in sorted(args.years):
+        oldest = end - timedelta(days=365 * years - 1)
+        add_history(oldest, first - timedelta(days=1), args.per_day, rng)
+        first = oldest
+        started = time.perf_counter()
+        roll_up(since=first)
+        rows = DailyBookStats.objects.count() + DailyCirculationStats.objects.count()
+        print(f"\n{years} years, {Issue.objects.count()} issues: rolled up in "
+              f"{time.perf_counter() - started:.1f}s into {rows} rollup rows")
+        report('raw Issue queries (last year)', time_calls(lambda: raw_reports(start, end), args.repeat))
+        report('rollups (last year)', time_calls(lambda: rollup_reports(start, end), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
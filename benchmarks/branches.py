@@ -0,0 +1,46 @@
+# benchmarks/branches.py
+"""
+Branch-scoped circulation queries on synthetic data. One branch's overdue
+loans and its latest issues are read twice: once filtered through the
+copy's branch (a join, the only way before Issue carried a branch), and
+once on Issue.branch, which leads issue_branch_open_idx and
+issue_branch_date_idx.
+
+    python -m benchmarks.branches --scale 0.01
+"""
+import argparse
+from datetime import date
+
+from benchmarks.common import report, setup_django, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=float, default=0.01,
+                        help="seed_synthetic scale (0.01 = 100k issues)")
+    parser.add_argument('--branch', default='East')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+
+    from circulation.models import Issue
+
+    call_command('seed_synthetic', scale=args.scale, seed=args.seed)
+    today = date.today()
+    for label, scope in [
+        ('copy join', {'book_copy__branch': args.branch}),
+        ('Issue.branch', {'branch': args.branch}),
+    ]:
+        overdue = Issue.objects.filter(returned=False, due_date__lt=today, **scope)
+        latest = Issue.objects.filter(**scope).order_by('-issue_date', 'id')
+        report(f'overdue count ({label})', time_calls(overdue.count, args.repeat))
+        report(f'latest 50 issues ({label})', time_calls(
+            lambda: list(latest.values_list('pk', flat=True)[:50]), args.repeat
+        ))
+
+
+if __name__ == '__main__':
+    main()
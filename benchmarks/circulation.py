@@ -0,0 +1,82 @@
+# benchmarks/circulation.py
+"""
+Circulation desk throughput: one-by-one issue/return vs the bulk endpoints' services.
+
+    python -m benchmarks.circulation --items 5000 --batch 50
+"""
+import argparse
+import time
+from datetime import date
+
+from benchmarks.common import setup_django
+
+
+def seed(item_count):
+    from accounts.models import User
+    from books.models import Book, BookCopy
+    from circulation.services import MAX_ACTIVE_ISSUES
+
+    book = Book.objects.create(title='Benchmark', isbn='9999999999999', publication_year=2000)
+    copies = BookCopy.objects.bulk_create(
+        [BookCopy(book=book, copy_number=f'BENCH-{i}') for i in range(item_count * 2)],
+        batch_size=5000,
+    )
+    users = User.objects.bulk_create(
+        [User(username=f'bench{i}', user_type='student') for i in range(item_count)],
+        batch_size=5000,
+    )
+    # Each user borrows MAX_ACTIVE_ISSUES copies so batches stay within the limit
+    return users, copies, MAX_ACTIVE_ISSUES
+
+
+def rate(label, count, seconds):
+    print(f"{label:<32} {count:>7} items in {seconds:7.2f}s  {count / seconds:10.1f} items/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from circulation.models import Issue
+    from circulation.services import bulk_checkout, bulk_return, checkout
+
+    users, copies, per_user = seed(args.items)
+    half = args.items
+    single_copies, bulk_copies = copies[:half], copies[half:]
+
+    def borrower(index):
+        return users[index // per_user]
+
+    start = time.perf_counter()
+    for i, copy in enumerate(single_copies):
+        checkout(borrower(i), copy)
+    rate('checkout one-by-one', half, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    batch = min(args.batch, per_user)
+    offset = half // per_user + 1
+    for i in range(0, half, batch):
+        user = users[offset + i // per_user]
+        bulk_checkout(user, [copy.copy_number for copy in bulk_copies[i:i + batch]])
+    rate(f'bulk_checkout (batch {batch})', half, time.perf_counter() - start)
+
+    # Mirrors IssueViewSet.return_book: load, flag, save
+    start = time.perf_counter()
+    for copy in single_copies:
+        issue = Issue.objects.select_related('book_copy').get(book_copy=copy, returned=False)
+        issue.returned = True
+        issue.return_date = date.today()
+        issue.save()
+    rate('return one-by-one', half, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, half, args.batch):
+        bulk_return(copy_numbers=[copy.copy_number for copy in bulk_copies[i:i + args.batch]])
+    rate(f'bulk_return (batch {args.batch})', half, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
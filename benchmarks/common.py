@@ -0,0 +1,38 @@
+# benchmarks/common.py
+import os
+import statistics
+import time
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def time_calls(fn, repeat):
+    """Run fn `repeat` times and return the timings in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def percentile(timings, pct):
+    ordered = sorted(timings)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def report(label, timings):
+    print(
+        f"{label:<40} p50={percentile(timings, 50):8.2f}ms "
+        f"p95={percentile(timings, 95):8.2f}ms "
+        f"p99={percentile(timings, 99):8.2f}ms "
+        f"mean={statistics.mean(timings):8.2f}ms"
+    )
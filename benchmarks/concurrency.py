@@ -0,0 +1,209 @@
+# benchmarks/concurrency.py
+"""
+Concurrent read throughput: sync viewsets under WSGI vs async views under ASGI.
+
+Seeds synthetic data once, then runs each server mode in its own process.
+WSGI is driven by a thread pool, as a threaded WSGI server would drive it.
+ASGI is driven by concurrent tasks on one event loop, with ASYNC_READ_VIEWS
+on as in LMS/asgi.py. Both call the handlers in-process, so network and
+server overhead are not counted. SQLite runs use a temporary file, because
+an in-memory database is not shared between threads.
+
+    python -m benchmarks.concurrency --scale 0.01 --concurrency 1 8 32
+    BENCH_DATABASE=mysql python -m benchmarks.concurrency --no-seed
+"""
+import argparse
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import report
+
+SERVERS = ('wsgi', 'asgi')
+
+
+def request_mix(book_ids, tokens):
+    """(path, token) pairs cycling through the hot read endpoints"""
+    staff, *borrowers = tokens
+    paths = []
+    for n, book_id in enumerate(book_ids):
+        paths += [
+            ('/api/v1/books/', staff),
+            ('/api/v1/books/?search=river', staff),
+            (f'/api/v1/books/{book_id}/', staff),
+            ('/api/v1/issues/my_issues/', borrowers[n % len(borrowers)]),
+        ]
+    return paths
+
+
+def wsgi_request(handler, path, token):
+    """Run one GET through a WSGI handler; returns (milliseconds, status line)"""
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+    }
+    statuses = []
+    start = time.perf_counter()
+    response = handler(environ, lambda status, headers: statuses.append(status))
+    b''.join(response)
+    response.close()  # request_finished: closes or keeps the thread's DB connection
+    return (time.perf_counter() - start) * 1000, statuses[0]
+
+
+def run_wsgi(handler, requests, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda request: wsgi_request(handler, *request), requests))
+
+
+async def run_asgi(application, requests, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def call(request):
+        path, token = request
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        done = asyncio.Event()
+        messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+        status = []
+
+        async def receive():
+            message = next(messages, None)
+            if message is None:
+                await done.wait()
+                message = {'type': 'http.disconnect'}
+            return message
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif not message.get('more_body'):
+                done.set()
+
+        async with slots:
+            start = time.perf_counter()
+            await application(scope, receive, send)
+            return (time.perf_counter() - start) * 1000, status[0]
+
+    return await asyncio.gather(*(call(request) for request in requests))
+
+
+def serve(args):
+    """Child process: measure one server mode"""
+    from benchmarks.common import setup_django
+
+    setup_django()
+    from django.conf import settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from accounts.models import User
+    from books.models import Book
+
+    settings.ALLOWED_HOSTS = ['localhost']
+    staff = User.objects.filter(is_staff=True).order_by('pk').first()
+    borrowers = list(User.objects.filter(issues__returned=False).distinct().order_by('pk')[:200])
+    if staff is None or not borrowers:
+        raise SystemExit("Needs a staff user and open issues; seed first")
+    tokens = [str(AccessToken.for_user(user)) for user in [staff, *borrowers]]
+    book_ids = list(Book.objects.order_by('?').values_list('pk', flat=True)[:args.requests // 4 + 1])
+    requests = request_mix(book_ids, tokens)[:args.requests]
+
+    if args.server == 'wsgi':
+        from django.core.handlers.wsgi import WSGIHandler
+        handler = WSGIHandler()
+
+        def run(concurrency):
+            return run_wsgi(handler, requests, concurrency)
+    else:
+        from django.core.asgi import get_asgi_application
+        application = get_asgi_application()
+
+        def run(concurrency):
+            return asyncio.run(run_asgi(application, requests, concurrency))
+
+    run(1)  # warm-up
+    for concurrency in args.concurrency:
+        start = time.perf_counter()
+        results = run(concurrency)
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for _, status in results if not str(status).startswith('200'))
+        report(
+            f'{args.server} x{concurrency} {len(results) / elapsed:7.1f} req/s'
+            + (f' {failed} failed' if failed else ''),
+            [timing for timing, _ in results],
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=float, default=0.01)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-seed', action='store_true',
+                        help="Use the data already in the database")
+    parser.add_argument('--cache', action='store_true',
+                        help="Keep the server-side response cache on (off by default)")
+    parser.add_argument('--server', choices=SERVERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.server:
+        return serve(args)
+
+    env = dict(
+        os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings',
+        METRICS_SLOW_REQUEST_MS='1000000', METRICS_QUERY_THRESHOLD='1000000',
+    )
+    if not args.cache:
+        env['API_CACHE_TIMEOUT'] = '0'
+    if os.getenv('BENCH_DATABASE', 'sqlite') != 'mysql' \
+            and os.getenv('BENCH_SQLITE_PATH', ':memory:') == ':memory:':
+        env['BENCH_SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    if not args.no_seed:
+        subprocess.run(
+            [sys.executable, 'manage.py', 'migrate', '-v0'], env=env, check=True,
+        )
+        subprocess.run(
+            [sys.executable, 'manage.py', 'seed_synthetic', f'--scale={args.scale}', f'--seed={args.seed}'],
+            env=env, check=True,
+        )
+
+    for server in SERVERS:
+        child_env = dict(env, ASYNC_READ_VIEWS=str(server == 'asgi'))
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.concurrency', '--server', server,
+             '--requests', str(args.requests), '--concurrency', *map(str, args.concurrency)],
+            env=child_env, check=True,
+        )
+
+
+if __name__ == '__main__':
+    main()
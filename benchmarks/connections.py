@@ -0,0 +1,74 @@
+# benchmarks/connections.py
+"""
+Per-request latency of small endpoints with and without persistent connections.
+
+Requests go through the WSGI handler one after another on a single thread,
+so request_finished closes or keeps the connection exactly as it would in
+a server worker. Compare DB_CONN_MAX_AGE=0 (connect per request) with
+persistent connections, with and without health checks. Run against MySQL
+to see the real connect and auth cost. SQLite connects are nearly free, and
+runs on it use a temporary file so the data outlives each connection.
+
+    BENCH_DATABASE=mysql python -m benchmarks.connections --repeat 500
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.concurrency import wsgi_request
+from benchmarks.common import report
+
+MODES = {
+    'CONN_MAX_AGE=0': (0, False),
+    'CONN_MAX_AGE=60': (60, False),
+    'CONN_MAX_AGE=60 + health checks': (60, True),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+
+    if os.getenv('BENCH_DATABASE', 'sqlite') != 'mysql' \
+            and os.getenv('BENCH_SQLITE_PATH', ':memory:') == ':memory:':
+        os.environ['BENCH_SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+
+    from benchmarks.common import setup_django
+    setup_django()
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection, connections
+    from django.db.backends.signals import connection_created
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from accounts.models import User
+    from books.models import Category
+
+    settings.ALLOWED_HOSTS = ['localhost']
+    Category.objects.bulk_create([Category(name=f'Category {n}') for n in range(20)])
+    user = User.objects.create_user(username='bench-connections', password='x', user_type='student')
+    token = str(AccessToken.for_user(user))
+    connection.close()
+
+    connects = []
+    connection_created.connect(lambda **kwargs: connects.append(1), weak=False)
+    handler = WSGIHandler()
+
+    for label, (max_age, health_checks) in MODES.items():
+        for settings_dict in (connection.settings_dict, connections.settings['default']):
+            settings_dict['CONN_MAX_AGE'] = max_age
+            settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+        for path in ('/api/v1/categories/', '/api/v1/users/me/'):
+            connection.close()
+            for _ in range(10):  # warm-up
+                wsgi_request(handler, path, token)
+            connects.clear()
+            results = [wsgi_request(handler, path, token) for _ in range(args.repeat)]
+            assert all(status.startswith('200') for _, status in results), results[:3]
+            report(f'{label:<32} {path:<20} {len(connects):>4} connects',
+                   [timing for timing, _ in results])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/endpoints.py
+"""
+API endpoint latency on synthetic data: the hot read paths plus returns.
+
+Requests go through the full Django/DRF stack (middleware, auth, filters,
+serializers, rendering) with the in-process test client, so figures exclude
+network and WSGI server overhead. Seeds with `seed_synthetic` first.
+
+    python -m benchmarks.endpoints --scale 0.01 --repeat 200
+    BENCH_DATABASE=mysql python -m benchmarks.endpoints --no-seed
+"""
+import argparse
+import random
+
+from benchmarks.common import report, setup_django, time_calls
+
+
+def scenarios(rng, borrowers, staff, open_issues):
+    """(label, user, request fn) per endpoint; each fn picks fresh random arguments"""
+    queries = ['river', 'forgotten kingdom', 'kingd', 'tanaka', 'silent night']
+    returns = iter(open_issues)
+
+    def book_list(client):
+        return client.get('/api/v1/books/', {'page_size': 20})
+
+    def book_list_filtered(client):
+        return client.get('/api/v1/books/', {'language': 'French', 'ordering': '-publication_year'})
+
+    def book_search(client):
+        return client.get('/api/v1/books/', {'search': rng.choice(queries)})
+
+    def book_detail(client):
+        return client.get(f'/api/v1/books/{rng.choice(book_ids)}/')
+
+    def my_issues(client):
+        client.force_authenticate(rng.choice(borrowers))
+        return client.get('/api/v1/issues/my_issues/')
+
+    def overdue(client):
+        return client.get('/api/v1/issues/overdue/')
+
+    def return_book(client):
+        return client.post(f'/api/v1/issues/{next(returns)}/return_book/')
+
+    from books.models import Book
+    book_ids = list(Book.objects.values_list('pk', flat=True)[:10000])
+    return [
+        ('GET books/', staff, book_list),
+        ('GET books/?language&ordering', staff, book_list_filtered),
+        ('GET books/?search=', staff, book_search),
+        ('GET books/<id>/', staff, book_detail),
+        ('GET issues/my_issues/', None, my_issues),
+        ('GET issues/overdue/', staff, overdue),
+        ('POST issues/<id>/return_book/', staff, return_book),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=float, default=0.01,
+                        help="seed_synthetic scale (0.01 = 10k books, 100k issues)")
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-seed', action='store_true',
+                        help="Use the data already in the database")
+    parser.add_argument('--cache', action='store_true',
+                        help="Keep the server-side response cache on (off by default)")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+    from rest_framework.test import APIClient
+
+    from accounts.models import User
+    from api import metrics
+    from circulation.models import Issue
+
+    setup_test_environment()  # allows the test client's 'testserver' host
+    if not args.cache:
+        settings.API_CACHE_TIMEOUT = 0
+    if not args.no_seed:
+        call_command('seed_synthetic', scale=args.scale, seed=args.seed)
+
+    rng = random.Random(args.seed)
+    staff = User.objects.filter(is_staff=True).order_by('pk').first()
+    if staff is None:
+        raise SystemExit("No staff user to authenticate as; seed first")
+    borrowers = list(
+        User.objects.filter(issues__returned=False).distinct().order_by('pk')[:1000]
+    ) or [staff]
+    open_issues = list(
+        Issue.objects.filter(returned=False).order_by('pk').values_list('pk', flat=True)[:args.repeat + 1]
+    )
+
+    client = APIClient()
+    for label, user, request in scenarios(rng, borrowers, staff, open_issues):
+        if label.startswith('POST') and len(open_issues) <= args.repeat:
+            print(f"{label:<40} skipped: not enough open issues")
+            continue
+        if user is not None:
+            client.force_authenticate(user)
+        response = request(client)  # warm-up
+        if response.status_code >= 400:
+            print(f"{label:<40} failed: HTTP {response.status_code}")
+            continue
+        metrics.reset()
+        timings = time_calls(lambda: request(client), args.repeat)
+        endpoint = next(iter(metrics.snapshot().values()), None)
+        queries = endpoint['queries']['mean'] if endpoint else 0
+        report(f'{label} [{queries:g}q]', timings)
+
+
+if __name__ == '__main__':
+    main()
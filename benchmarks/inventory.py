@@ -0,0 +1,85 @@
+# benchmarks/inventory.py
+"""
+Shelf audit latency on synthetic data: paging through every copy to find
+one shelf range (the only way before copies had a structured location)
+against one /copies/shelf-walk/ request. It also times a shelf audit saving
+copies one at a time against /copies/audit/ (bulk_update).
+
+    python -m benchmarks.inventory --scale 0.005
+"""
+import argparse
+import random
+import re
+
+from benchmarks.common import report, setup_django, time_calls
+
+SHELF_LABEL = re.compile(r'Shelf (\d+)-')
+
+
+def page_through(client, shelf_from, shelf_to):
+    """Copies whose free-text label falls in the shelf range, found by paging"""
+    found = []
+    url, params = '/api/v1/copies/', {'page_size': 100}
+    while url:
+        data = client.get(url, params).data
+        url, params = data['next'], None
+        for copy in data['results']:
+            match = SHELF_LABEL.match(copy['location'])
+            if match and shelf_from <= int(match.group(1)) <= shelf_to:
+                found.append(copy)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=float, default=0.005,
+                        help="seed_synthetic scale (0.005 = 25k copies)")
+    parser.add_argument('--shelves', type=int, default=10, help="Shelves per walk")
+    parser.add_argument('--audit-size', type=int, default=500, help="Copies per audit")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+    from rest_framework.test import APIClient
+
+    from accounts.models import User
+    from books.models import BookCopy
+
+    setup_test_environment()
+    settings.API_CACHE_TIMEOUT = 0
+    call_command('seed_synthetic', scale=args.scale, seed=args.seed)
+    rng = random.Random(args.seed)
+    client = APIClient()
+    client.force_authenticate(User.objects.filter(is_staff=True).order_by('pk').first())
+    print(f"{BookCopy.objects.count()} copies")
+
+    def walk_range():
+        shelf_from = rng.randint(100, 199 - args.shelves)
+        return shelf_from, shelf_from + args.shelves - 1
+
+    report('page through copies/', time_calls(lambda: page_through(client, *walk_range()), args.repeat))
+    report('GET copies/shelf-walk/', time_calls(lambda: client.get('/api/v1/copies/shelf-walk/', dict(
+        zip(('shelf_from', 'shelf_to'), walk_range()), branch='Main', floor=1,
+    )), args.repeat))
+
+    copy_ids = list(BookCopy.objects.values_list('pk', flat=True))
+
+    def save_each():
+        for pk in rng.sample(copy_ids, args.audit_size):
+            client.patch(f'/api/v1/copies/{pk}/', {'condition': 'fair'}, format='json')
+
+    def audit():
+        client.post('/api/v1/copies/audit/', {'copies': [
+            {'id': pk, 'condition': 'fair'} for pk in rng.sample(copy_ids, args.audit_size)
+        ]}, format='json')
+
+    report(f'PATCH copies/<id>/ x{args.audit_size}', time_calls(save_each, args.repeat))
+    report(f'POST copies/audit/ ({args.audit_size})', time_calls(audit, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
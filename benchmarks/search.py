@@ -0,0 +1,113 @@
+# benchmarks/search.py
+"""
+Catalogue search latency: the old icontains SearchFilter vs the inverted index,
+and the in-memory typeahead index behind /books/suggest/.
+
+    python -m benchmarks.search --books 100000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import report, setup_django, time_calls
+
+WORDS = (
+    'war peace river night garden empire shadow silent winter summer city '
+    'ocean stone fire glass history secret house journey kingdom light dark '
+    'iron golden broken forgotten last first little great lost hidden wild '
+    'song storm moon star island mountain forest road letter daughter'
+).split()
+FIRST_NAMES = 'jane john maria ahmed li olga pierre sofia kenji amara'.split()
+LAST_NAMES = 'austen smith garcia khan chen petrova dubois rossi tanaka okafor'.split()
+
+
+def seed(book_count, rng):
+    from books.models import Author, Book
+    from books.search import rebuild_index
+
+    authors = Author.objects.bulk_create([
+        Author(name=f'{rng.choice(FIRST_NAMES).title()} {rng.choice(LAST_NAMES).title()} {i}')
+        for i in range(max(1, book_count // 5))
+    ])
+    books = Book.objects.bulk_create(
+        [
+            Book(
+                title=' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title(),
+                isbn=f'978{i:010d}',
+                publication_year=rng.randint(1900, 2020),
+            )
+            for i in range(book_count)
+        ],
+        batch_size=5000,
+    )
+    Book.authors.through.objects.bulk_create(
+        [
+            Book.authors.through(book_id=book.pk, author_id=author.pk)
+            for book in books
+            for author in rng.sample(authors, k=min(len(authors), rng.randint(1, 2)))
+        ],
+        batch_size=5000,
+    )
+    return rebuild_index(batch_size=5000)
+
+
+def icontains_search(query):
+    from django.db.models import Q
+    from books.models import Book
+
+    # Equivalent of SearchFilter(search_fields=['title', 'isbn', 'authors__name'])
+    queryset = Book.objects.filter(
+        Q(title__icontains=query) | Q(isbn__icontains=query) | Q(authors__name__icontains=query)
+    ).distinct()
+    return list(queryset.order_by('-created_at', 'id')[:20])
+
+
+def index_search(query):
+    from books.models import Book
+    from books.search import search_books
+
+    return list(search_books(Book.objects.all(), query).order_by('-search_rank', 'id')[:20])
+
+
+def suggest(query):
+    from books.suggest import suggest_index
+
+    return suggest_index.suggest(query)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    setup_django()
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    indexed = seed(args.books, rng)
+    print(f"Seeded and indexed {indexed} books in {time.perf_counter() - start:.1f}s\n")
+
+    from books.suggest import suggest_index
+
+    start = time.perf_counter()
+    suggest_index.refresh()
+    print(f"Built the suggest index in {time.perf_counter() - start:.1f}s\n")
+
+    queries = {
+        'single word': 'forgotten',
+        'prefix': 'kingd',
+        'two words': 'silent river',
+        'author surname': 'tanaka',
+        'exact isbn': f'978{args.books // 2:010d}',
+        'no match': 'zanzibar',
+    }
+    for label, query in queries.items():
+        report(f'icontains  {label} ({query})', time_calls(lambda: icontains_search(query), args.repeat))
+        report(f'index      {label} ({query})', time_calls(lambda: index_search(query), args.repeat))
+        report(f'suggest    {label} ({query})', time_calls(lambda: suggest(query), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
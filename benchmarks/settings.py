@@ -0,0 +1,23 @@
+# benchmarks/settings.py
+"""
+Settings for the benchmark scripts: the project settings on a throwaway
+SQLite database by default. Set BENCH_DATABASE=mysql to run against the
+DB_* MySQL configuration instead (use a scratch database, it gets seeded).
+"""
+import os
+
+from LMS.settings import *  # noqa: F401,F403
+from LMS.settings import DATABASES
+
+SECRET_KEY = SECRET_KEY or 'benchmark'  # noqa: F405
+DEBUG = False
+
+if os.getenv('BENCH_DATABASE', 'sqlite') != 'mysql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('BENCH_SQLITE_PATH', ':memory:'),
+            'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+            'CONN_HEALTH_CHECKS': DATABASES['default']['CONN_HEALTH_CHECKS'],
+        }
+    }
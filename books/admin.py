@@ -33,6 +33,8 @@ class BookAdmin(admin.ModelAdmin):
         'publication_year',
         'language',
         'publisher',
+        'available_copies',
+        'total_copies',
     )
     list_filter = ('publication_year', 'language', 'category')
     search_fields = ('title', 'isbn')
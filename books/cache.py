@@ -0,0 +1,46 @@
+# books/cache.py
+"""
+Versioned cache scopes for catalogue reads.
+
+Cached API responses are keyed by the current version token of every scope
+they depend on; invalidate() swaps the token, so stale entries are never
+read again and simply expire. The receivers in books/signals.py invalidate
+on writes; bulk writers (queryset.update, bulk_create) call invalidate()
+themselves. A swapped token only reaches the workers sharing the cache,
+which is why settings.API_CACHE_TIMEOUT defaults to 0 on locmem.
+
+The 'availability' scope covers the copy counters on Book, which change with
+every checkout and return: only book detail responses depend on it, so
+circulation doesn't flush the cached catalogue lists.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+SCOPES = ('book', 'author', 'category', 'publisher', 'availability')
+
+
+def version_key(scope):
+    return f'catalogue:version:{scope}'
+
+
+def scope_versions(*scopes):
+    """Current version token of each scope, creating missing ones"""
+    keys = {scope: version_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    missing = {key: uuid.uuid4().hex for key in keys.values() if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {scope: found[key] for scope, key in keys.items()}
+
+
+def invalidate(*scopes):
+    def bump():
+        cache.set_many({version_key(scope): uuid.uuid4().hex for scope in scopes}, None)
+
+    # Bump now, and again once the transaction commits, so a request that read
+    # the old rows before the commit can't leave them cached under the new token
+    bump()
+    transaction.on_commit(bump)
@@ -0,0 +1,282 @@
+# books/importers.py
+"""
+Streaming catalogue import used by `manage.py import_catalogue`.
+
+Readers turn CSV, JSON Lines, JSON arrays and MARC-ish text (.mrk) into
+plain record dicts one at a time; CatalogueImporter writes them in batches
+with bulk_create, so memory stays flat whatever the file size.
+"""
+import csv
+import json
+import re
+from collections import Counter
+
+from django.db import connection, transaction
+
+from books.cache import SCOPES, invalidate
+from books.models import Author, Book, BookCopy, Category, Publisher
+from books.search import index_books
+
+BOOK_UPDATE_FIELDS = [
+    'title', 'publication_year', 'language', 'description', 'cover_image',
+    'total_pages', 'category', 'publisher', 'updated_at',
+]
+
+
+class CatalogueImportError(ValueError):
+    pass
+
+
+# Readers
+
+def read_csv(path):
+    """CSV with a header row; multiple authors are separated by ';'"""
+    with open(path, newline='', encoding='utf-8') as fh:
+        for row in csv.DictReader(fh):
+            names = (row.get('authors') or '').split(';')
+            row['authors'] = [name.strip() for name in names if name.strip()]
+            yield row
+
+
+def read_json_lines(path):
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_json_array(path, chunk_size=1 << 16):
+    """Incrementally decode a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as fh:
+        buffer = fh.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            raise CatalogueImportError("Expected a JSON array")
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                chunk = fh.read(chunk_size)
+                if not chunk:
+                    raise CatalogueImportError("Truncated JSON array")
+                buffer += chunk
+                continue
+            yield record
+            buffer = buffer[end:]
+
+
+MARC_FIELD_RE = re.compile(r'^=(\d{3})  (.*)$')
+
+
+def read_marc(path):
+    """
+    MARC-ish mnemonic text (.mrk): one `=TAG  ind$asub$bsub` line per field,
+    records separated by blank lines. Understands 020 (ISBN), 041 (language),
+    100/700 (authors), 245 (title), 260/264 (publisher, year), 300 (pages),
+    520 (description) and 650 (first subject becomes the category).
+    """
+    def subfields(value):
+        parts = value[2:].split('$')[1:]  # skip the two indicator characters
+        return {part[0]: part[1:].strip(' /:;,.') for part in parts if part}
+
+    def to_record(fields):
+        record = {'authors': []}
+        for tag, value in fields:
+            sub = subfields(value)
+            if tag == '020' and 'a' in sub:
+                record.setdefault('isbn', sub['a'].split()[0])
+            elif tag == '041' and 'a' in sub:
+                record['language'] = sub['a']
+            elif tag in ('100', '700') and 'a' in sub:
+                record['authors'].append(sub['a'])
+            elif tag == '245':
+                record['title'] = ': '.join(filter(None, [sub.get('a'), sub.get('b')]))
+            elif tag in ('260', '264'):
+                if 'b' in sub:
+                    record['publisher'] = sub['b']
+                if 'c' in sub:
+                    record['publication_year'] = re.sub(r'\D', '', sub['c'])[:4]
+            elif tag == '300' and 'a' in sub:
+                record['total_pages'] = re.sub(r'\D', '', sub['a'].split()[0])
+            elif tag == '520' and 'a' in sub:
+                record['description'] = sub['a']
+            elif tag == '650' and 'a' in sub:
+                record.setdefault('category', sub['a'])
+        return record
+
+    fields = []
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            line = line.rstrip('\n')
+            if not line.strip():
+                if fields:
+                    yield to_record(fields)
+                fields = []
+                continue
+            match = MARC_FIELD_RE.match(line)
+            if match:
+                fields.append(match.groups())
+    if fields:
+        yield to_record(fields)
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_json_lines,
+    'ndjson': read_json_lines,
+    'json': read_json_array,
+    'mrk': read_marc,
+    'marc': read_marc,
+}
+
+
+def read_records(path, fmt=None):
+    fmt = fmt or path.rsplit('.', 1)[-1].lower()
+    if fmt not in READERS:
+        raise CatalogueImportError(f"Unsupported format '{fmt}' (use one of {', '.join(READERS)})")
+    return READERS[fmt](path)
+
+
+# Normalisation
+
+def _int_or_none(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_record(record):
+    """Clean a raw record; raises CatalogueImportError when it can't become a Book"""
+    isbn = re.sub(r'[\s-]', '', str(record.get('isbn') or '')).upper()
+    title = (record.get('title') or '').strip()
+    year = _int_or_none(record.get('publication_year'))
+    if not isbn or len(isbn) > 13:
+        raise CatalogueImportError(f"invalid ISBN {record.get('isbn')!r}")
+    if not title:
+        raise CatalogueImportError(f"{isbn}: missing title")
+    if year is None:
+        raise CatalogueImportError(f"{isbn}: missing publication_year")
+
+    authors = record.get('authors') or []
+    if isinstance(authors, str):
+        authors = authors.split(';')
+    return {
+        'isbn': isbn,
+        'title': title[:255],
+        'publication_year': year,
+        'language': (record.get('language') or 'English').strip()[:50],
+        'description': (record.get('description') or '').strip(),
+        'cover_image': (record.get('cover_image') or '').strip(),
+        'total_pages': _int_or_none(record.get('total_pages')),
+        'authors': list(dict.fromkeys(a.strip()[:100] for a in authors if a and a.strip())),
+        'category': (record.get('category') or '').strip()[:100] or None,
+        'publisher': (record.get('publisher') or '').strip()[:100] or None,
+        'copies': _int_or_none(record.get('copies')) or 0,
+    }
+
+
+# Writer
+
+class NameMap:
+    """In-memory name -> id map for a lookup model, creating missing rows in bulk"""
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = dict(model.objects.order_by().values_list('name', 'id'))
+
+    def resolve(self, names):
+        missing = [name for name in dict.fromkeys(names) if name not in self.ids]
+        if missing:
+            created = self.model.objects.bulk_create([self.model(name=name) for name in missing])
+            if all(obj.pk for obj in created):
+                self.ids.update((obj.name, obj.pk) for obj in created)
+            else:
+                # Backends without RETURNING (MySQL) don't set pks on bulk_create
+                self.ids.update(
+                    self.model.objects.filter(name__in=missing).values_list('name', 'id')
+                )
+        return self.ids
+
+
+class CatalogueImporter:
+    def __init__(self):
+        self.authors = NameMap(Author)
+        self.categories = NameMap(Category)
+        self.publishers = NameMap(Publisher)
+        self.stats = Counter()
+
+    def import_batch(self, records):
+        """Upsert one batch of normalised records in a single transaction"""
+        # Last record wins when an ISBN repeats within the batch
+        records = list({record['isbn']: record for record in records}.values())
+        if not records:
+            return
+
+        with transaction.atomic():
+            authors = self.authors.resolve(a for r in records for a in r['authors'])
+            categories = self.categories.resolve(r['category'] for r in records if r['category'])
+            publishers = self.publishers.resolve(r['publisher'] for r in records if r['publisher'])
+
+            books = [
+                Book(
+                    isbn=r['isbn'],
+                    title=r['title'],
+                    publication_year=r['publication_year'],
+                    language=r['language'],
+                    description=r['description'],
+                    cover_image=r['cover_image'],
+                    total_pages=r['total_pages'],
+                    category_id=categories.get(r['category']),
+                    publisher_id=publishers.get(r['publisher']),
+                )
+                for r in records
+            ]
+            upsert = {'update_conflicts': True, 'update_fields': BOOK_UPDATE_FIELDS}
+            if connection.features.supports_update_conflicts_with_target:
+                upsert['unique_fields'] = ['isbn']
+            Book.objects.bulk_create(books, **upsert)
+            book_ids = dict(
+                Book.objects.filter(isbn__in=[r['isbn'] for r in records])
+                .order_by().values_list('isbn', 'id')
+            )
+
+            # Replace the author links of every book in the batch
+            Through = Book.authors.through
+            Through.objects.filter(book_id__in=book_ids.values()).delete()
+            Through.objects.bulk_create([
+                Through(book_id=book_ids[r['isbn']], author_id=authors[name])
+                for r in records
+                for name in r['authors']
+            ])
+
+            self.stats['copies'] += self.create_copies(records, book_ids)
+
+            touched = Book.objects.filter(pk__in=book_ids.values())
+            touched.refresh_copy_counters()
+            index_books(touched.prefetch_related('authors'))
+            # bulk_create skips the signals that version the response cache
+            invalidate(*SCOPES)
+
+        self.stats['books'] += len(records)
+
+    def create_copies(self, records, book_ids):
+        """Top each book up to the requested number of copies; returns how many were inserted"""
+        wanted = {book_ids[r['isbn']]: (r['isbn'], r['copies']) for r in records if r['copies']}
+        if not wanted:
+            return 0
+        existing = Counter(
+            BookCopy.objects.filter(book_id__in=wanted).values_list('book_id', flat=True)
+        )
+        copies = [
+            BookCopy(book_id=book_id, copy_number=f'{isbn}-{n}')
+            for book_id, (isbn, count) in wanted.items()
+            for n in range(existing[book_id] + 1, count + 1)
+        ]
+        BookCopy.objects.bulk_create(copies, ignore_conflicts=True)
+        # ignore_conflicts skips copy numbers that are taken (and doesn't say which)
+        return BookCopy.objects.filter(book_id__in=wanted).count() - sum(existing.values())
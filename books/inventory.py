@@ -0,0 +1,61 @@
+# books/inventory.py
+"""
+Shelf walks and audits over the structured copy location
+(BookCopy.branch/floor/shelf).
+
+shelf_walk() returns every copy in a shelf range of one branch in shelf
+order: branch, floor, shelf, copy number. That is the order of
+copy_shelf_order_idx, so the walk is one range scan of the index, with the
+book joined in. audit_copies() records a shelf audit: the copies seen, and
+any condition changes, written with bulk_update in AUDIT_BATCH_SIZE batches.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from books.models import BookCopy
+
+AUDIT_BATCH_SIZE = 500
+SHELF_ORDER = ('branch', 'floor', 'shelf', 'copy_number')
+
+
+def shelf_walk(branch, floor=None, shelf_from=None, shelf_to=None, held=False, copies=None):
+    """
+    Copies of `branch` (optionally one floor and a shelf range), in shelf
+    order. held=True keeps only copies held for a ready reservation: the
+    pick list for the hold shelf.
+    """
+    from circulation.models import Reservation
+
+    copies = BookCopy.objects.all() if copies is None else copies
+    copies = copies.filter(branch=branch)
+    if floor is not None:
+        copies = copies.filter(floor=floor)
+    if shelf_from is not None:
+        copies = copies.filter(shelf__gte=shelf_from)
+    if shelf_to is not None:
+        copies = copies.filter(shelf__lte=shelf_to)
+    if held:
+        copies = copies.filter(Exists(
+            Reservation.objects.filter(held_copy=OuterRef('pk'), status='ready')
+        ))
+    return copies.select_related('book').order_by(*SHELF_ORDER)
+
+
+def audit_copies(items, seen_at=None):
+    """
+    Mark copies seen at `seen_at` (default: now) and apply their condition.
+    `items` is a list of {id, condition?}. Returns (copies updated, ids not
+    found).
+    """
+    seen_at = seen_at or timezone.now()
+    conditions = {item['id']: item.get('condition') for item in items}
+    copies = BookCopy.objects.only('pk', 'condition', 'last_seen_at').in_bulk(list(conditions))
+    for pk, copy in copies.items():
+        copy.last_seen_at = seen_at
+        copy.condition = conditions[pk] or copy.condition
+    with transaction.atomic():
+        BookCopy.objects.bulk_update(
+            copies.values(), ['last_seen_at', 'condition'], batch_size=AUDIT_BATCH_SIZE
+        )
+    return len(copies), sorted(conditions.keys() - copies.keys())
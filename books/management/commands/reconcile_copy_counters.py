@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = "Fix drift between Book.available_copies/total_copies and the BookCopy rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true', help="Report drifted books without fixing them"
+        )
+
+    def handle(self, *args, **options):
+        drifted = list(
+            Book.objects.with_copy_counts()
+            .filter(
+                ~Q(available_copies=F('num_available_copies')) | ~Q(total_copies=F('num_copies'))
+            )
+            .order_by()
+            .values_list('pk', flat=True)
+        )
+        self.stdout.write(f"{len(drifted)} books with drifted copy counters")
+        if options['dry_run'] or not drifted:
+            return
+
+        batch_size = options['batch_size']
+        for start in range(0, len(drifted), batch_size):
+            Book.objects.filter(pk__in=drifted[start:start + batch_size]).refresh_copy_counters()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {len(drifted)} books"))
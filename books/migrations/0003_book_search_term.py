@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from books.search import book_terms
+
+
+def build_search_index(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    BookSearchTerm = apps.get_model('books', 'BookSearchTerm')
+    rows = []
+    for book in Book.objects.prefetch_related('authors').iterator(chunk_size=1000):
+        rows.extend(
+            BookSearchTerm(book_id=book.pk, term=term, weight=weight)
+            for term, weight in book_terms(book).items()
+        )
+        if len(rows) >= 5000:
+            BookSearchTerm.objects.bulk_create(rows)
+            rows = []
+    BookSearchTerm.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_alter_book_options_book_book_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='books.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'book'], name='books_books_term_ca50ad_idx')],
+                'unique_together': {('book', 'term')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
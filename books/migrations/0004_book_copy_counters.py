@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:33
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_copy_counters(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    BookCopy = apps.get_model('books', 'BookCopy')
+
+    def copy_count(**filters):
+        copies = (
+            BookCopy.objects.filter(book=OuterRef('pk'), **filters)
+            .order_by().values('book').annotate(n=Count('pk')).values('n')
+        )
+        return Coalesce(Subquery(copies), 0)
+
+    Book.objects.update(
+        available_copies=copy_count(is_available=True),
+        total_copies=copy_count(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_book_search_term'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='available_copies',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='total_copies',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['available_copies'], name='books_book_availab_bb9890_idx'),
+        ),
+        migrations.RunPython(fill_copy_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:43
+
+import re
+
+from django.db import migrations, models
+
+# Free-text labels like "Shelf 12-3" or "12B": keep the leading shelf number
+SHELF_LABEL = re.compile(r'^\s*(?:shelf\s*)?(\d+)', re.IGNORECASE)
+
+
+def fill_shelves(apps, schema_editor):
+    BookCopy = apps.get_model('books', 'BookCopy')
+    copies = []
+    for copy in BookCopy.objects.exclude(location='').only('pk', 'location').iterator(chunk_size=2000):
+        match = SHELF_LABEL.match(copy.location)
+        if match:
+            copy.shelf = int(match.group(1))
+            copies.append(copy)
+    BookCopy.objects.bulk_update(copies, ['shelf'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_lookup_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookcopy',
+            name='branch',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='bookcopy',
+            name='floor',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookcopy',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookcopy',
+            name='shelf',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bookcopy',
+            index=models.Index(fields=['branch', 'floor', 'shelf', 'copy_number'], name='copy_shelf_order_idx'),
+        ),
+        migrations.RunPython(fill_shelves, migrations.RunPython.noop),
+    ]
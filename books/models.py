@@ -1,5 +1,8 @@
 # books/models.py
 from django.db import models
+from django.db.models.functions import Coalesce, Greatest
+
+from books.cache import invalidate
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime
 
@@ -7,6 +10,7 @@ class Author(models.Model):
     name = models.CharField(max_length=100)
     bio = models.TextField(blank=True)  # Added
     created_at = models.DateTimeField(auto_now_add=True)  # Added
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['name']
@@ -17,6 +21,7 @@ class Author(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)  # Made unique
     description = models.TextField(blank=True)  # Added
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         verbose_name_plural = 'Categories'
@@ -28,6 +33,7 @@ class Category(models.Model):
 class Publisher(models.Model):
     name = models.CharField(max_length=100)
     website = models.URLField(blank=True)  # Added
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['name']
@@ -35,6 +41,44 @@ class Publisher(models.Model):
     def __str__(self):
         return self.name
 
+class BookQuerySet(models.QuerySet):
+    def with_copy_counts(self):
+        """Annotate live available/total copy counts (used to reconcile the counters)"""
+        return self.annotate(
+            num_available_copies=models.Count(
+                'copies', filter=models.Q(copies__is_available=True), distinct=True
+            ),
+            num_copies=models.Count('copies', distinct=True),
+        )
+
+    def adjust_copy_counters(self, available=0, total=0):
+        """Apply deltas to the denormalised copy counters with F() expressions"""
+        # Clamp at zero so drifted counters (see reconcile_copy_counters) can't
+        # fail the column's CHECK constraint and block a checkout. updated_at
+        # stays: the counters are validators of their own (see BookViewSet)
+        updated = self.update(
+            available_copies=Greatest(models.F('available_copies') + available, 0),
+            total_copies=Greatest(models.F('total_copies') + total, 0),
+        )
+        invalidate('availability')
+        return updated
+
+    def refresh_copy_counters(self):
+        """Recount the copy counters from BookCopy rows in one UPDATE"""
+        def copy_count(**filters):
+            copies = (
+                BookCopy.objects.filter(book=models.OuterRef('pk'), **filters)
+                .order_by().values('book').annotate(n=models.Count('pk')).values('n')
+            )
+            return Coalesce(models.Subquery(copies), 0)
+
+        updated = self.update(
+            available_copies=copy_count(is_available=True),
+            total_copies=copy_count(),
+        )
+        invalidate('availability')
+        return updated
+
 class Book(models.Model):
     title = models.CharField(max_length=255, db_index=True)
     isbn = models.CharField(max_length=13, unique=True, db_index=True)
@@ -54,12 +98,21 @@ class Book(models.Model):
     publisher = models.ForeignKey(Publisher, on_delete=models.SET_NULL, null=True, related_name='books')
     
     created_at = models.DateTimeField(auto_now_add=True)  # Added
-    updated_at = models.DateTimeField(auto_now=True)  # Added
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Added
+
+    # Denormalised from BookCopy; kept in step by BookCopy/Issue writes,
+    # see books.signals and `manage.py reconcile_copy_counters`
+    available_copies = models.PositiveIntegerField(default=0, editable=False)
+    total_copies = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = BookQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', 'id']
         indexes = [
             models.Index(fields=['title', 'isbn']),
+            models.Index(fields=['-created_at', 'id'], name='book_created_id_idx'),
+            models.Index(fields=['available_copies']),
         ]
 
     def __str__(self):
@@ -67,11 +120,14 @@ class Book(models.Model):
     
     @property
     def available_copies_count(self):
-        return self.bookcopy_set.filter(is_available=True).count()
+        # Prefer a with_copy_counts() annotation, else the counter column
+        count = getattr(self, 'num_available_copies', None)
+        return self.available_copies if count is None else count
     
     @property
     def total_copies_count(self):
-        return self.bookcopy_set.count()
+        count = getattr(self, 'num_copies', None)
+        return self.total_copies if count is None else count
 
 class BookCopy(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='copies')
@@ -87,11 +143,35 @@ class BookCopy(models.Model):
         ],
         default='good'
     )
-    location = models.CharField(max_length=100, blank=True)  # Shelf location
+    location = models.CharField(max_length=100, blank=True)  # Free-text shelf label
+    # Structured shelf position; shelf walks read copies in this order
+    branch = models.CharField(max_length=50, blank=True)
+    floor = models.SmallIntegerField(null=True, blank=True)
+    shelf = models.PositiveIntegerField(null=True, blank=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)  # Last shelf audit
     
     class Meta:
         verbose_name_plural = 'Book Copies'
         ordering = ['book', 'copy_number']
+        indexes = [
+            models.Index(fields=['branch', 'floor', 'shelf', 'copy_number'], name='copy_shelf_order_idx'),
+            models.Index(fields=['branch', 'book', 'is_available'], name='copy_branch_book_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book.title} - Copy #{self.copy_number}"
+
+class BookSearchTerm(models.Model):
+    """Inverted-index entry: one token from a book's title, authors or ISBN"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ['book', 'term']
+        indexes = [
+            models.Index(fields=['term', 'book']),
+        ]
 
     def __str__(self):
-        return f"{self.book.title} - Copy #{self.copy_number}"
\ No newline at end of file
+        return f"{self.term} -> {self.book_id}"
\ No newline at end of file
@@ -0,0 +1,146 @@
+# books/search.py
+"""
+Inverted-index catalogue search.
+
+Every book is tokenised into BookSearchTerm rows (title, author names, ISBN),
+kept in sync by the receivers in books/signals.py. Queries use indexed prefix
+scans on `term` instead of `LIKE '%q%'` across the authors join.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+TOKEN_RE = re.compile(r'\w+')
+ISBN_RE = re.compile(r'^(?:\d{9}[\dX]|\d{13})$')
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TOKENS = 8
+
+TITLE_WEIGHT = 3
+AUTHOR_WEIGHT = 2
+ISBN_WEIGHT = 5
+EXACT_ISBN_RANK = 1000
+
+
+def tokenize(text):
+    """Lowercase, strip accents and split text into word tokens"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text)]
+
+
+def normalize_isbn(query):
+    """Return the query as a bare ISBN-10/13, or None if it doesn't look like one"""
+    candidate = re.sub(r'[\s-]', '', query or '').upper()
+    return candidate if ISBN_RE.match(candidate) else None
+
+
+def prefix_lookup(token):
+    """
+    Lookup kwargs matching terms that start with `token`.
+
+    Terms and tokens are both lowercased and accent-stripped, so the
+    case-insensitive lookup matches the same rows; on MySQL it compiles to a
+    plain constant-prefix LIKE under the column's ci collation, which the
+    (term, book) index serves (startswith would be LIKE BINARY, which can't).
+    A [token, token+1) range instead depends on the collation: under MySQL's
+    default the bumped character ('z' -> '{') sorts before the letters.
+    """
+    return {'term__istartswith': token}
+
+
+def book_terms(book):
+    """Map each token of a book to the highest weight of the fields it occurs in"""
+    weights = {}
+
+    def add(text, weight):
+        for token in tokenize(text):
+            weights[token] = max(weights.get(token, 0), weight)
+
+    add(book.title, TITLE_WEIGHT)
+    for author in book.authors.all():
+        add(author.name, AUTHOR_WEIGHT)
+    add(book.isbn, ISBN_WEIGHT)
+    return weights
+
+
+def index_books(books):
+    """(Re)build the search terms for the given books"""
+    from books.models import BookSearchTerm
+
+    books = list(books)
+    if not books:
+        return
+    rows = [
+        BookSearchTerm(book_id=book.pk, term=term, weight=weight)
+        for book in books
+        for term, weight in book_terms(book).items()
+    ]
+    with transaction.atomic():
+        BookSearchTerm.objects.filter(book_id__in=[book.pk for book in books]).delete()
+        BookSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+
+def index_book(book):
+    index_books([book])
+
+
+def rebuild_index(batch_size=1000):
+    """Reindex the whole catalogue; returns the number of books indexed"""
+    from books.models import Book
+
+    queryset = Book.objects.order_by('pk').prefetch_related('authors')
+    total = 0
+    batch = []
+    for book in queryset.iterator(chunk_size=batch_size):
+        batch.append(book)
+        if len(batch) >= batch_size:
+            index_books(batch)
+            total += len(batch)
+            batch = []
+    index_books(batch)
+    return total + len(batch)
+
+
+def search_books(queryset, query):
+    """
+    Filter a Book queryset to matches for `query`, annotated with `search_rank`.
+
+    An exact ISBN wins outright. Otherwise every query token must prefix-match
+    a term of the book; the rank sums the best weight per token, doubled for
+    whole-word matches.
+    """
+    from books.models import BookSearchTerm
+
+    isbn = normalize_isbn(query)
+    if isbn and queryset.filter(isbn=isbn).exists():
+        return queryset.filter(isbn=isbn).annotate(
+            search_rank=Value(EXACT_ISBN_RANK, output_field=IntegerField())
+        )
+
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return queryset.annotate(search_rank=Value(0, output_field=IntegerField()))
+
+    rank = Value(0, output_field=IntegerField())
+    for token in tokens:
+        # Semi-join driven by the (term, book) index
+        matching = BookSearchTerm.objects.filter(**prefix_lookup(token)).values('book_id')
+        queryset = queryset.filter(pk__in=matching)
+
+        best = (
+            BookSearchTerm.objects.filter(book=OuterRef('pk'), **prefix_lookup(token))
+            .annotate(score=Case(
+                When(term=token, then=F('weight') * 2),
+                default=F('weight'),
+                output_field=IntegerField(),
+            ))
+            .order_by('-score')
+            .values('score')[:1]
+        )
+        rank = rank + Coalesce(Subquery(best, output_field=IntegerField()), 0)
+
+    return queryset.annotate(search_rank=rank)
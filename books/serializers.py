@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from books.models import Book, BookCopy, Author, Category, Publisher
 
+AUDIT_MAX_COPIES = 5000  # one shelf range per request
+
 class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
@@ -20,6 +22,42 @@ class BookCopySerializer(serializers.ModelSerializer):
     class Meta:
         model = BookCopy
         fields = '__all__'
+        read_only_fields = ('last_seen_at',)  # Set by shelf audits
+
+class ShelfCopySerializer(serializers.ModelSerializer):
+    """Flat copy row for shelf walks; needs `book` selected"""
+    title = serializers.CharField(source='book.title', read_only=True)
+    isbn = serializers.CharField(source='book.isbn', read_only=True)
+
+    class Meta:
+        model = BookCopy
+        fields = [
+            'id', 'copy_number', 'book', 'title', 'isbn', 'branch', 'floor', 'shelf',
+            'location', 'condition', 'is_available', 'last_seen_at',
+        ]
+
+class ShelfRangeSerializer(serializers.Serializer):
+    """Query parameters of a shelf walk"""
+    branch = serializers.CharField(max_length=50)
+    floor = serializers.IntegerField(required=False)
+    shelf_from = serializers.IntegerField(min_value=0, required=False)
+    shelf_to = serializers.IntegerField(min_value=0, required=False)
+    held = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        if data.get('shelf_from', 0) > data.get('shelf_to', data.get('shelf_from', 0)):
+            raise serializers.ValidationError("shelf_from is after shelf_to")
+        return data
+
+class CopyAuditItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    condition = serializers.ChoiceField(
+        choices=BookCopy._meta.get_field('condition').choices, required=False
+    )
+
+class CopyAuditSerializer(serializers.Serializer):
+    copies = CopyAuditItemSerializer(many=True, allow_empty=False, max_length=AUDIT_MAX_COPIES)
+    seen_at = serializers.DateTimeField(required=False)
 
 class BookSerializer(serializers.ModelSerializer):
     authors = AuthorSerializer(many=True, read_only=True)
@@ -39,15 +77,15 @@ class BookSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Book
-        fields = '__all__'
+        exclude = ('available_copies', 'total_copies')  # Exposed as *_count
     
     def get_available_copies_count(self, obj):
         """Return count of available book copies"""
-        return obj.copies.filter(is_available=True).count()
+        return obj.available_copies_count
     
     def get_total_copies_count(self, obj):
         """Return total count of book copies"""
-        return obj.copies.count()
+        return obj.total_copies_count
 
     def create(self, validated_data):
         author_ids = validated_data.pop('author_ids', [])
@@ -90,7 +128,26 @@ class BookListSerializer(serializers.ModelSerializer):
         ]
 
     def get_available_copies_count(self, obj):
-        return obj.copies.filter(is_available=True).count()
+        return obj.available_copies_count
 
     def get_total_copies_count(self, obj):
-        return obj.copies.count()
+        return obj.total_copies_count
+
+class BookSummarySerializer(serializers.ModelSerializer):
+    """Compact book for nested payloads; needs `authors` prefetched"""
+    authors = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Book
+        fields = ['id', 'title', 'isbn', 'cover_image', 'authors']
+
+    def get_authors(self, obj):
+        return [{'id': author.id, 'name': author.name} for author in obj.authors.all()]
+
+class BookCopySummarySerializer(serializers.ModelSerializer):
+    """Compact copy with its book nested, for issue payloads"""
+    book = BookSummarySerializer(read_only=True)
+
+    class Meta:
+        model = BookCopy
+        fields = ['id', 'copy_number', 'is_available', 'book']
@@ -0,0 +1,122 @@
+# books/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from books.cache import invalidate
+from books.models import Author, Book, BookCopy, Category, Publisher
+from books.search import index_book, index_books
+
+
+@receiver(post_save, sender=Book)
+def reindex_book(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_book(instance)
+
+
+def touch_books(book_ids):
+    """Bump updated_at (the HTTP validators) of books whose authors changed"""
+    Book.objects.filter(pk__in=book_ids).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def reindex_book_authors(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # post_clear doesn't report which books lost the author
+        instance._search_book_ids = list(instance.books.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        touch_books([instance.pk])
+        index_book(instance)
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_search_book_ids', None)
+    if pk_set:
+        touch_books(pk_set)
+        index_books(Book.objects.filter(pk__in=pk_set).prefetch_related('authors'))
+
+
+@receiver(post_save, sender=Author)
+def reindex_author_books(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        index_books(instance.books.prefetch_related('authors'))
+
+
+@receiver(pre_delete, sender=Author)
+def remember_author_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.books.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def reindex_after_author_delete(sender, instance, **kwargs):
+    book_ids = getattr(instance, '_search_book_ids', None)
+    if book_ids:
+        touch_books(book_ids)
+        index_books(Book.objects.filter(pk__in=book_ids).prefetch_related('authors'))
+
+
+# Copy counters on Book. Bulk writes (bulk_create, queryset.update) bypass
+# these; callers adjust the counters themselves or run reconcile_copy_counters.
+
+@receiver(pre_save, sender=BookCopy)
+def remember_copy_state(sender, instance, raw=False, **kwargs):
+    instance._counter_state = None
+    if not raw and not instance._state.adding:
+        instance._counter_state = (
+            BookCopy.objects.filter(pk=instance.pk).values('book_id', 'is_available').first()
+        )
+
+
+@receiver(post_save, sender=BookCopy)
+def update_copy_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_counter_state', None)
+    available = int(instance.is_available)
+    if previous is None:
+        Book.objects.filter(pk=instance.book_id).adjust_copy_counters(available=available, total=1)
+    elif previous['book_id'] != instance.book_id:
+        Book.objects.filter(pk=previous['book_id']).adjust_copy_counters(
+            available=-int(previous['is_available']), total=-1
+        )
+        Book.objects.filter(pk=instance.book_id).adjust_copy_counters(available=available, total=1)
+    elif previous['is_available'] != instance.is_available:
+        Book.objects.filter(pk=instance.book_id).adjust_copy_counters(
+            available=available - int(previous['is_available'])
+        )
+
+
+@receiver(post_delete, sender=BookCopy)
+def release_copy_counters(sender, instance, **kwargs):
+    Book.objects.filter(pk=instance.book_id).adjust_copy_counters(
+        available=-int(instance.is_available), total=-1
+    )
+
+
+# Response cache versions (books.cache). Book payloads embed author, category
+# and publisher names, so changes to those invalidate book responses too.
+
+CACHE_SCOPES = {
+    Book: ('book',),
+    Author: ('author', 'book'),
+    Category: ('category', 'book'),
+    Publisher: ('publisher', 'book'),
+}
+
+
+def invalidate_cached_responses(sender, raw=False, **kwargs):
+    if not raw:
+        invalidate(*CACHE_SCOPES[sender])
+
+
+for model in CACHE_SCOPES:
+    post_save.connect(invalidate_cached_responses, sender=model)
+    post_delete.connect(invalidate_cached_responses, sender=model)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def invalidate_book_authors(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate('book')
@@ -0,0 +1,229 @@
+# books/suggest.py
+"""
+In-memory typeahead index behind /api/v1/books/suggest/.
+
+Each worker process keeps a sorted list of (token, -weight, title, book id)
+entries for the title and author-name tokens of every book, built on
+first use. A lookup bisects it for the prefix range of each query token
+without touching the database. At most every SUGGEST_REFRESH_SECONDS, the
+index polls the catalogue: the book count and the latest Book and Author
+updated_at, which any worker's edits move (the copy counters don't). When
+they changed, it re-reads only the books and authors updated since its last
+refresh, and drops deleted books. REFRESH_OVERLAP re-reads a little further
+back, for transactions that commit late.
+"""
+import bisect
+import heapq
+import sys
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from books.search import AUTHOR_WEIGHT, MAX_QUERY_TOKENS, TITLE_WEIGHT, tokenize
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+def book_rows(books, book_ids=None):
+    """{book id: (title, isbn, author names)} for a Book queryset"""
+    from books.models import Book
+
+    rows = {pk: (title, isbn, []) for pk, title, isbn in books.values_list('pk', 'title', 'isbn')}
+    links = Book.authors.through.objects.order_by('pk')
+    if book_ids is not None:
+        links = links.filter(book_id__in=book_ids)
+    for book_id, name in links.values_list('book_id', 'author__name').iterator(chunk_size=5000):
+        if book_id in rows:
+            rows[book_id][2].append(name)
+    return rows
+
+
+def suggestion_terms(title, authors):
+    """Map each token to the highest weight of the fields it occurs in"""
+    terms = {}
+    for text, weight in [(title, TITLE_WEIGHT), *((name, AUTHOR_WEIGHT) for name in authors)]:
+        for token in tokenize(text):
+            # Interned: the same words recur across thousands of books
+            token = sys.intern(token)
+            terms[token] = max(terms.get(token, 0), weight)
+    return terms
+
+
+def catalogue_marker():
+    """(book count, latest book edit, latest author edit): moves with any catalogue write"""
+    from books.models import Author, Book
+
+    books = Book.objects.order_by().aggregate(rows=Count('pk'), last=Max('updated_at'))
+    authors = Author.objects.order_by().aggregate(last=Max('updated_at'))
+    return books['rows'], books['last'], authors['last']
+
+
+def scaled(entries, factor):
+    for _, weight, title, book_id in entries:
+        yield weight * factor, title, book_id
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything; the next lookup rebuilds the index"""
+        self.entries = []  # sorted (token, -weight, lowercased title, book id)
+        self.books = {}  # book id -> (title, isbn, author names, terms)
+        self.marker = None  # catalogue_marker() at the last refresh
+        self.refreshed_at = None
+        self.checked_at = None  # time.monotonic() of the last poll
+
+    def put(self, book_id, title, isbn, authors):
+        self.discard(book_id)
+        terms = suggestion_terms(title, authors)
+        for term, weight in terms.items():
+            bisect.insort(self.entries, (term, -weight, title.lower(), book_id))
+        self.books[book_id] = (title, isbn, authors, terms)
+
+    def discard(self, book_id):
+        book = self.books.pop(book_id, None)
+        if book is None:
+            return
+        title, _, _, terms = book
+        for term, weight in terms.items():
+            del self.entries[bisect.bisect_left(self.entries, (term, -weight, title.lower(), book_id))]
+
+    def build(self):
+        from books.models import Book
+
+        self.books = {}
+        for book_id, (title, isbn, authors) in book_rows(Book.objects.order_by()).items():
+            self.books[book_id] = (title, isbn, authors, suggestion_terms(title, authors))
+        self.entries = sorted(
+            (term, -weight, book[0].lower(), book_id)
+            for book_id, book in self.books.items()
+            for term, weight in book[3].items()
+        )
+
+    def update(self, since, book_count):
+        from books.models import Book
+
+        changed = (
+            Book.objects.order_by()
+            .filter(Q(updated_at__gte=since) | Q(authors__updated_at__gte=since))
+            .distinct()
+        )
+        book_ids = list(changed.values_list('pk', flat=True))
+        for book_id, row in book_rows(Book.objects.filter(pk__in=book_ids), book_ids).items():
+            self.put(book_id, *row)
+        if book_count != len(self.books):
+            existing = set(Book.objects.values_list('pk', flat=True))
+            for book_id in [pk for pk in self.books if pk not in existing]:
+                self.discard(book_id)
+
+    def due(self):
+        return (
+            self.checked_at is None
+            or time.monotonic() - self.checked_at >= settings.SUGGEST_REFRESH_SECONDS
+        )
+
+    def refresh(self):
+        """Catch up with catalogue writes, polling at most every SUGGEST_REFRESH_SECONDS"""
+        if not self.due():
+            return
+        with self.lock:
+            if not self.due():
+                return
+            started = timezone.now()
+            marker = catalogue_marker()
+            self.checked_at = time.monotonic()
+            if marker == self.marker:
+                return
+            if self.refreshed_at is None:
+                self.build()
+            else:
+                self.update(self.refreshed_at - REFRESH_OVERLAP, marker[0])
+            self.marker, self.refreshed_at = marker, started
+
+    def prefix_range(self, token):
+        upper = token[:-1] + chr(ord(token[-1]) + 1)
+        return bisect.bisect_left(self.entries, (token,)), bisect.bisect_left(self.entries, (upper,))
+
+    def score(self, book_id, tokens):
+        """Negated rank of a book matching every token"""
+        terms = self.books[book_id][3].items()
+        total = 0
+        for token in tokens:
+            best = 0
+            for term, weight in terms:
+                if term.startswith(token):
+                    best = max(best, weight * 2 if term == token else weight)
+            total += best
+        return -total
+
+    def ranked(self, token, lo, hi):
+        """
+        (-score, title, book id) of the entries in entries[lo:hi], best first.
+
+        Entries of one term are already sorted by (-weight, title, id), so
+        merging the runs of each term yields rank order without scoring
+        every match. A book matching several terms comes up more than once.
+        """
+        runs = []
+        while lo < hi:
+            term = self.entries[lo][0]
+            end = bisect.bisect_left(self.entries, (term, 0), lo, hi)
+            factor = 2 if term == token else 1
+            runs.append(scaled(self.entries[lo:end], factor))
+            lo = end
+        return heapq.merge(*runs)
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        """
+        Up to `limit` books whose title or author tokens start with every
+        query token, best matches first, as {id, title, isbn, author} dicts.
+        A whole-word match counts double, as in books.search.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+        if not tokens:
+            return []
+        self.refresh()
+        with self.lock:
+            ranges = sorted(
+                (self.prefix_range(token) + (token,) for token in tokens),
+                key=lambda r: r[1] - r[0],
+            )
+            if len(ranges) == 1:
+                best = []
+                for _, _, book_id in self.ranked(tokens[0], *ranges[0][:2]):
+                    if book_id not in best:
+                        best.append(book_id)
+                        if len(best) == limit:
+                            break
+            else:
+                # Intersect the matches of every token, then score the few left
+                book_ids = set.intersection(*(
+                    {entry[3] for entry in self.entries[lo:hi]} for lo, hi, _ in ranges
+                ))
+                best = [
+                    book_id for _, _, book_id in heapq.nsmallest(limit, (
+                        (self.score(book_id, tokens), self.books[book_id][0].lower(), book_id)
+                        for book_id in book_ids
+                    ))
+                ]
+            return [
+                {
+                    'id': book_id,
+                    'title': self.books[book_id][0],
+                    'isbn': self.books[book_id][1],
+                    'author': ', '.join(self.books[book_id][2]),
+                }
+                for book_id in best
+            ]
+
+
+suggest_index = SuggestIndex()
@@ -1,3 +1,245 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import User
+from books.importers import read_csv, read_json_array, read_marc
+from books.models import Author, Book, BookCopy, BookSearchTerm, Category
+from circulation.models import Issue
+from books.search import normalize_isbn, search_books, tokenize
+
+
+def make_book(title, isbn, *authors):
+    book = Book.objects.create(title=title, isbn=isbn, publication_year=2000)
+    book.authors.set([Author.objects.get_or_create(name=name)[0] for name in authors])
+    return book
+
+
+class TokenizeTests(TestCase):
+    def test_tokenize_lowercases_and_strips_accents(self):
+        self.assertEqual(tokenize('Les Misérables, Vol. 1'), ['les', 'miserables', 'vol', '1'])
+
+    def test_normalize_isbn(self):
+        self.assertEqual(normalize_isbn('978-0-14-143951-8'), '9780141439518')
+        self.assertEqual(normalize_isbn('014143951x'), '014143951X')
+        self.assertIsNone(normalize_isbn('pride'))
+
+
+class SearchIndexSyncTests(TestCase):
+    def terms(self, book):
+        return set(BookSearchTerm.objects.filter(book=book).values_list('term', flat=True))
+
+    def test_book_and_authors_are_indexed(self):
+        book = make_book('Pride and Prejudice', '9780141439518', 'Jane Austen')
+        self.assertTrue({'pride', 'prejudice', 'jane', 'austen', '9780141439518'} <= self.terms(book))
+
+    def test_title_change_reindexes(self):
+        book = make_book('Emma', '9780141439587', 'Jane Austen')
+        book.title = 'Persuasion'
+        book.save()
+        self.assertIn('persuasion', self.terms(book))
+        self.assertNotIn('emma', self.terms(book))
+
+    def test_author_rename_and_delete_reindex_books(self):
+        book = make_book('Emma', '9780141439587', 'Jane Austen')
+        author = Author.objects.get(name='Jane Austen')
+        author.name = 'J. Austen'
+        author.save()
+        self.assertNotIn('jane', self.terms(book))
+        author.delete()
+        self.assertNotIn('austen', self.terms(book))
+
+    def test_clearing_author_books_reindexes(self):
+        book = make_book('Emma', '9780141439587', 'Jane Austen')
+        Author.objects.get(name='Jane Austen').books.clear()
+        self.assertNotIn('austen', self.terms(book))
+
+
+class SearchBooksTests(TestCase):
+    def setUp(self):
+        self.pride = make_book('Pride and Prejudice', '9780141439518', 'Jane Austen')
+        self.emma = make_book('Emma', '9780141439587', 'Jane Austen')
+        self.prince = make_book('The Little Prince', '9780156012195', 'Antoine de Saint-Exupery')
+
+    def search(self, query):
+        return list(search_books(Book.objects.all(), query).order_by('-search_rank', 'id'))
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search('prej'), [self.pride])
+
+    def test_prefix_ending_in_z(self):
+        jazz = make_book('The Jazz Age', '9780141182667', 'F. Scott Fitzgerald')
+        self.assertEqual(self.search('jaz'), [jazz])
+        self.assertEqual(self.search('fitz'), [jazz])
+
+    def test_all_tokens_must_match(self):
+        self.assertEqual(self.search('austen emma'), [self.emma])
+
+    def test_title_matches_rank_above_author_matches(self):
+        jane = make_book('Jane Eyre', '9780141441146', 'Charlotte Bronte')
+        self.assertEqual(self.search('jane')[0], jane)
+
+    def test_exact_isbn_lookup(self):
+        self.assertEqual(self.search('978-0-15-601219-5'), [self.prince])
+
+    def test_no_match(self):
+        self.assertEqual(self.search('dostoevsky'), [])
+
+
+class CopyCounterTests(TestCase):
+    def setUp(self):
+        self.book = make_book('Emma', '9780141439587', 'Jane Austen')
+
+    def assertCounters(self, available, total):
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.available_copies, self.book.total_copies), (available, total))
+
+    def test_copy_create_update_delete(self):
+        copy = BookCopy.objects.create(book=self.book, copy_number='E-1')
+        BookCopy.objects.create(book=self.book, copy_number='E-2', is_available=False)
+        self.assertCounters(1, 2)
+
+        copy.is_available = False
+        copy.save()
+        self.assertCounters(0, 2)
+
+        copy.delete()
+        self.assertCounters(0, 1)
+
+    def test_moving_copy_between_books(self):
+        other = make_book('Persuasion', '9780141439686', 'Jane Austen')
+        copy = BookCopy.objects.create(book=self.book, copy_number='E-1')
+        copy.book = other
+        copy.save()
+        self.assertCounters(0, 0)
+        other.refresh_from_db()
+        self.assertEqual((other.available_copies, other.total_copies), (1, 1))
+
+    def test_issue_and_return(self):
+        copy = BookCopy.objects.create(book=self.book, copy_number='E-1')
+        user = User.objects.create_user(username='reader', password='secret', user_type='student')
+        issue = Issue.objects.create(user=user, book_copy=copy)
+        self.assertCounters(0, 1)
+
+        issue.returned = True
+        issue.return_date = issue.due_date
+        issue.save()
+        issue.save()  # saving a returned issue again must not double count
+        self.assertCounters(1, 1)
+
+    def test_reconcile_command_fixes_drift(self):
+        BookCopy.objects.bulk_create([BookCopy(book=self.book, copy_number='E-1')])
+        self.assertCounters(0, 0)
+
+        out = StringIO()
+        call_command('reconcile_copy_counters', stdout=out)
+        self.assertIn('1 books with drifted', out.getvalue())
+        self.assertCounters(1, 1)
+
+
+class ImportCatalogueTests(TestCase):
+    CSV = (
+        "isbn,title,authors,publisher,category,publication_year,copies\n"
+        "978-0-14-143951-8,Pride and Prejudice,Jane Austen,Penguin,Fiction,1813,2\n"
+        "9780141439587,Emma,Jane Austen,Penguin,Fiction,1815,1\n"
+        "9780156012195,The Little Prince,Antoine de Saint-Exupery;Katherine Woods,Harcourt,,1943,0\n"
+        "bad,No Year,,,,,\n"
+    )
+
+    def write(self, content, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(content)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        self.addCleanup(lambda: os.path.exists(path + '.checkpoint') and os.remove(path + '.checkpoint'))
+        return path
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_catalogue', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_creates_books_links_copies_and_index(self):
+        out, err = self.run_import(self.write(self.CSV, '.csv'), '--batch-size', '2')
+
+        self.assertIn('Imported 3 books and 3 copies, skipped 1 records', out)
+        self.assertIn('Record 4 skipped', err)
+        self.assertEqual(Author.objects.filter(name='Jane Austen').count(), 1)
+        pride = Book.objects.get(isbn='9780141439518')
+        self.assertEqual((pride.available_copies, pride.total_copies), (2, 2))
+        self.assertEqual(pride.category.name, 'Fiction')
+        prince = Book.objects.get(isbn='9780156012195')
+        self.assertEqual(prince.authors.count(), 2)
+        self.assertIsNone(prince.category)
+        self.assertEqual(list(search_books(Book.objects.all(), 'woods')), [prince])
+
+    def test_reimport_upserts_by_isbn(self):
+        path = self.write(self.CSV, '.csv')
+        self.run_import(path)
+        self.run_import(self.write(self.CSV.replace('Emma,', 'Emma (Annotated),'), '.csv'))
+
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(BookCopy.objects.count(), 3)
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(Book.objects.get(isbn='9780141439587').title, 'Emma (Annotated)')
+
+    def test_copies_stat_counts_inserted_rows(self):
+        other = make_book('Other', '9780000000002')
+        BookCopy.objects.create(book=other, copy_number='9780141439587-1')  # Emma's first copy
+        out, _ = self.run_import(self.write(self.CSV, '.csv'))
+        self.assertIn('Imported 3 books and 2 copies', out)
+
+    def test_csv_author_names_are_stripped(self):
+        path = self.write("isbn,title,authors\n9780156012195,The Little Prince,A; B;\n", '.csv')
+        self.assertEqual(next(read_csv(path))['authors'], ['A', 'B'])
+
+    def test_resumes_from_checkpoint(self):
+        path = self.write(self.CSV, '.csv')
+        with open(path + '.checkpoint', 'w') as fh:
+            json.dump({
+                'file': {'path': os.path.abspath(path), 'size': os.path.getsize(path)},
+                'records': 2,
+            }, fh)
+
+        out, _ = self.run_import(path)
+
+        self.assertIn('Resuming after 2 records', out)
+        self.assertEqual(list(Book.objects.values_list('isbn', flat=True)), ['9780156012195'])
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_stale_checkpoint_is_rejected(self):
+        path = self.write(self.CSV, '.csv')
+        with open(path + '.checkpoint', 'w') as fh:
+            json.dump({'file': {'path': path, 'size': 1}, 'records': 2}, fh)
+        with self.assertRaisesMessage(CommandError, '--restart'):
+            self.run_import(path)
+
+    def test_json_array_is_streamed_across_chunks(self):
+        records = [{'isbn': f'97800000000{n:02}', 'title': f'Book {n}'} for n in range(20)]
+        path = self.write(json.dumps(records), '.json')
+        self.assertEqual(list(read_json_array(path, chunk_size=16)), records)
+
+    def test_marc_records(self):
+        path = self.write(
+            "=020  \\\\$a9780141439518 (pbk.)\n"
+            "=100  1\\$aAusten, Jane.\n"
+            "=245  10$aPride and prejudice /$cJane Austen.\n"
+            "=264  \\1$aLondon :$bPenguin,$c2003.\n"
+            "=650  \\0$aCourtship$vFiction.\n"
+            "\n"
+            "=020  \\\\$a9780141439587\n"
+            "=245  10$aEmma\n",
+            '.mrk',
+        )
+        first, second = read_marc(path)
+        self.assertEqual(first['isbn'], '9780141439518')
+        self.assertEqual(first['authors'], ['Austen, Jane'])
+        self.assertEqual(first['title'], 'Pride and prejudice')
+        self.assertEqual((first['publisher'], first['publication_year']), ('Penguin', '2003'))
+        self.assertEqual(first['category'], 'Courtship')
+        self.assertEqual(second['title'], 'Emma')
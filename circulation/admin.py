@@ -22,5 +22,10 @@ class ReservationAdmin(admin.ModelAdmin):
         'user',
         'book',
         'created_at',
+        'status',
+        'held_copy',
+        'expiry_date',
     )
+    list_filter = ('status',)
     search_fields = ('user__username', 'book__title')
+    raw_id_fields = ('held_copy',)
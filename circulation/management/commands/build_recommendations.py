@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from circulation import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold issues made since the last run into the co-borrowing matrix and "
+        "re-rank similar books. Run nightly, e.g. cron: 30 0 * * * python "
+        "manage.py build_recommendations; add --full now and then to rebuild"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Rebuild from all issues instead of the new ones")
+        parser.add_argument('--top', type=int, default=recommendations.TOP_N,
+                            help="Neighbours kept per book")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        build = recommendations.build(
+            full=options['full'], top_n=options['top'], batch_size=options['batch_size']
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {build.issues_processed} issues up to #{build.last_issue_id}, "
+            f"re-ranked {build.books_updated} books in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from circulation.services import expire_holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Expire reservation holds that were not collected in time and pass the "
+        "copies to the next reservation. Run often, e.g. cron: */15 * * * * "
+        "python manage.py expire_holds"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        expired, promoted = expire_holds(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {expired} holds, promoted {promoted} reservations in {elapsed:.2f}s"
+        ))
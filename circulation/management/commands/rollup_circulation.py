@@ -0,0 +1,31 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from circulation.rollups import roll_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll up the days since the last run into the daily analytics tables. "
+        "Run nightly, e.g. cron: 15 0 * * * python manage.py rollup_circulation"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=date.fromisoformat, default=None,
+            help="Roll up again from this date (YYYY-MM-DD), e.g. after backdated edits",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        run = roll_up(since=options['since'])
+        elapsed = time.perf_counter() - start
+        if run is None:
+            self.stdout.write("Nothing to roll up")
+            return
+        days = (run.through_day - run.from_day).days + 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {days} days ({run.from_day} to {run.through_day}) in {elapsed:.2f}s"
+        ))
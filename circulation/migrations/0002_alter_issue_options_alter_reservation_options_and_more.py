@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_alter_book_options_book_book_created_id_idx'),
+        ('circulation', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='issue',
+            options={'ordering': ['-issue_date', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='reservation',
+            options={'ordering': ['-created_at', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['-issue_date', 'id'], name='issue_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['-created_at', 'id'], name='reservation_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_copy_counters'),
+        ('circulation', '0002_alter_issue_options_alter_reservation_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='accrued_fine',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='issue',
+            name='overdue',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['returned', 'due_date'], name='circulation_returne_13349d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['overdue', 'accrued_fine'], name='circulation_overdue_76a148_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_branches(apps, schema_editor):
+    BookCopy = apps.get_model('books', 'BookCopy')
+    Issue = apps.get_model('circulation', 'Issue')
+    Reservation = apps.get_model('circulation', 'Reservation')
+
+    def copy_branch(field):
+        return Subquery(BookCopy.objects.filter(pk=OuterRef(field)).values('branch')[:1])
+
+    Issue.objects.update(branch=copy_branch('book_copy_id'))
+    Reservation.objects.filter(held_copy__isnull=False).update(branch=copy_branch('held_copy_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_branch_scoping'),
+        ('circulation', '0006_daily_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='branch',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='branch',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['branch', '-issue_date', 'id'], name='issue_branch_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['branch', 'returned', 'due_date'], name='issue_branch_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['branch', 'status', 'created_at'], name='reservation_branch_idx'),
+        ),
+        migrations.RunPython(fill_branches, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,18 @@
 # circulation/models.py
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
-from books.models import BookCopy
+from books.models import Book, BookCopy
 from datetime import timedelta, date
 from django.core.exceptions import ValidationError
 
+FINE_PER_DAY = 5  # $5 per day
+
+def calculate_fine(due_date, return_date):
+    """Fine owed for returning on return_date an item due on due_date"""
+    if return_date > due_date:
+        return (return_date - due_date).days * FINE_PER_DAY
+    return 0
+
 class Issue(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='issues')
     book_copy = models.ForeignKey(BookCopy, on_delete=models.CASCADE, related_name='issues')
@@ -14,44 +22,94 @@ class Issue(models.Model):
     returned = models.BooleanField(default=False)
     fine_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # Added
     notes = models.TextField(blank=True)  # Added
+    # The copy's branch at checkout, so branch-scoped queries skip the join
+    branch = models.CharField(max_length=50, blank=True, editable=False)
+
+    # Materialised nightly by `manage.py accrue_fines` for open issues; the
+    # is_overdue property stays the live check
+    overdue = models.BooleanField(default=False)
+    accrued_fine = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
     class Meta:
-        ordering = ['-issue_date']
+        ordering = ['-issue_date', 'id']
         indexes = [
             models.Index(fields=['user', 'returned']),
             models.Index(fields=['book_copy', 'returned']),
+            models.Index(fields=['-issue_date', 'id'], name='issue_date_id_idx'),
+            models.Index(fields=['returned', 'due_date']),
+            models.Index(fields=['overdue', 'accrued_fine']),
+            # Day lookups of the daily rollups (circulation/rollups.py)
+            models.Index(fields=['due_date']),
+            models.Index(fields=['return_date']),
+            # Branch-scoped lists and the overdue view (api.filters.BranchFilter)
+            models.Index(fields=['branch', '-issue_date', 'id'], name='issue_branch_date_idx'),
+            models.Index(fields=['branch', 'returned', 'due_date'], name='issue_branch_open_idx'),
         ]
 
     def save(self, *args, **kwargs):
         if not self.due_date:
             self.due_date = date.today() + timedelta(days=14)
+        if self._state.adding and not self.branch:
+            self.branch = self.book_copy.branch
         
-        # Mark book copy as unavailable when issued
-        if not self.returned and not self.pk:
-            self.book_copy.is_available = False
-            self.book_copy.save()
-        
-        # Mark book copy as available when returned
-        if self.returned and self.return_date:
-            self.book_copy.is_available = True
-            self.book_copy.save()
+        with transaction.atomic():
+            # Claim the copy with a conditional UPDATE so two concurrent
+            # issues of the same copy can't both succeed
+            if not self.returned and not self.pk:
+                claimed = BookCopy.objects.filter(
+                    pk=self.book_copy_id, is_available=True
+                ).update(is_available=False)
+                if not claimed:
+                    raise ValidationError("This book copy is not available")
+                self._copy_book().adjust_copy_counters(available=-1)
+                self._sync_copy_availability(False)
             
-            # Calculate fine if overdue
-            if self.return_date > self.due_date:
-                days_overdue = (self.return_date - self.due_date).days
-                self.fine_amount = days_overdue * 5  # $5 per day
-        
-        super().save(*args, **kwargs)
+            # A return releases the copy, or holds it for the next reservation
+            # in the book's queue. Only the save that moves the issue from open
+            # to returned does so (a conditional UPDATE, so a repeated or
+            # concurrent return can't release the copy again); an issue
+            # recorded as already returned never held the copy.
+            returning = self.returned and self.return_date and (
+                not self.pk
+                or Issue.objects.filter(pk=self.pk, returned=False).update(returned=True)
+            )
+            if returning and self.pk:
+                released = BookCopy.objects.filter(
+                    pk=self.book_copy_id, is_available=False
+                ).update(is_available=True)
+                held = False
+                if released:
+                    from circulation.services import hold_copies
+
+                    self._copy_book().adjust_copy_counters(available=1)
+                    held = bool(hold_copies([self.book_copy_id]))
+                self._sync_copy_availability(not held)
+            if returning:
+                # Calculate fine if overdue
+                if self.return_date > self.due_date:
+                    self.fine_amount = calculate_fine(self.due_date, self.return_date)
+                self.overdue = False
+                self.accrued_fine = 0
+            
+            super().save(*args, **kwargs)
+
+    def _copy_book(self):
+        # The copy's book as an UPDATE-able queryset, without loading either row
+        book_id = BookCopy.objects.filter(pk=self.book_copy_id).order_by().values('book_id')
+        return Book.objects.filter(pk=models.Subquery(book_id))
+
+    def _sync_copy_availability(self, is_available):
+        # Keep an already-loaded book_copy consistent without refetching it
+        if Issue.book_copy.is_cached(self):
+            self.book_copy.is_available = is_available
 
     def clean(self):
-        if not self.returned and Issue.objects.filter(
-            user=self.user, 
-            returned=False
-        ).exclude(pk=self.pk).count() >= 5:  # Max 5 books at a time
-            raise ValidationError("User has already borrowed maximum number of books")
-        
-        if not self.book_copy.is_available and not self.pk:
-            raise ValidationError("This book copy is not available")
+        from circulation.services import validate_checkout
+
+        if not self.returned:
+            validate_checkout(
+                self.user, self.book_copy, exclude_issue=self.pk, check_copy=not self.pk
+            )
 
     def __str__(self):
         return f"{self.user.username} - {self.book_copy.book.title}"
@@ -63,10 +121,14 @@ class Issue(models.Model):
         return False
 
 class Reservation(models.Model):
+    # pending: queued; ready: a returned copy is held until expiry_date;
+    # fulfilled: the held copy was issued; expired: not collected in time
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('ready', 'Ready for pickup'),
         ('fulfilled', 'Fulfilled'),
         ('cancelled', 'Cancelled'),
+        ('expired', 'Expired'),
     ]
     
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reservations')
@@ -74,10 +136,103 @@ class Reservation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')  # Added
     expiry_date = models.DateTimeField(null=True, blank=True)  # Added
+    held_copy = models.ForeignKey(
+        BookCopy, on_delete=models.SET_NULL, null=True, blank=True, related_name='holds'
+    )
+    # Pickup branch; only copies of this branch are held for it (blank: any)
+    branch = models.CharField(max_length=50, blank=True)
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', 'id']
         unique_together = ['user', 'book']  # Prevent duplicate reservations
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='reservation_created_id_idx'),
+            # Head of a book's hold queue, and the expiry sweep
+            models.Index(fields=['book', 'status', 'created_at'], name='reservation_queue_idx'),
+            models.Index(fields=['status', 'expiry_date']),
+            models.Index(fields=['branch', 'status', 'created_at'], name='reservation_branch_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.book.title} ({self.status})"
\ No newline at end of file
+        return f"{self.user.username} - {self.book.title} ({self.status})"
+
+
+# "Borrowers also borrowed", built from issue history by
+# `manage.py build_recommendations` (circulation/recommendations.py)
+
+class CoBorrowCount(models.Model):
+    """
+    One non-zero cell of the sparse item-item co-borrowing matrix: how many
+    distinct users borrowed both books. Stored in both directions; the
+    diagonal (book == other) holds the book's own borrower count.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    borrowers = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ['book', 'other']
+
+class SimilarBook(models.Model):
+    """A book's top neighbours by co-borrowing, rank 1 first"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_books')
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['book', 'rank']
+        unique_together = ['book', 'rank']
+
+class RecommendationBuild(models.Model):
+    """One build run; the next incremental run starts after last_issue_id"""
+    last_issue_id = models.PositiveBigIntegerField()
+    issues_processed = models.PositiveIntegerField()
+    books_updated = models.PositiveIntegerField()
+    full = models.BooleanField()
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+
+
+# Daily analytics rollups, filled by `manage.py rollup_circulation`
+# (circulation/rollups.py) and read by the /api/v1/analytics/ endpoints
+
+class DailyBookStats(models.Model):
+    """Issues and returns of one book on one day"""
+    day = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    issues = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['day', 'book']
+
+class DailyCirculationStats(models.Model):
+    """
+    One day of circulation for a (category, borrower user_type) pair. `overdue`
+    is the number of loans overdue at the end of the day, `fines` what the
+    returns of the day were charged.
+    """
+    day = models.DateField()
+    category = models.ForeignKey(
+        'books.Category', on_delete=models.SET_NULL, null=True, related_name='+'
+    )
+    user_type = models.CharField(max_length=20)
+    issues = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    overdue = models.PositiveIntegerField(default=0)
+    fines = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['day', 'category', 'user_type']
+
+class CirculationRollup(models.Model):
+    """One rollup run over from_day..through_day; the next starts after through_day"""
+    from_day = models.DateField()
+    through_day = models.DateField()
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
@@ -0,0 +1,180 @@
+# circulation/recommendations.py
+"""
+"Borrowers also borrowed" recommendations from issue history.
+
+build() keeps CoBorrowCount as a sparse item-item matrix: for every pair of
+books, the number of distinct users who borrowed both. It only reads issues
+newer than the last RecommendationBuild. Each new (user, book) pair
+increments its cell against the books the user had borrowed before, and
+against the other new ones. The matrix is then exactly what a full rebuild
+would count. The pairs are counted in memory one batch of users at a time,
+and the touched cells are written with one upsert per batch. The books
+whose cells changed get their SimilarBook rows recomputed: the top_n
+neighbours by cosine similarity, co / sqrt(borrowers(a) * borrowers(b)).
+An incremental run skips the neighbours of books that only changed their
+own borrower count, so those scores may drift a little. A periodic
+`--full` rebuild resets that.
+
+The API reads only the precomputed rows: similar_books() is one indexed
+lookup, recommended_books() one aggregate over the neighbours of the
+user's recent books.
+"""
+import math
+from collections import Counter, defaultdict
+from itertools import islice, permutations
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Sum
+
+from books.models import Book
+from circulation.models import CoBorrowCount, Issue, RecommendationBuild, SimilarBook
+
+TOP_N = 20
+RECENT_BOOKS = 10  # a user's latest distinct books that seed their recommendations
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def user_books(issues):
+    """{user id: set of book ids} for an Issue queryset"""
+    books = defaultdict(set)
+    for user_id, book_id in issues.order_by().values_list('user_id', 'book_copy__book_id').distinct():
+        books[user_id].add(book_id)
+    return books
+
+
+def pair_increments(new_books, old_books):
+    """
+    Matrix increments for users who borrowed `new_books` ({user: set}) after
+    `old_books` ({user: set}): each new book pairs with the user's earlier
+    books (both directions), with the other new books, and with itself.
+    """
+    counts = Counter()
+    for user_id, books in new_books.items():
+        old = old_books.get(user_id, set())
+        new = books - old
+        counts.update((book, book) for book in new)
+        counts.update(permutations(new, 2))
+        counts.update((a, b) for a in new for b in old)
+        counts.update((b, a) for a in new for b in old)
+    return counts
+
+
+def apply_increments(counts, batch_size):
+    upsert = {'update_conflicts': True, 'update_fields': ['borrowers']}
+    if connection.features.supports_update_conflicts_with_target:
+        upsert['unique_fields'] = ['book', 'other']
+    for batch in batched(sorted(counts.items()), batch_size):
+        pairs = [pair for pair, _ in batch]
+        existing = dict(
+            ((book_id, other_id), borrowers)
+            for book_id, other_id, borrowers in CoBorrowCount.objects.filter(
+                book_id__in={a for a, _ in pairs}, other_id__in={b for _, b in pairs}
+            ).values_list('book_id', 'other_id', 'borrowers')
+        )
+        CoBorrowCount.objects.bulk_create([
+            CoBorrowCount(book_id=a, other_id=b, borrowers=existing.get((a, b), 0) + n)
+            for (a, b), n in batch
+        ], **upsert)
+
+
+def rank_neighbours(book_ids, top_n, batch_size):
+    """Replace the SimilarBook rows of `book_ids` from the matrix"""
+    for batch in batched(sorted(book_ids), batch_size):
+        neighbours = defaultdict(list)
+        borrowers = {}
+        for book_id, other_id, n in CoBorrowCount.objects.filter(book_id__in=batch).values_list(
+            'book_id', 'other_id', 'borrowers'
+        ):
+            if book_id == other_id:
+                borrowers[book_id] = n
+            else:
+                neighbours[book_id].append((other_id, n))
+        needed = {other for rows in neighbours.values() for other, _ in rows} - borrowers.keys()
+        for ids in batched(needed, batch_size):
+            borrowers.update(
+                CoBorrowCount.objects.filter(book_id__in=ids, other_id=F('book_id'))
+                .values_list('book_id', 'borrowers')
+            )
+        rows = []
+        for book_id, others in neighbours.items():
+            scored = sorted(
+                (-n / math.sqrt(borrowers[book_id] * borrowers[other]), -n, other)
+                for other, n in others
+            )
+            rows += [
+                SimilarBook(book_id=book_id, similar_id=other, rank=rank, score=-score)
+                for rank, (score, _, other) in enumerate(scored[:top_n], start=1)
+            ]
+        SimilarBook.objects.filter(book_id__in=batch).delete()
+        SimilarBook.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def build(full=False, top_n=TOP_N, batch_size=1000):
+    """
+    Fold issues since the last build into the matrix and re-rank the books
+    they touched; full=True starts over from all issues. Returns the
+    RecommendationBuild recorded.
+    """
+    last = None if full else RecommendationBuild.objects.first()
+    since = last.last_issue_id if last else 0
+    until = Issue.objects.aggregate(last=Max('pk'))['last'] or since
+
+    with transaction.atomic():
+        if full:
+            CoBorrowCount.objects.all().delete()
+            SimilarBook.objects.all().delete()
+        issues = Issue.objects.filter(pk__gt=since, pk__lte=until)
+        user_ids = sorted(set(issues.values_list('user_id', flat=True)))
+        touched = set()
+        for users in batched(user_ids, batch_size):
+            new_books = user_books(issues.filter(user_id__in=users))
+            old_books = user_books(Issue.objects.filter(user_id__in=users, pk__lte=since))
+            counts = pair_increments(new_books, old_books)
+            apply_increments(counts, batch_size)
+            touched.update(a for a, _ in counts)
+        rank_neighbours(touched, top_n, batch_size)
+        return RecommendationBuild.objects.create(
+            last_issue_id=until,
+            issues_processed=issues.count(),
+            books_updated=len(touched),
+            full=full,
+        )
+
+
+def similar_books(book_id, limit=TOP_N):
+    """[(book, score)] of a book's precomputed neighbours, best first"""
+    rows = (
+        SimilarBook.objects.filter(book_id=book_id)
+        .select_related('similar')
+        .prefetch_related('similar__authors')
+        .order_by('rank')[:limit]
+    )
+    return [(row.similar, row.score) for row in rows]
+
+
+def recommended_books(user, limit=TOP_N):
+    """
+    [(book, score)] the user hasn't borrowed, summing the similarity of each
+    candidate to the user's RECENT_BOOKS latest books.
+    """
+    recent = list(dict.fromkeys(
+        Issue.objects.filter(user=user).order_by('-issue_date', '-id')
+        .values_list('book_copy__book_id', flat=True)[:RECENT_BOOKS * 5]
+    ))[:RECENT_BOOKS]
+    if not recent:
+        return []
+    scores = list(
+        SimilarBook.objects.filter(book_id__in=recent)
+        .exclude(similar_id__in=Issue.objects.filter(user=user).values('book_copy__book_id'))
+        .values('similar_id')
+        .annotate(total=Sum('score'))
+        .order_by('-total', 'similar_id')
+        .values_list('similar_id', 'total')[:limit]
+    )
+    books = Book.objects.prefetch_related('authors').in_bulk([book_id for book_id, _ in scores])
+    return [(books[book_id], total) for book_id, total in scores if book_id in books]
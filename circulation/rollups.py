@@ -0,0 +1,190 @@
+# circulation/rollups.py
+"""
+Daily circulation rollups behind the /api/v1/analytics/ endpoints.
+
+roll_up() fills DailyBookStats and DailyCirculationStats one complete day at
+a time. It starts the day after the last CirculationRollup and runs
+through yesterday. A day costs a few grouped queries on the indexed date
+columns (issue_date, return_date, due_date), however long the history is.
+Overdue counts are carried forward from the previous day's rows:
+
+    overdue(d) = overdue(d - 1)
+                 + loans due on d - 1 and not back by the end of d
+                 - loans due before d - 1 that came back on d
+
+The first day rolled up counts its overdue loans from scratch. Rolling up a
+day again replaces its rows, so `--since` repairs the history after
+backdated edits. The report functions read only the rollup tables, so their
+cost depends on the date range asked for, not on the size of Issue.
+"""
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+
+from circulation.models import CirculationRollup, DailyBookStats, DailyCirculationStats, Issue
+
+ONE_DAY = timedelta(days=1)
+GROUP = ('book_copy__book__category_id', 'user__user_type')
+INTERVALS = ('day', 'week', 'month')
+
+
+def grouped(issues, **aggregates):
+    """{(category id, user type): {aggregate: value}} for an Issue queryset"""
+    return {
+        (row.pop(GROUP[0]), row.pop(GROUP[1])): row
+        for row in issues.order_by().values(*GROUP).annotate(**aggregates)
+    }
+
+
+def group_counts(issues):
+    return {key: row['n'] for key, row in grouped(issues, n=Count('pk')).items()}
+
+
+def book_counts(issues):
+    return dict(
+        issues.order_by().values('book_copy__book_id').annotate(n=Count('pk'))
+        .values_list('book_copy__book_id', 'n')
+    )
+
+
+def not_back_by(day):
+    return Q(return_date__isnull=True) | Q(return_date__gt=day)
+
+
+def overdue_at(day):
+    """Loans overdue at the end of `day`, counted from Issue"""
+    return group_counts(
+        Issue.objects.filter(not_back_by(day), due_date__lt=day, issue_date__lte=day)
+    )
+
+
+def rolled_up(day):
+    return CirculationRollup.objects.filter(from_day__lte=day, through_day__gte=day).exists()
+
+
+def stored_overdue(day):
+    return {
+        (category_id, user_type): overdue
+        for category_id, user_type, overdue in DailyCirculationStats.objects.filter(
+            day=day, overdue__gt=0
+        ).values_list('category_id', 'user_type', 'overdue')
+    }
+
+
+def roll_up_day(day, overdue_before):
+    """Replace the rollup rows of `day`; returns its overdue counts"""
+    issued = Issue.objects.filter(issue_date=day)
+    returned = Issue.objects.filter(return_date=day)
+
+    overdue = Counter(overdue_before)
+    overdue.update(group_counts(Issue.objects.filter(not_back_by(day), due_date=day - ONE_DAY)))
+    overdue.subtract(group_counts(returned.filter(due_date__lt=day - ONE_DAY)))
+    overdue = {key: n for key, n in overdue.items() if n > 0}
+
+    issues = group_counts(issued)
+    returns = grouped(returned, n=Count('pk'), fines=Sum('fine_amount'))
+    stats = [
+        DailyCirculationStats(
+            day=day,
+            category_id=category_id,
+            user_type=user_type,
+            issues=issues.get((category_id, user_type), 0),
+            returns=returns.get((category_id, user_type), {}).get('n', 0),
+            overdue=overdue.get((category_id, user_type), 0),
+            fines=returns.get((category_id, user_type), {}).get('fines') or 0,
+        )
+        for category_id, user_type in issues.keys() | returns.keys() | overdue.keys()
+    ]
+
+    books = defaultdict(lambda: [0, 0])
+    for book_id, n in book_counts(issued).items():
+        books[book_id][0] = n
+    for book_id, n in book_counts(returned).items():
+        books[book_id][1] = n
+
+    with transaction.atomic():
+        DailyCirculationStats.objects.filter(day=day).delete()
+        DailyBookStats.objects.filter(day=day).delete()
+        DailyCirculationStats.objects.bulk_create(stats)
+        DailyBookStats.objects.bulk_create([
+            DailyBookStats(day=day, book_id=book_id, issues=issued_count, returns=returned_count)
+            for book_id, (issued_count, returned_count) in books.items()
+        ])
+    return overdue
+
+
+def roll_up(since=None, until=None):
+    """
+    Roll up every day from `since` through `until` (default: yesterday).
+    `since` defaults to the day after the last run, or the first issue.
+    Returns the CirculationRollup recorded, or None if there was nothing to do.
+    """
+    until = until or date.today() - ONE_DAY
+    if since is None:
+        last = CirculationRollup.objects.first()
+        if last is not None:
+            since = last.through_day + ONE_DAY
+        else:
+            since = Issue.objects.aggregate(first=Min('issue_date'))['first']
+    if since is None or since > until:
+        return None
+
+    previous = since - ONE_DAY
+    overdue = stored_overdue(previous) if rolled_up(previous) else overdue_at(previous)
+    day = since
+    while day <= until:
+        overdue = roll_up_day(day, overdue)
+        day += ONE_DAY
+    return CirculationRollup.objects.create(from_day=since, through_day=until)
+
+
+# Reports, read from the rollups only
+
+def popular_books(start, end, limit=20):
+    """[{book_id, issues, returns}] of the most issued books between start and end"""
+    return list(
+        DailyBookStats.objects.filter(day__range=(start, end))
+        .values('book_id')
+        .annotate(issues=Sum('issues'), returns=Sum('returns'))
+        .order_by('-issues', 'book_id')[:limit]
+    )
+
+
+def category_usage(start, end):
+    """[{category_id, user_type, issues, returns, fines}] between start and end"""
+    return list(
+        DailyCirculationStats.objects.filter(day__range=(start, end))
+        .values('category_id', 'user_type')
+        .annotate(issues=Sum('issues'), returns=Sum('returns'), fines=Sum('fines'))
+        .order_by('category_id', 'user_type')
+    )
+
+
+def circulation_series(start, end, interval='day'):
+    """
+    [{period, issues, returns, fines, overdue}] per day, week or month;
+    `overdue` is the count at the end of the period's last rolled-up day.
+    """
+    days = (
+        DailyCirculationStats.objects.filter(day__range=(start, end))
+        .values('day')
+        .annotate(
+            issues=Sum('issues'), returns=Sum('returns'), fines=Sum('fines'),
+            overdue=Sum('overdue'),
+        )
+        .order_by('day')
+    )
+    if interval == 'day':
+        return [{'period': row.pop('day'), **row} for row in days]
+    periods = {}
+    for row in days:
+        day = row['day']
+        period = day.replace(day=1) if interval == 'month' else day - timedelta(days=day.weekday())
+        total = periods.setdefault(period, {'period': period, 'issues': 0, 'returns': 0, 'fines': 0})
+        total['issues'] += row['issues']
+        total['returns'] += row['returns']
+        total['fines'] += row['fines']
+        total['overdue'] = row['overdue']
+    return list(periods.values())
@@ -1,40 +1,74 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from circulation.models import Issue, Reservation
-from books.serializers import BookSerializer, BookCopySerializer
-from accounts.serializers import UserProfileSerializer
+from circulation.services import checkout
+from books.serializers import BookSerializer, BookSummarySerializer, BookCopySummarySerializer
+from accounts.serializers import UserProfileSerializer, UserSummarySerializer
+from accounts.models import User
+from api.serializers import SparseFieldsetMixin
 
-class IssueSerializer(serializers.ModelSerializer):
-    book_copy_details = BookCopySerializer(source='book_copy', read_only=True)
-    user_details = UserProfileSerializer(source='user', read_only=True)
+BULK_MAX_ITEMS = 500
+
+class IssueSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    book_copy_details = BookCopySummarySerializer(source='book_copy', read_only=True)
+    user_details = UserSummarySerializer(source='user', read_only=True)
     is_overdue = serializers.BooleanField(read_only=True)
     
     class Meta:
         model = Issue
         fields = '__all__'
-        read_only_fields = ('issue_date', 'fine_amount', 'return_date')
+        read_only_fields = (
+            'issue_date', 'fine_amount', 'return_date', 'overdue', 'accrued_fine'
+        )
+        expandable_fields = {
+            'user_details': (
+                UserProfileSerializer, 'user', ['user__groups', 'user__user_permissions']
+            ),
+        }
 
-    def validate(self, data):
-        if not data.get('returned', False):
-            # Check if book copy is available
-            if not data['book_copy'].is_available:
-                raise serializers.ValidationError("This book copy is not available")
-            
-            # Check user's current issue count
-            active_issues = Issue.objects.filter(
-                user=data['user'],
-                returned=False
-            ).count()
-            
-            if active_issues >= 5:
-                raise serializers.ValidationError("User has reached maximum borrow limit (5 books)")
-        
-        return data
+    def create(self, validated_data):
+        if validated_data.get('returned'):
+            # A historical record: it never held the copy, so no checkout
+            return super().create(validated_data)
+        # Availability and the borrow limit are checked inside the locked
+        # checkout transaction rather than with separate COUNT queries here
+        try:
+            return checkout(**validated_data)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
 
-class ReservationSerializer(serializers.ModelSerializer):
-    book_details = BookSerializer(source='book', read_only=True)
-    user_details = UserProfileSerializer(source='user', read_only=True)
+class ReservationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    book_details = BookSummarySerializer(source='book', read_only=True)
+    user_details = UserSummarySerializer(source='user', read_only=True)
     
     class Meta:
         model = Reservation
         fields = '__all__'
-        read_only_fields = ('created_at',)
\ No newline at end of file
+        # Status, hold and expiry are driven by the hold queue (services.py)
+        read_only_fields = ('created_at', 'status', 'held_copy', 'expiry_date')
+        expandable_fields = {
+            'book_details': (BookSerializer, 'book', ['book__category', 'book__publisher']),
+            'user_details': (
+                UserProfileSerializer, 'user', ['user__groups', 'user__user_permissions']
+            ),
+        }
+
+class BulkIssueSerializer(serializers.Serializer):
+    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    copy_numbers = serializers.ListField(
+        child=serializers.CharField(max_length=50), allow_empty=False, max_length=BULK_MAX_ITEMS
+    )
+    due_date = serializers.DateField(required=False)
+
+class BulkReturnSerializer(serializers.Serializer):
+    issue_ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=BULK_MAX_ITEMS
+    )
+    copy_numbers = serializers.ListField(
+        child=serializers.CharField(max_length=50), required=False, max_length=BULK_MAX_ITEMS
+    )
+
+    def validate(self, data):
+        if not data.get('issue_ids') and not data.get('copy_numbers'):
+            raise serializers.ValidationError("Provide issue_ids and/or copy_numbers")
+        return data
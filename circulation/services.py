@@ -0,0 +1,350 @@
+# circulation/services.py
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from books.models import Book, BookCopy
+from circulation.models import Issue, Reservation, calculate_fine
+
+MAX_ACTIVE_ISSUES = 5
+HOLD_PERIOD = timedelta(days=3)  # how long a returned copy waits for its reserver
+
+
+def checkout_state(user, book_copy=None, exclude_issue=None, lock=False):
+    """
+    Fetch the borrower's open issue count and the copy's availability in one query.
+
+    Without a book_copy only the open issue count is fetched. `held_for_user`
+    tells whether the copy is on the hold shelf for this borrower.
+
+    With lock=True the borrower row is locked (SELECT ... FOR UPDATE) so
+    concurrent checkouts for the same user serialise on the limit check.
+    """
+    open_issues = Issue.objects.filter(user=OuterRef('pk'), returned=False)
+    if exclude_issue is not None:
+        open_issues = open_issues.exclude(pk=exclude_issue)
+
+    annotations = {
+        'open_issues': Coalesce(
+            Subquery(
+                open_issues.order_by().values('user').annotate(n=Count('pk')).values('n')
+            ),
+            0,
+        ),
+    }
+    if book_copy is not None:
+        annotations['copy_available'] = Subquery(
+            BookCopy.objects.filter(pk=book_copy.pk).order_by().values('is_available')
+        )
+        annotations['held_for_user'] = Exists(
+            Reservation.objects.filter(user=OuterRef('pk'), held_copy=book_copy, status='ready')
+        )
+
+    queryset = get_user_model().objects.filter(pk=user.pk)
+    if lock:
+        queryset = queryset.select_for_update()
+    return queryset.annotate(**annotations).values(*annotations).get()
+
+
+def validate_checkout(user, book_copy, exclude_issue=None, check_copy=True, lock=False):
+    state = checkout_state(user, book_copy, exclude_issue=exclude_issue, lock=lock)
+    if state['open_issues'] >= MAX_ACTIVE_ISSUES:
+        raise ValidationError(
+            f"User has reached maximum borrow limit ({MAX_ACTIVE_ISSUES} books)"
+        )
+    if check_copy and not (state['copy_available'] or state['held_for_user']):
+        raise ValidationError("This book copy is not available")
+    return state
+
+
+def checkout(user, book_copy, **fields):
+    """
+    Issue a book copy to a user atomically.
+
+    The borrower row is locked while the limit is checked, and Issue.save()
+    claims the copy with a conditional UPDATE, so concurrent requests can
+    neither issue the same copy twice nor push a user past the limit. A copy
+    held for the borrower's reservation is taken off the hold shelf first.
+    """
+    with transaction.atomic():
+        state = validate_checkout(user, book_copy, lock=True)
+        if state['held_for_user']:
+            collect_holds(user, [book_copy.pk])
+            release_copies([book_copy.pk])
+        issue = Issue(user=user, book_copy=book_copy, **fields)
+        issue.save()
+    return issue
+
+
+def adjust_available_copies(per_book, sign):
+    """
+    Apply {book_id: n} availability deltas to the Book counters, one UPDATE
+    (and one cache invalidation) per distinct delta, usually just one
+    """
+    by_count = defaultdict(list)
+    for book_id, count in per_book.items():
+        by_count[count].append(book_id)
+    for count, book_ids in by_count.items():
+        Book.objects.filter(pk__in=book_ids).adjust_copy_counters(available=sign * count)
+
+
+def release_copies(copy_ids):
+    """Mark unavailable copies available again and update the Book counters"""
+    released = BookCopy.objects.filter(pk__in=copy_ids, is_available=False)
+    per_book = Counter(released.values_list('book_id', flat=True))
+    released.update(is_available=True)
+    adjust_available_copies(per_book, sign=1)
+    return sum(per_book.values())
+
+
+def bulk_checkout(user, copy_numbers, due_date=None):
+    """
+    Issue several copies to one borrower in a single transaction.
+
+    Returns one result dict per requested copy number, in request order.
+    Copies that are unknown, already out, or beyond the borrow limit are
+    reported and skipped; the rest are claimed with one UPDATE and inserted
+    with one bulk_create.
+    """
+    copy_numbers = list(dict.fromkeys(copy_numbers))
+    due_date = due_date or date.today() + timedelta(days=14)
+    results = {number: {'copy_number': number} for number in copy_numbers}
+
+    with transaction.atomic():
+        remaining = MAX_ACTIVE_ISSUES - checkout_state(user, lock=True)['open_issues']
+        copies = {
+            copy.copy_number: copy
+            for copy in BookCopy.objects.select_for_update()
+            .filter(copy_number__in=copy_numbers)
+            .order_by()
+        }
+        held = set(
+            Reservation.objects.filter(
+                user=user, status='ready', held_copy__in=[copy.pk for copy in copies.values()]
+            ).values_list('held_copy', flat=True)
+        )
+
+        claimed = []
+        for number in copy_numbers:
+            copy = copies.get(number)
+            if copy is None:
+                results[number].update(status='error', detail="Book copy not found")
+            elif not copy.is_available and copy.pk not in held:
+                results[number].update(status='error', detail="This book copy is not available")
+            elif len(claimed) >= remaining:
+                results[number].update(
+                    status='error',
+                    detail=f"User has reached maximum borrow limit ({MAX_ACTIVE_ISSUES} books)",
+                )
+            else:
+                claimed.append(copy)
+
+        if claimed:
+            # Held copies are already off the shelf; only free ones are claimed
+            collect_holds(user, [copy.pk for copy in claimed if copy.pk in held])
+            free = [copy for copy in claimed if copy.pk not in held]
+            BookCopy.objects.filter(
+                pk__in=[copy.pk for copy in free], is_available=True
+            ).update(is_available=False)
+            adjust_available_copies(Counter(copy.book_id for copy in free), sign=-1)
+            issues = Issue.objects.bulk_create([
+                Issue(user=user, book_copy=copy, due_date=due_date, branch=copy.branch)
+                for copy in claimed
+            ])
+            for copy, issue in zip(claimed, issues):
+                results[copy.copy_number].update(
+                    status='issued', issue=issue.pk, due_date=issue.due_date
+                )
+
+    return list(results.values())
+
+
+def bulk_return(issue_ids=(), copy_numbers=(), return_date=None):
+    """
+    Return several open issues, identified by issue id or copy number, at once.
+
+    Fines are computed for the whole batch, issues are written with one
+    bulk_update and copies are released with one UPDATE. Returns one result
+    dict per requested identifier, in request order. Returned copies go to
+    the head of their book's reservation queue, see hold_copies().
+    """
+    return_date = return_date or date.today()
+    issue_ids = list(dict.fromkeys(issue_ids))
+    copy_numbers = list(dict.fromkeys(copy_numbers))
+
+    with transaction.atomic():
+        issues = list(
+            Issue.objects.select_for_update(of=('self',))
+            .filter(returned=False)
+            .filter(Q(pk__in=issue_ids) | Q(book_copy__copy_number__in=copy_numbers))
+            .annotate(copy_number=F('book_copy__copy_number'))
+            .order_by()
+        )
+        for issue in issues:
+            issue.returned = True
+            issue.return_date = return_date
+            issue.fine_amount = calculate_fine(issue.due_date, return_date)
+            issue.overdue = False
+            issue.accrued_fine = 0
+        Issue.objects.bulk_update(
+            issues, ['returned', 'return_date', 'fine_amount', 'overdue', 'accrued_fine']
+        )
+        copy_ids = [issue.book_copy_id for issue in issues]
+        release_copies(copy_ids)
+        hold_copies(copy_ids)
+
+    by_id = {issue.pk: issue for issue in issues}
+    by_copy = {issue.copy_number: issue for issue in issues}
+
+    def result(key, value, issue):
+        if issue is None:
+            return {key: value, 'status': 'error', 'detail': "No open issue found"}
+        return {
+            key: value,
+            'status': 'returned',
+            'issue': issue.pk,
+            'fine_amount': issue.fine_amount,
+        }
+
+    return (
+        [result('issue', pk, by_id.get(pk)) for pk in issue_ids]
+        + [result('copy_number', number, by_copy.get(number)) for number in copy_numbers]
+    )
+
+
+def accrue_fines(as_of=None, batch_size=10000):
+    """
+    Materialise `overdue`/`accrued_fine` for every open overdue issue.
+
+    The fine only depends on the due date, so issues are updated one due
+    date at a time, in primary-key batches of at most `batch_size` rows, each
+    with a single set-based UPDATE. Returns (rows accrued, rows cleared).
+    """
+    as_of = as_of or date.today()
+    open_overdue = Issue.objects.filter(returned=False, due_date__lt=as_of)
+
+    # Returned or re-dated issues drop out of the overdue set
+    cleared = Issue.objects.filter(overdue=True).filter(
+        Q(returned=True) | Q(due_date__gte=as_of) | Q(due_date__isnull=True)
+    ).update(overdue=False, accrued_fine=0)
+
+    accrued = 0
+    due_dates = open_overdue.order_by('due_date').values_list('due_date', flat=True).distinct()
+    for due_date in due_dates:
+        fine = calculate_fine(due_date, as_of)
+        batch = open_overdue.filter(due_date=due_date).order_by('pk')
+        last_pk = 0
+        while True:
+            upper = list(
+                batch.filter(pk__gt=last_pk).values_list('pk', flat=True)[batch_size - 1:batch_size]
+            )
+            rows = batch.filter(pk__gt=last_pk)
+            if upper:
+                rows = rows.filter(pk__lte=upper[0])
+            accrued += rows.update(overdue=True, accrued_fine=fine)
+            if not upper:
+                break
+            last_pk = upper[0]
+
+    return accrued, cleared
+
+
+# Reservation hold queue
+
+def hold_copies(copy_ids):
+    """
+    Hold just-released copies for the head of their book's reservation queue.
+
+    For each copy whose book has pending reservations, the oldest one for
+    the copy's branch or for any branch (an indexed lookup on
+    reservation_queue_idx) becomes `ready` until HOLD_PERIOD from now, and
+    the copy is claimed with the same conditional UPDATE a checkout uses.
+    Returns the promoted reservations.
+    """
+    promoted = []
+    with transaction.atomic():
+        copies = (
+            BookCopy.objects.filter(pk__in=copy_ids, book__reservations__status='pending')
+            .order_by('pk').values_list('pk', 'book_id', 'branch').distinct()
+        )
+        expiry_date = timezone.now() + HOLD_PERIOD
+        for copy_id, book_id, branch in copies:
+            reservation = (
+                Reservation.objects.select_for_update()
+                .filter(Q(branch='') | Q(branch=branch), book_id=book_id, status='pending')
+                .order_by('created_at', 'id')
+                .first()
+            )
+            if reservation is None:
+                continue
+            if not BookCopy.objects.filter(pk=copy_id, is_available=True).update(is_available=False):
+                continue  # issued or held by a concurrent request meanwhile
+            adjust_available_copies({book_id: 1}, sign=-1)
+            reservation.status = 'ready'
+            reservation.held_copy_id = copy_id
+            reservation.expiry_date = expiry_date
+            reservation.save(update_fields=['status', 'held_copy', 'expiry_date'])
+            promoted.append(reservation)
+    return promoted
+
+
+def collect_holds(user, copy_ids):
+    """Mark the user's ready reservations for these copies fulfilled"""
+    if copy_ids:
+        Reservation.objects.filter(
+            user=user, status='ready', held_copy__in=copy_ids
+        ).update(status='fulfilled')
+
+
+def cancel_reservation(reservation):
+    """Cancel a reservation, passing a held copy on to the next in the queue"""
+    with transaction.atomic():
+        copy_id = reservation.held_copy_id if reservation.status == 'ready' else None
+        reservation.status = 'cancelled'
+        reservation.held_copy = None
+        reservation.save(update_fields=['status', 'held_copy'])
+        if copy_id:
+            release_copies([copy_id])
+            hold_copies([copy_id])
+    return reservation
+
+
+def expire_holds(now=None, batch_size=1000):
+    """
+    Expire uncollected holds in primary-key batches and pass their copies on.
+
+    Also offers available copies to books that still have a queue, which
+    catches copies added or released outside return processing. Returns
+    (holds expired, reservations promoted).
+    """
+    now = now or timezone.now()
+    expired = promoted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Reservation.objects.select_for_update()
+                .filter(status='ready', expiry_date__lt=now)
+                .order_by('pk')
+                .values_list('pk', 'held_copy_id')[:batch_size]
+            )
+            if not batch:
+                break
+            Reservation.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                status='expired', held_copy=None
+            )
+            copy_ids = [copy_id for _, copy_id in batch if copy_id]
+            release_copies(copy_ids)
+            promoted += len(hold_copies(copy_ids))
+        expired += len(batch)
+
+    waiting = BookCopy.objects.filter(
+        is_available=True, book__reservations__status='pending'
+    ).values_list('pk', flat=True).distinct()
+    promoted += len(hold_copies(list(waiting)))
+    return expired, promoted
@@ -1,3 +1,463 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User
+from books.models import Book, BookCopy, Category
+from circulation import recommendations, rollups
+from circulation.models import CoBorrowCount, DailyCirculationStats, Issue, Reservation
+from circulation.recommendations import similar_books
+from circulation.services import (
+    MAX_ACTIVE_ISSUES, accrue_fines, bulk_checkout, bulk_return, cancel_reservation, checkout,
+    expire_holds,
+)
+
+
+def make_copies(count, isbn='9780141439518'):
+    book = Book.objects.create(title='Emma', isbn=isbn, publication_year=2000)
+    copies = BookCopy.objects.bulk_create([
+        BookCopy(book=book, copy_number=f'{isbn}-{n}') for n in range(count)
+    ])
+    Book.objects.filter(pk=book.pk).refresh_copy_counters()
+    return copies
+
+
+def make_user(username):
+    return User.objects.create_user(username=username, password='secret', user_type='student')
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = make_user('reader')
+        self.copies = make_copies(MAX_ACTIVE_ISSUES + 1)
+
+    def test_checkout_marks_copy_unavailable(self):
+        issue = checkout(self.user, self.copies[0])
+        self.copies[0].refresh_from_db()
+        self.assertFalse(self.copies[0].is_available)
+        self.assertFalse(issue.book_copy.is_available)
+
+    def test_checkout_rejects_unavailable_copy(self):
+        checkout(self.user, self.copies[0])
+        with self.assertRaisesMessage(ValidationError, 'not available'):
+            checkout(make_user('other'), self.copies[0])
+
+    def test_checkout_enforces_borrow_limit(self):
+        for copy in self.copies[:MAX_ACTIVE_ISSUES]:
+            checkout(self.user, copy)
+        with self.assertRaisesMessage(ValidationError, 'maximum borrow limit'):
+            checkout(self.user, self.copies[-1])
+        self.assertTrue(BookCopy.objects.get(pk=self.copies[-1].pk).is_available)
+
+    def test_validation_is_a_single_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            checkout(self.user, self.copies[0])
+        statements = [
+            q['sql'].split()[0] for q in ctx.captured_queries
+            if 'SAVEPOINT' not in q['sql']
+        ]
+        # borrower lock + count, conditional UPDATE of the copy, Book counter
+        # UPDATE, INSERT of the issue
+        self.assertEqual(statements, ['SELECT', 'UPDATE', 'UPDATE', 'INSERT'])
+
+    def test_return_frees_copy(self):
+        issue = checkout(self.user, self.copies[0])
+        issue.returned = True
+        issue.return_date = issue.due_date
+        issue.save()
+        self.assertTrue(BookCopy.objects.get(pk=self.copies[0].pk).is_available)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Hammer checkout() from several threads and check the invariants hold"""
+    threads = 8
+
+    def run_concurrently(self, attempts):
+        barrier = threading.Barrier(len(attempts))
+        results = []
+
+        def worker(user, copy):
+            barrier.wait()
+            try:
+                for _ in range(50):
+                    try:
+                        checkout(user, copy)
+                        results.append('issued')
+                        return
+                    except OperationalError:
+                        # Lock wait timeout / SQLite "database is locked": retry
+                        time.sleep(0.01)
+                    except ValidationError:
+                        results.append('rejected')
+                        return
+                results.append('gave up')
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=attempt) for attempt in attempts]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    def test_same_copy_is_never_issued_twice(self):
+        copy = make_copies(1)[0]
+        users = [make_user(f'reader{n}') for n in range(self.threads)]
+
+        results = self.run_concurrently([(user, copy) for user in users])
+
+        self.assertEqual(results.count('issued'), 1)
+        self.assertEqual(Issue.objects.filter(book_copy=copy, returned=False).count(), 1)
+        self.assertFalse(BookCopy.objects.get(pk=copy.pk).is_available)
+        self.assertEqual(Book.objects.get(pk=copy.book_id).available_copies, 0)
+
+    def test_borrow_limit_holds_under_concurrency(self):
+        user = make_user('reader')
+        copies = make_copies(self.threads)
+
+        results = self.run_concurrently([(user, copy) for copy in copies])
+
+        self.assertEqual(results.count('issued'), MAX_ACTIVE_ISSUES)
+        self.assertEqual(Issue.objects.filter(user=user, returned=False).count(), MAX_ACTIVE_ISSUES)
+        self.assertEqual(
+            BookCopy.objects.filter(pk__in=[c.pk for c in copies], is_available=False).count(),
+            MAX_ACTIVE_ISSUES,
+        )
+
+
+class BulkCirculationTests(TestCase):
+    def setUp(self):
+        self.user = make_user('reader')
+        self.copies = make_copies(MAX_ACTIVE_ISSUES + 2)
+        self.numbers = [copy.copy_number for copy in self.copies]
+
+    def test_bulk_checkout_reports_per_item(self):
+        checkout(make_user('other'), self.copies[0])
+
+        results = bulk_checkout(self.user, self.numbers + ['missing'])
+
+        statuses = [r['status'] for r in results]
+        self.assertEqual(statuses[0], 'error')  # already out
+        self.assertEqual(statuses[1:6], ['issued'] * MAX_ACTIVE_ISSUES)
+        self.assertIn('maximum borrow limit', results[6]['detail'])
+        self.assertIn('not found', results[7]['detail'])
+        self.assertEqual(Issue.objects.filter(user=self.user, returned=False).count(), MAX_ACTIVE_ISSUES)
+        self.assertEqual(BookCopy.objects.filter(is_available=False).count(), MAX_ACTIVE_ISSUES + 1)
+        self.assertEqual(Book.objects.get().available_copies, 1)
+
+    def test_issues_record_the_copy_branch(self):
+        BookCopy.objects.filter(pk__in=[copy.pk for copy in self.copies[:2]]).update(branch='East')
+        checkout(self.user, BookCopy.objects.get(pk=self.copies[0].pk))
+        bulk_checkout(self.user, self.numbers[1:3])
+        self.assertEqual(
+            list(Issue.objects.order_by('book_copy_id').values_list('branch', flat=True)),
+            ['East', 'East', ''],
+        )
+
+    def test_bulk_return_by_id_and_copy_number(self):
+        issues = [checkout(self.user, copy) for copy in self.copies[:3]]
+        Issue.objects.filter(pk=issues[0].pk).update(due_date=date.today() - timedelta(days=4))
+
+        results = bulk_return(
+            issue_ids=[issues[0].pk, 999999],
+            copy_numbers=[self.numbers[1], self.numbers[2]],
+        )
+
+        self.assertEqual(
+            [r['status'] for r in results], ['returned', 'error', 'returned', 'returned']
+        )
+        self.assertEqual(results[0]['fine_amount'], 20)
+        self.assertFalse(Issue.objects.filter(returned=False).exists())
+        self.assertEqual(BookCopy.objects.filter(is_available=False).count(), 0)
+        self.assertEqual(Book.objects.get().available_copies, len(self.copies))
+        self.assertEqual(Issue.objects.get(pk=issues[0].pk).fine_amount, 20)
+
+    def test_bulk_return_ignores_already_returned(self):
+        issue = checkout(self.user, self.copies[0])
+        bulk_return(issue_ids=[issue.pk])
+        results = bulk_return(issue_ids=[issue.pk])
+        self.assertEqual(results[0]['status'], 'error')
+
+
+class AccrueFinesTests(TestCase):
+    def setUp(self):
+        self.user = make_user('reader')
+        self.issues = [checkout(self.user, copy) for copy in make_copies(4)]
+        today = date.today()
+        for issue, days_late in zip(self.issues, [3, 3, 1, -2]):
+            Issue.objects.filter(pk=issue.pk).update(due_date=today - timedelta(days=days_late))
+
+    def test_accrues_fines_per_due_date_in_batches(self):
+        accrued, cleared = accrue_fines(batch_size=1)
+        self.assertEqual((accrued, cleared), (3, 0))
+        fines = dict(Issue.objects.values_list('pk', 'accrued_fine'))
+        self.assertEqual(
+            [fines[issue.pk] for issue in self.issues], [15, 15, 5, 0]
+        )
+        self.assertEqual(Issue.objects.filter(overdue=True).count(), 3)
+
+    def test_rerun_is_idempotent_and_clears_returned(self):
+        accrue_fines()
+        bulk_return(issue_ids=[self.issues[0].pk])
+        Issue.objects.filter(pk=self.issues[1].pk).update(due_date=date.today())
+
+        accrued, cleared = accrue_fines()
+
+        self.assertEqual(accrued, 1)
+        # The return reset its own flag; only the re-dated issue needs clearing
+        self.assertEqual(cleared, 1)
+        self.assertEqual(list(Issue.objects.filter(overdue=True).values_list('pk', flat=True)),
+                         [self.issues[2].pk])
+
+    def test_command_reports_throughput(self):
+        out = StringIO()
+        call_command('accrue_fines', stdout=out)
+        self.assertIn('Accrued fines on 3 issues', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+
+class HoldQueueTests(TestCase):
+    def setUp(self):
+        self.copy = make_copies(1)[0]
+        self.book = self.copy.book
+        self.borrower = make_user('borrower')
+        self.first, self.second = make_user('first'), make_user('second')
+        self.issue = checkout(self.borrower, self.copy)
+        self.reservations = [
+            Reservation.objects.create(user=user, book=self.book)
+            for user in (self.first, self.second)
+        ]
+
+    def state(self):
+        self.copy.refresh_from_db()
+        self.book.refresh_from_db()
+        return (
+            [r.status for r in Reservation.objects.order_by('created_at', 'id')],
+            self.copy.is_available,
+            self.book.available_copies,
+        )
+
+    def return_copy(self):
+        self.issue.returned = True
+        self.issue.return_date = date.today()
+        self.issue.save()
+
+    def test_return_holds_copy_for_head_of_queue(self):
+        self.return_copy()
+        self.assertEqual(self.state(), (['ready', 'pending'], False, 0))
+        head = Reservation.objects.get(user=self.first)
+        self.assertEqual(head.held_copy, self.copy)
+        self.assertGreater(head.expiry_date, timezone.now())
+
+        with self.assertRaisesMessage(ValidationError, 'not available'):
+            checkout(self.second, self.copy)
+        checkout(self.first, self.copy)
+        self.assertEqual(self.state(), (['fulfilled', 'pending'], False, 0))
+
+    def test_saving_a_returned_issue_again_keeps_the_hold(self):
+        self.return_copy()
+        self.issue.notes = 'Dog-eared'
+        self.issue.save()
+        self.return_copy()
+        self.assertEqual(self.state(), (['ready', 'pending'], False, 0))
+        self.assertEqual(Reservation.objects.filter(held_copy=self.copy).count(), 1)
+
+    def test_bulk_return_and_bulk_checkout_use_the_queue(self):
+        bulk_return(issue_ids=[self.issue.pk])
+        self.assertEqual(self.state(), (['ready', 'pending'], False, 0))
+        results = bulk_checkout(self.first, [self.copy.copy_number])
+        self.assertEqual(results[0]['status'], 'issued')
+        self.assertEqual(self.state(), (['fulfilled', 'pending'], False, 0))
+
+    def test_cancel_passes_hold_down_the_queue(self):
+        self.return_copy()
+        cancel_reservation(Reservation.objects.get(user=self.first))
+        self.assertEqual(self.state(), (['cancelled', 'ready'], False, 0))
+        cancel_reservation(Reservation.objects.get(user=self.second))
+        self.assertEqual(self.state(), (['cancelled', 'cancelled'], True, 1))
+
+    def test_expired_holds_are_swept(self):
+        self.return_copy()
+        Reservation.objects.filter(status='ready').update(
+            expiry_date=timezone.now() - timedelta(hours=1)
+        )
+        out = StringIO()
+        call_command('expire_holds', '--batch-size', '1', stdout=out)
+        self.assertIn('Expired 1 holds, promoted 1 reservations', out.getvalue())
+        self.assertEqual(self.state(), (['expired', 'ready'], False, 0))
+
+    def test_sweeper_fills_queue_from_available_copies(self):
+        BookCopy.objects.create(book=self.book, copy_number='extra')
+        self.assertEqual(expire_holds(), (0, 1))
+        self.assertEqual(self.state()[0], ['ready', 'pending'])
+
+    def test_copies_are_held_for_their_pickup_branch(self):
+        BookCopy.objects.filter(pk=self.copy.pk).update(branch='East')
+        Reservation.objects.filter(user=self.first).update(branch='Main')
+        self.return_copy()
+        self.assertEqual(self.state(), (['pending', 'ready'], False, 0))
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.books = [
+            Book.objects.create(title=title, isbn=f'97800000000{n:02d}', publication_year=2000)
+            for n, title in enumerate(['A', 'B', 'C', 'D'])
+        ]
+        self.copies = BookCopy.objects.bulk_create([
+            BookCopy(book=book, copy_number=f'{book.isbn}-0') for book in self.books
+        ])
+        self.users = [make_user(f'reader{n}') for n in range(4)]
+        self.borrow({0: 'AB', 1: 'ABC', 2: 'AC', 3: 'D'})
+
+    def borrow(self, history):
+        Issue.objects.bulk_create([
+            Issue(user=self.users[user], book_copy=self.copies['ABCD'.index(title)],
+                  returned=True, return_date=date.today())
+            for user, titles in history.items()
+            for title in titles
+        ])
+
+    def similar(self, title):
+        book = self.books['ABCD'.index(title)]
+        return [(other.title, round(score, 3)) for other, score in similar_books(book.pk)]
+
+    def matrix(self):
+        return sorted(CoBorrowCount.objects.values_list('book_id', 'other_id', 'borrowers'))
+
+    def test_neighbours_ranked_by_cosine(self):
+        recommendations.build()
+        self.assertEqual(self.similar('A'), [('B', 0.816), ('C', 0.816)])
+        self.assertEqual(self.similar('B'), [('A', 0.816), ('C', 0.5)])
+        self.assertEqual(self.similar('D'), [])
+
+    def test_incremental_build_matches_full_rebuild(self):
+        recommendations.build()
+        # A repeat borrowing (reader0: A) must not count twice
+        self.borrow({0: 'AC', 3: 'A'})
+        build = recommendations.build()
+        self.assertEqual(build.issues_processed, 3)
+        incremental = self.matrix()
+        recommendations.build(full=True)
+        self.assertEqual(incremental, self.matrix())
+        self.assertEqual(recommendations.build().issues_processed, 0)
+
+    def test_endpoints_read_precomputed_neighbours(self):
+        from rest_framework.test import APIClient
+
+        recommendations.build()
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        response = client.get(f'/api/v1/books/{self.books[1].pk}/similar/')
+        self.assertEqual([(row['title'], row['score']) for row in response.data],
+                         [('A', 0.8165), ('C', 0.5)])
+
+        # recent books, neighbour scores, the books and their authors
+        with self.assertNumQueries(4):
+            response = client.get('/api/v1/users/me/recommendations/')
+        self.assertEqual([(row['title'], row['score']) for row in response.data],
+                         [('C', 1.3165)])
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        fiction, science = Category.objects.create(name='Fiction'), Category.objects.create(name='Science')
+        self.books = [
+            Book.objects.create(title=title, isbn=f'97800000001{n:02d}', publication_year=2000,
+                                category=category)
+            for n, (title, category) in enumerate([('Emma', fiction), ('Cosmos', science)])
+        ]
+        copies = BookCopy.objects.bulk_create([
+            BookCopy(book=book, copy_number=f'{book.isbn}-{n}') for book in self.books for n in range(3)
+        ])
+        student, staff = make_user('reader'), make_user('librarian')
+        User.objects.filter(pk=staff.pk).update(user_type='staff', is_staff=True)
+        self.staff = User.objects.get(pk=staff.pk)
+        # (copy, user, issued days ago, loan days, returned days ago, fine)
+        loans = [
+            (0, student, 40, 14, 20, 30),
+            (1, student, 30, 14, None, 0),
+            (2, staff, 25, 14, 10, 5),
+            (3, student, 20, 14, 18, 0),
+            (4, staff, 12, 7, None, 0),
+            (5, student, 3, 14, None, 0),
+        ]
+        for copy, user, issued, loan_days, back, fine in loans:
+            issue = Issue.objects.create(user=user, book_copy=copies[copy])
+            issue_date = self.today - timedelta(days=issued)
+            Issue.objects.filter(pk=issue.pk).update(
+                issue_date=issue_date,
+                due_date=issue_date + timedelta(days=loan_days),
+                returned=back is not None,
+                return_date=self.today - timedelta(days=back) if back is not None else None,
+                fine_amount=fine,
+            )
+
+    def day(self, days_ago):
+        return self.today - timedelta(days=days_ago)
+
+    def overdue_by_day(self):
+        return {
+            day: total for day, total in DailyCirculationStats.objects.values('day')
+            .annotate(total=Sum('overdue')).values_list('day', 'total') if total
+        }
+
+    def test_carried_overdue_counts_match_a_direct_count(self):
+        rollups.roll_up()
+        self.assertEqual(DailyCirculationStats.objects.aggregate(n=Sum('issues'))['n'], 6)
+        expected = {}
+        for days_ago in range(1, 41):
+            total = sum(rollups.overdue_at(self.day(days_ago)).values())
+            if total:
+                expected[self.day(days_ago)] = total
+        self.assertEqual(self.overdue_by_day(), expected)
+        self.assertEqual(expected[self.day(1)], 2)
+
+    def test_incremental_runs_only_roll_up_new_days(self):
+        first = rollups.roll_up(until=self.day(15))
+        self.assertEqual(first.from_day, self.day(40))
+        second = rollups.roll_up()
+        self.assertEqual((second.from_day, second.through_day), (self.day(14), self.day(1)))
+        incremental = self.overdue_by_day()
+        self.assertIsNone(rollups.roll_up())
+
+        call_command('rollup_circulation', since=self.day(40), stdout=StringIO())
+        self.assertEqual(self.overdue_by_day(), incremental)
+
+    def test_reports_read_the_rollups(self):
+        from rest_framework.test import APIClient
+
+        rollups.roll_up()
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        period = {'from': self.day(60).isoformat()}
+
+        response = client.get('/api/v1/analytics/popular-books/', {**period, 'limit': 1})
+        self.assertEqual(response.data['results'],
+                         [{'book_id': self.books[0].pk, 'issues': 3, 'returns': 2, 'title': 'Emma'}])
+
+        with self.assertNumQueries(2):
+            response = client.get('/api/v1/analytics/categories/', period)
+        fiction = response.data['results'][0]
+        self.assertEqual((fiction['name'], fiction['issues'], fiction['fines'], fiction['share']),
+                         ('Fiction', 3, 35, 0.5))
+        self.assertEqual(fiction['by_user_type'], {'staff': 1, 'student': 2})
+
+        response = client.get('/api/v1/analytics/circulation/', {**period, 'interval': 'month'})
+        self.assertEqual(sum(row['issues'] for row in response.data['results']), 6)
+        self.assertEqual(response.data['results'][-1]['overdue'], 2)
+
+        self.assertEqual(client.get('/api/v1/analytics/circulation/', {'from': 'May'}).status_code, 400)
+        client.force_authenticate(User.objects.get(username='reader'))
+        self.assertEqual(client.get('/api/v1/analytics/categories/').status_code, 403)
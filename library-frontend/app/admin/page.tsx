@@ -7,6 +7,7 @@ import { Navbar } from '@/components/layout/Navbar';
 import { PageHeader } from '@/components/layout/PageHeader';
 import { Card, CardContent, CardHeader } from '@/components/ui/Card';
 import { Book, Users, BookMarked, AlertCircle } from 'lucide-react';
+import { DashboardStats } from '@/types';
 import api from '@/lib/api';
 import Link from 'next/link';
 
@@ -36,18 +37,13 @@ export default function AdminPage() {
 
   const fetchStats = async () => {
     try {
-      const [booksRes, usersRes, issuesRes, overdueRes] = await Promise.all([
-        api.get('/books/'),
-        api.get('/users/'),
-        api.get('/issues/?returned=false'),
-        api.get('/issues/overdue/'),
-      ]);
+      const response = await api.get<DashboardStats>('/stats/');
 
       setStats({
-        totalBooks: booksRes.data.length,
-        totalUsers: usersRes.data.length,
-        activeIssues: issuesRes.data.length,
-        overdueIssues: overdueRes.data.length,
+        totalBooks: response.data.total_books,
+        totalUsers: response.data.total_users,
+        activeIssues: response.data.active_issues,
+        overdueIssues: response.data.overdue_issues,
       });
     } catch (error) {
       console.error('Failed to fetch stats:', error);
@@ -8,7 +8,8 @@ import { PageHeader } from '@/components/layout/PageHeader';
 import { BookCard } from '@/components/books/BookCard';
 import { BookDetailModal } from '@/components/books/BookDetailModal';
 import { BookFilters } from '@/components/books/BookFilters';
-import { Book } from '@/types';
+import { Button } from '@/components/ui/Button';
+import { Book, CursorPage } from '@/types';
 import api from '@/lib/api';
 
 export default function BooksPage() {
@@ -16,6 +17,8 @@ export default function BooksPage() {
   const { isAuthenticated, isLoading, fetchUser } = useAuthStore();
 
   const [books, setBooks] = useState<Book[]>([]);
+  const [nextPage, setNextPage] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedBook, setSelectedBook] = useState<Book | null>(null);
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [loading, setLoading] = useState(true);
@@ -48,7 +51,7 @@ export default function BooksPage() {
     try {
       setLoading(true);
 
-      const response = await api.get<Book[]>('/books/', {
+      const response = await api.get<CursorPage<Book>>('/books/', {
         params: {
           search: search || undefined,
           category: category || undefined, // ✅ MUST be "category"
@@ -56,7 +59,8 @@ export default function BooksPage() {
         },
       });
 
-      setBooks(response.data);
+      setBooks(response.data.results);
+      setNextPage(response.data.next);
     } catch (error) {
       console.error('Failed to fetch books:', error);
     } finally {
@@ -64,6 +68,21 @@ export default function BooksPage() {
     }
   };
 
+  // Follow the cursor returned by the API; filters are already encoded in it
+  const fetchMoreBooks = async () => {
+    if (!nextPage) return;
+    try {
+      setLoadingMore(true);
+      const response = await api.get<CursorPage<Book>>(nextPage);
+      setBooks((prev) => [...prev, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error('Failed to fetch more books:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleBookClick = (book: Book) => {
     setSelectedBook(book);
     setIsModalOpen(true);
@@ -115,6 +134,14 @@ export default function BooksPage() {
             ))}
           </div>
         )}
+
+        {nextPage && (
+          <div className="flex justify-center mt-8">
+            <Button variant="outline" onClick={fetchMoreBooks} isLoading={loadingMore}>
+              Load more
+            </Button>
+          </div>
+        )}
       </div>
 
       <BookDetailModal
@@ -4,7 +4,11 @@ import React, { useEffect, useState } from 'react';
 import { Input } from '@/components/ui/Input';
 import { Search, Filter } from 'lucide-react';
 import api from '@/lib/api';
-import { Category } from '@/types';
+import { BookSuggestion, Category } from '@/types';
+
+// Wait for a pause in typing before asking for suggestions
+const SUGGEST_DEBOUNCE_MS = 200;
+const SUGGEST_MIN_LENGTH = 2;
 
 interface BookFiltersProps {
   onApply: (filters: { search: string; category: string; language: string }) => void;
@@ -15,11 +19,37 @@ export const BookFilters: React.FC<BookFiltersProps> = ({ onApply }) => {
   const [searchQuery, setSearchQuery] = useState('');
   const [selectedCategory, setSelectedCategory] = useState('');
   const [selectedLanguage, setSelectedLanguage] = useState('');
+  const [suggestions, setSuggestions] = useState<BookSuggestion[]>([]);
+  const [showSuggestions, setShowSuggestions] = useState(false);
 
   useEffect(() => {
     fetchCategories();
   }, []);
 
+  // Typeahead from /books/suggest/, debounced; replies to older input are dropped
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!showSuggestions || query.length < SUGGEST_MIN_LENGTH) {
+      setSuggestions([]);
+      return;
+    }
+    let stale = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await api.get<BookSuggestion[]>('/books/suggest/', {
+          params: { q: query },
+        });
+        if (!stale) setSuggestions(response.data);
+      } catch (error) {
+        console.error('Failed to fetch suggestions:', error);
+      }
+    }, SUGGEST_DEBOUNCE_MS);
+    return () => {
+      stale = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery, showSuggestions]);
+
   const fetchCategories = async () => {
     try {
       const response = await api.get<Category[]>('/categories/');
@@ -32,6 +62,21 @@ export const BookFilters: React.FC<BookFiltersProps> = ({ onApply }) => {
   const handleSearchChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     const value = e.target.value;
     setSearchQuery(value);
+    setShowSuggestions(true);
+  };
+
+  const applySearch = (search: string) => {
+    setShowSuggestions(false);
+    onApply({
+      search: search.trim(),
+      category: selectedCategory,
+      language: selectedLanguage,
+    });
+  };
+
+  const handleSuggestionClick = (suggestion: BookSuggestion) => {
+    setSearchQuery(suggestion.title);
+    applySearch(suggestion.title);
   };
 
   const handleKeyDown = (e: React.KeyboardEvent<HTMLInputElement>) => {
@@ -68,17 +113,31 @@ export const BookFilters: React.FC<BookFiltersProps> = ({ onApply }) => {
           />
           <button
             type="button"
-            onClick={() =>
-              onApply({
-                search: searchQuery.trim(),
-                category: selectedCategory,
-                language: selectedLanguage,
-              })
-            }
+            onClick={() => applySearch(searchQuery)}
             className="absolute right-2 bg-primary-600 text-white px-3 py-1 rounded-md hover:bg-primary-700"
           >
             Search
           </button>
+          {showSuggestions && suggestions.length > 0 && (
+            <ul className="absolute left-0 right-0 top-full mt-1 z-10 bg-white border border-gray-200 rounded-lg shadow-lg max-h-72 overflow-y-auto">
+              {suggestions.map((suggestion) => (
+                <li key={suggestion.id}>
+                  <button
+                    type="button"
+                    onClick={() => handleSuggestionClick(suggestion)}
+                    className="w-full text-left px-4 py-2 hover:bg-gray-100"
+                  >
+                    <span className="block text-sm font-medium text-gray-900">
+                      {suggestion.title}
+                    </span>
+                    {suggestion.author && (
+                      <span className="block text-xs text-gray-500">{suggestion.author}</span>
+                    )}
+                  </button>
+                </li>
+              ))}
+            </ul>
+          )}
         </div>
 
         {/* Category Filter */}
@@ -34,8 +34,18 @@ export const ReservationCard: React.FC<ReservationCardProps> = ({
 
   const statusColors = {
     pending: 'warning',
+    ready: 'info',
     fulfilled: 'success',
     cancelled: 'default',
+    expired: 'default',
+  } as const;
+
+  const statusLabels = {
+    pending: 'Pending',
+    ready: 'Ready for pickup',
+    fulfilled: 'Fulfilled',
+    cancelled: 'Cancelled',
+    expired: 'Expired',
   } as const;
 
   return (
@@ -53,7 +63,7 @@ export const ReservationCard: React.FC<ReservationCardProps> = ({
             )}
           </div>
           <Badge variant={statusColors[reservation.status]}>
-            {reservation.status.charAt(0).toUpperCase() + reservation.status.slice(1)}
+            {statusLabels[reservation.status]}
           </Badge>
         </div>
 
@@ -66,12 +76,12 @@ export const ReservationCard: React.FC<ReservationCardProps> = ({
           {reservation.expiry_date && (
             <div className="flex items-center text-sm text-gray-600">
               <Calendar className="w-4 h-4 mr-2" />
-              <span>Expires: {formatDateTime(reservation.expiry_date)}</span>
+              <span>Hold expires: {formatDateTime(reservation.expiry_date)}</span>
             </div>
           )}
         </div>
 
-        {reservation.status === 'pending' && (
+        {(reservation.status === 'pending' || reservation.status === 'ready') && (
           <div className="mt-4">
             <Button
               variant="danger"
@@ -47,6 +47,28 @@ export interface Book {
   updated_at?: string;
 }
 
+// Typeahead row from /books/suggest/; `author` joins the author names
+export interface BookSuggestion {
+  id: number;
+  title: string;
+  isbn: string;
+  author: string;
+}
+
+// Compact nested representations used by issues and reservations;
+// pass ?expand=book_details / ?expand=user_details for the full objects
+export interface BookSummary {
+  id: number;
+  title: string;
+  isbn: string;
+  cover_image?: string;
+  authors: Pick<Author, 'id' | 'name'>[];
+}
+
+export type UserSummary = Pick<
+  User, 'id' | 'username' | 'first_name' | 'last_name' | 'email' | 'user_type'
+>;
+
 export interface BookCopy {
   id: number;
   book: number;
@@ -62,11 +84,11 @@ export interface Issue {
   book_copy: number;
   book_copy_details?: {
     id: number;
-    book: Book;
+    book: BookSummary;
     copy_number: string;
     is_available: boolean;
   };
-  user_details?: User;
+  user_details?: UserSummary | User;
   issue_date: string;
   due_date: string;
   return_date?: string;
@@ -74,17 +96,20 @@ export interface Issue {
   fine_amount: string;
   notes?: string;
   is_overdue?: boolean;
+  overdue?: boolean;
+  accrued_fine?: string;
 }
 
 export interface Reservation {
   id: number;
   user: number;
   book: number;
-  book_details?: Book;
-  user_details?: User;
+  book_details?: BookSummary | Book;
+  user_details?: UserSummary | User;
   created_at: string;
-  status: 'pending' | 'fulfilled' | 'cancelled';
+  status: 'pending' | 'ready' | 'fulfilled' | 'cancelled' | 'expired';
   expiry_date?: string;
+  held_copy?: number | null;
 }
 
 export interface LoginCredentials {
@@ -107,3 +132,22 @@ export interface AuthTokens {
   access: string;
   refresh: string;
 }
+
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+export interface OffsetPage<T> extends CursorPage<T> {
+  count: number;
+}
+
+export interface DashboardStats {
+  total_books: number;
+  total_users: number;
+  active_issues: number;
+  overdue_issues: number;
+  outstanding_fines: number;
+  accrued_fines: number;
+}